@@ -1,6 +1,19 @@
-from .guard_agent import GuardAgent
-from .classification_agent import ClassificationAgent
-from .details_agent import DetailsAgent
-from .order_taking_agent import OrderTakingAgent
-from .recommendation_agent import RecommendationAgent
-from .agent_protocol import AgentProtocol
\ No newline at end of file
+import importlib
+
+from .agent_protocol import AgentProtocol, AsyncAgentProtocol
+
+# The RunPod-based agents are only needed by agent_controller.py, so they are
+# imported on first access instead of whenever any agents.* module is used
+_LAZY_AGENTS = {
+    "GuardAgent": ".guard_agent",
+    "ClassificationAgent": ".classification_agent",
+    "DetailsAgent": ".details_agent",
+    "OrderTakingAgent": ".order_taking_agent",
+    "RecommendationAgent": ".recommendation_agent",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_AGENTS:
+        return getattr(importlib.import_module(_LAZY_AGENTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
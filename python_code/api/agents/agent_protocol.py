@@ -2,4 +2,8 @@ from typing import Protocol, List, Dict, Any
 
 class AgentProtocol(Protocol):
     def get_response(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
-        ...
\ No newline at end of file
+        ...
+
+class AsyncAgentProtocol(Protocol):
+    async def aget_response(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        ...
@@ -0,0 +1,318 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def _get_store_backend() -> str:
+    """
+    Where conversations are kept: "memory" (default, per process) or
+    "sqlite" (shared by all workers on the host).
+    Override via CONVERSATION_STORE.
+    """
+    return os.getenv("CONVERSATION_STORE", "memory").lower()
+
+
+def _get_window_size() -> int:
+    """
+    Number of most recent messages kept per conversation and passed to the agents.
+    Override via CONVERSATION_WINDOW.
+    """
+    return int(os.getenv("CONVERSATION_WINDOW", "10"))
+
+
+def _get_ttl() -> float:
+    """
+    Seconds of inactivity after which a conversation is dropped.
+    Override via CONVERSATION_TTL.
+    """
+    return float(os.getenv("CONVERSATION_TTL", str(24 * 3600)))
+
+
+def _get_max_conversations() -> int:
+    """
+    Maximum number of conversations kept by the in-memory store (least
+    recently used are evicted first). Override via CONVERSATION_MAX_SESSIONS.
+    """
+    return int(os.getenv("CONVERSATION_MAX_SESSIONS", "10000"))
+
+
+def _get_sqlite_path() -> str:
+    # Current file: python_code/api/agents/conversation_store.py
+    # Database:     python_code/api/conversations.sqlite3
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.getenv(
+        "CONVERSATION_DB_PATH",
+        os.path.join(current_dir, "..", "conversations.sqlite3"),
+    )
+
+
+def _is_order_taking_message(message: Dict[str, Any]) -> bool:
+    return (
+        message.get("role") == "assistant"
+        and (message.get("memory") or {}).get("agent") == "order_taking_agent"
+    )
+
+
+def _build_window(messages: List[Tuple[int, Dict[str, Any]]], order_message: Optional[Tuple[int, Dict[str, Any]]]):
+    """
+    The agents' view of a conversation: the recent (seq, message) pairs,
+    preceded by the latest order-taking message when it is older than the
+    window, so the order state is never lost.
+    """
+    window = [message for _, message in messages]
+    if order_message is not None and (not messages or order_message[0] < messages[0][0]):
+        window.insert(0, order_message[1])
+    return window
+
+
+class ConversationStore(ABC):
+    """
+    Server-side conversation history, so clients only send a conversation
+    id and their new message.
+
+    Each conversation keeps its last window_size messages plus the latest
+    order-taking assistant message. messages() returns them in order as
+    plain dicts that callers must treat as read-only; no copies are made.
+    Conversations idle for longer than ttl seconds are dropped.
+    """
+
+    backend = "base"
+
+    def __init__(self, window_size: int | None = None, ttl: float | None = None):
+        self.window_size = _get_window_size() if window_size is None else window_size
+        self.ttl = _get_ttl() if ttl is None else ttl
+
+    @abstractmethod
+    def create(self) -> str:
+        """Starts a conversation and returns its id"""
+
+    @abstractmethod
+    def messages(self, conversation_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Window of the conversation, or None if it is unknown or expired"""
+
+    @abstractmethod
+    def append(self, conversation_id: str, message: Dict[str, Any]) -> None:
+        """Adds a message to the conversation"""
+
+    @abstractmethod
+    def delete(self, conversation_id: str) -> None:
+        """Drops the conversation"""
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend, "window_size": self.window_size, "ttl": self.ttl}
+
+
+class _Conversation:
+    __slots__ = ("messages", "order_message", "next_seq", "updated_at")
+
+    def __init__(self, window_size: int):
+        self.messages: deque = deque(maxlen=max(1, window_size))
+        self.order_message: Optional[Tuple[int, Dict[str, Any]]] = None
+        self.next_seq = 0
+        self.updated_at = time.time()
+
+
+class InMemoryConversationStore(ConversationStore):
+    """
+    Per-process store: an LRU of conversations, each a bounded deque.
+    Suits a single worker; use the SQLite store when several workers serve
+    the same clients.
+    """
+
+    backend = "memory"
+
+    def __init__(self, window_size: int | None = None, ttl: float | None = None, max_conversations: int | None = None):
+        super().__init__(window_size, ttl)
+        self.max_conversations = _get_max_conversations() if max_conversations is None else max_conversations
+        self._conversations: "OrderedDict[str, _Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, conversation_id: str) -> Optional[_Conversation]:
+        conversation = self._conversations.get(conversation_id)
+        if conversation is None:
+            return None
+        if time.time() - conversation.updated_at > self.ttl:
+            del self._conversations[conversation_id]
+            return None
+        self._conversations.move_to_end(conversation_id)
+        return conversation
+
+    def create(self) -> str:
+        conversation_id = uuid.uuid4().hex
+        with self._lock:
+            self._conversations[conversation_id] = _Conversation(self.window_size)
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+        return conversation_id
+
+    def messages(self, conversation_id: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            conversation = self._get(conversation_id)
+            if conversation is None:
+                return None
+            return _build_window(list(conversation.messages), conversation.order_message)
+
+    def append(self, conversation_id: str, message: Dict[str, Any]) -> None:
+        with self._lock:
+            conversation = self._get(conversation_id)
+            if conversation is None:
+                conversation = self._conversations[conversation_id] = _Conversation(self.window_size)
+            entry = (conversation.next_seq, message)
+            conversation.next_seq += 1
+            conversation.messages.append(entry)
+            if _is_order_taking_message(message):
+                conversation.order_message = entry
+            conversation.updated_at = time.time()
+
+    def delete(self, conversation_id: str) -> None:
+        with self._lock:
+            self._conversations.pop(conversation_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        stats["conversations"] = len(self._conversations)
+        stats["max_conversations"] = self.max_conversations
+        return stats
+
+
+class SQLiteConversationStore(ConversationStore):
+    """
+    Store backed by a local SQLite file, shared by every worker process on
+    the host. Messages are stored as JSON rows and trimmed to the window on
+    every append. Each thread uses its own connection.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path: str | None = None, window_size: int | None = None, ttl: float | None = None):
+        super().__init__(window_size, ttl)
+        self.path = path or _get_sqlite_path()
+        self._local = threading.local()
+        self._last_purge = 0.0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                " id TEXT PRIMARY KEY, updated_at REAL NOT NULL,"
+                " next_seq INTEGER NOT NULL DEFAULT 0,"
+                " order_seq INTEGER, order_message TEXT)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                " conversation_id TEXT NOT NULL, seq INTEGER NOT NULL, message TEXT NOT NULL,"
+                " PRIMARY KEY (conversation_id, seq))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS conversations_updated_at ON conversations (updated_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _purge_expired(self, conn: sqlite3.Connection) -> None:
+        # At most once a minute per process
+        now = time.time()
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        cutoff = now - self.ttl
+        conn.execute(
+            "DELETE FROM messages WHERE conversation_id IN (SELECT id FROM conversations WHERE updated_at < ?)",
+            (cutoff,),
+        )
+        conn.execute("DELETE FROM conversations WHERE updated_at < ?", (cutoff,))
+
+    def create(self) -> str:
+        conversation_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            self._purge_expired(conn)
+            conn.execute("INSERT INTO conversations (id, updated_at) VALUES (?, ?)", (conversation_id, time.time()))
+        return conversation_id
+
+    def messages(self, conversation_id: str) -> Optional[List[Dict[str, Any]]]:
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT updated_at, order_seq, order_message FROM conversations WHERE id = ?",
+            (conversation_id,),
+        ).fetchone()
+        if row is None or time.time() - row[0] > self.ttl:
+            return None
+
+        rows = conn.execute(
+            "SELECT seq, message FROM messages WHERE conversation_id = ? ORDER BY seq",
+            (conversation_id,),
+        ).fetchall()
+        order_message = (row[1], json.loads(row[2])) if row[2] is not None else None
+        return _build_window([(seq, json.loads(message)) for seq, message in rows], order_message)
+
+    def append(self, conversation_id: str, message: Dict[str, Any]) -> None:
+        data = json.dumps(message)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO conversations (id, updated_at) VALUES (?, ?) ON CONFLICT(id) DO NOTHING",
+                (conversation_id, now),
+            )
+            seq = conn.execute(
+                "UPDATE conversations SET next_seq = next_seq + 1, updated_at = ? WHERE id = ? RETURNING next_seq - 1",
+                (now, conversation_id),
+            ).fetchone()[0]
+            conn.execute(
+                "INSERT INTO messages (conversation_id, seq, message) VALUES (?, ?, ?)",
+                (conversation_id, seq, data),
+            )
+            conn.execute(
+                "DELETE FROM messages WHERE conversation_id = ? AND seq <= ?",
+                (conversation_id, seq - self.window_size),
+            )
+            if _is_order_taking_message(message):
+                conn.execute(
+                    "UPDATE conversations SET order_seq = ?, order_message = ? WHERE id = ?",
+                    (seq, data, conversation_id),
+                )
+
+    def delete(self, conversation_id: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+            conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        stats["path"] = self.path
+        stats["conversations"] = self._connect().execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+        return stats
+
+
+# Backend name -> factory; other stores (e.g. Redis) can be registered here
+CONVERSATION_STORE_BACKENDS = {
+    "memory": InMemoryConversationStore,
+    "sqlite": SQLiteConversationStore,
+}
+
+_conversation_store: Optional[ConversationStore] = None
+_conversation_store_lock = threading.Lock()
+
+
+def get_conversation_store() -> ConversationStore:
+    """
+    Returns the process-wide conversation store selected by
+    CONVERSATION_STORE, creating it on first use.
+    """
+    global _conversation_store
+    if _conversation_store is None:
+        with _conversation_store_lock:
+            if _conversation_store is None:
+                backend = _get_store_backend()
+                if backend not in CONVERSATION_STORE_BACKENDS:
+                    raise ValueError(f"Unknown conversation store: {backend}")
+                _conversation_store = CONVERSATION_STORE_BACKENDS[backend]()
+    return _conversation_store
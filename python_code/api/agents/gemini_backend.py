@@ -0,0 +1,333 @@
+import hashlib
+import json
+import os
+import random
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+
+def _get_backend_mode() -> str:
+    """
+    Where Gemini and Pinecone calls go:
+      - "live": the real services (default)
+      - "record": the real services, with every request/response pair
+        appended to GEMINI_RECORDINGS_PATH
+      - "replay": answered locally from GEMINI_RECORDINGS_PATH, no API keys
+        or network needed
+    Override via GEMINI_BACKEND_MODE.
+    """
+    return os.getenv("GEMINI_BACKEND_MODE", "live").lower()
+
+
+def _get_recordings_path() -> str:
+    # Current file: python_code/api/agents/gemini_backend.py
+    # Recordings:   python_code/api/recordings/gemini_recordings.jsonl
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.getenv(
+        "GEMINI_RECORDINGS_PATH",
+        os.path.join(current_dir, "..", "recordings", "gemini_recordings.jsonl"),
+    )
+
+
+def _get_replay_latency() -> str:
+    """
+    Latency injected per replayed call: "recorded" (the latency measured
+    while recording, default) or a fixed number of seconds.
+    Override via GEMINI_REPLAY_LATENCY.
+    """
+    return os.getenv("GEMINI_REPLAY_LATENCY", "recorded").lower()
+
+
+def _get_replay_latency_scale() -> float:
+    """
+    Multiplier applied to the injected latency, e.g. 0.5 to model a faster
+    region. Override via GEMINI_REPLAY_LATENCY_SCALE.
+    """
+    return float(os.getenv("GEMINI_REPLAY_LATENCY_SCALE", "1.0"))
+
+
+def _get_replay_on_miss() -> str:
+    """
+    What replay does for a request that was never recorded:
+      - "synthesize": answer with a placeholder (schema-shaped JSON, a
+        deterministic embedding, no vector matches) (default)
+      - "error": raise ReplayMissError
+    Override via GEMINI_REPLAY_ON_MISS.
+    """
+    return os.getenv("GEMINI_REPLAY_ON_MISS", "synthesize").lower()
+
+
+# Output size of gemini-embedding-001, used for synthesized vectors when
+# the recordings contain none
+DEFAULT_EMBEDDING_DIMENSION = 3072
+
+# Replayed streams are split into chunks of this many words
+STREAM_CHUNK_WORDS = 8
+
+
+class ReplayMissError(KeyError):
+    pass
+
+
+class RecordedUsage(NamedTuple):
+    prompt_token_count: int
+    candidates_token_count: int
+    cached_content_token_count: int
+
+
+class RecordedResponse(NamedTuple):
+    """Stand-in for a Gemini response (or stream chunk): .text and .usage_metadata."""
+
+    text: str
+    usage_metadata: Optional[RecordedUsage] = None
+
+
+def _hash(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def generation_key(model_name: str, generation_config, system_instruction: Optional[str], prompt: str) -> str:
+    return _hash("generate", model_name, generation_config or {}, system_instruction, prompt)
+
+
+def vector_query_key(index_name: Optional[str], vector, top_k: int) -> str:
+    # Rounded so the same (replayed) embedding always finds its recording
+    return _hash("vector_query", index_name, [round(float(v), 6) for v in vector], top_k)
+
+
+def usage_to_dict(usage_metadata) -> Optional[Dict[str, int]]:
+    if usage_metadata is None:
+        return None
+    return {field: int(getattr(usage_metadata, field, 0) or 0) for field in RecordedUsage._fields}
+
+
+def _synthesize_from_schema(schema: Dict[str, Any]) -> Any:
+    """Smallest value of the schema's shape: first enum value, empty strings and lists."""
+    if "enum" in schema:
+        return schema["enum"][0]
+    schema_type = schema.get("type")
+    if schema_type == "object":
+        return {name: _synthesize_from_schema(prop) for name, prop in schema.get("properties", {}).items()}
+    if schema_type == "array":
+        return []
+    if schema_type in ("integer", "number"):
+        return 0
+    if schema_type == "boolean":
+        return False
+    return ""
+
+
+class RecordingBackend:
+    """
+    Live calls plus an append-only JSONL log of every request/response pair
+    and its latency, later served by ReplayBackend.
+    """
+
+    mode = "record"
+
+    def __init__(self, path: str | None = None):
+        self.path = path or _get_recordings_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self.recorded = 0
+
+    def _append(self, entry: Dict[str, Any]):
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self.recorded += 1
+
+    def record_generation(self, key: str, model_name: str, prompt: str, text: str, usage_metadata, latency: float):
+        self._append(
+            {
+                "kind": "generate",
+                "key": key,
+                "model": model_name,
+                "prompt": prompt,
+                "text": text,
+                "usage": usage_to_dict(usage_metadata),
+                "latency": round(latency, 4),
+            }
+        )
+
+    def record_embeddings(self, keys: List[str], model_name: str, vectors: List[List[float]], latency: float):
+        # One batched call: its latency is charged to every text
+        for key, vector in zip(keys, vectors):
+            self._append(
+                {"kind": "embed", "key": key, "model": model_name, "vector": list(vector), "latency": round(latency, 4)}
+            )
+
+    def record_vector_query(self, key: str, index_name: Optional[str], result: Dict[str, Any], latency: float):
+        self._append(
+            {"kind": "vector_query", "key": key, "index": index_name, "result": result, "latency": round(latency, 4)}
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "path": self.path, "recorded": self.recorded}
+
+
+class ReplayBackend:
+    """
+    Serves recorded responses without touching the network, sleeping for
+    the recorded (or a fixed) latency so benchmarks keep realistic timing.
+    Unrecorded requests are synthesized or raise ReplayMissError, see
+    GEMINI_REPLAY_ON_MISS.
+    """
+
+    mode = "replay"
+
+    def __init__(
+        self,
+        path: str | None = None,
+        latency: str | float | None = None,
+        latency_scale: float | None = None,
+        on_miss: str | None = None,
+    ):
+        self.path = path or _get_recordings_path()
+        latency = _get_replay_latency() if latency is None else latency
+        self.fixed_latency = None if latency == "recorded" else float(latency)
+        self.latency_scale = _get_replay_latency_scale() if latency_scale is None else latency_scale
+        self.on_miss = _get_replay_on_miss() if on_miss is None else on_miss
+
+        self._entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._mean_latency: Dict[str, float] = {}
+        self.embedding_dimension = DEFAULT_EMBEDDING_DIMENSION
+        self._load()
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            print(f"[ReplayBackend] No recordings at {self.path}, every call will be a miss")
+            return
+        latencies: Dict[str, List[float]] = {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            for idx, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"[ReplayBackend] Skipping invalid line {idx} in {self.path}")
+                    continue
+                # Later recordings of the same request win
+                self._entries[(entry["kind"], entry["key"])] = entry
+                latencies.setdefault(entry["kind"], []).append(float(entry.get("latency", 0.0)))
+                if entry["kind"] == "embed":
+                    self.embedding_dimension = len(entry["vector"])
+        self._mean_latency = {kind: sum(values) / len(values) for kind, values in latencies.items()}
+        print(f"[ReplayBackend] Loaded {len(self._entries)} recordings from {self.path}")
+
+    def _lookup(self, kind: str, key: str, description: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get((kind, key))
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if entry is None and self.on_miss == "error":
+            raise ReplayMissError(f"No recording for {kind} {description} (key {key[:12]})")
+        return entry
+
+    def _delay(self, kind: str, entry: Optional[Dict[str, Any]]) -> float:
+        if self.fixed_latency is not None:
+            latency = self.fixed_latency
+        elif entry is not None:
+            latency = float(entry.get("latency", 0.0))
+        else:
+            latency = self._mean_latency.get(kind, 0.0)
+        return latency * self.latency_scale
+
+    def generate(self, key: str, model_name: str, generation_config) -> Tuple[RecordedResponse, float]:
+        """(response, seconds to wait) for a generate request."""
+        entry = self._lookup("generate", key, model_name)
+        if entry is not None:
+            usage = entry.get("usage")
+            response = RecordedResponse(entry["text"], RecordedUsage(**usage) if usage else None)
+        else:
+            schema = (generation_config or {}).get("response_schema")
+            text = json.dumps(_synthesize_from_schema(schema)) if schema else "This is a replayed response."
+            response = RecordedResponse(text, None)
+        return response, self._delay("generate", entry)
+
+    def stream(self, key: str, model_name: str, generation_config) -> Tuple[List[RecordedResponse], float]:
+        """The generate response split into stream chunks; usage rides on the last one."""
+        response, delay = self.generate(key, model_name, generation_config)
+        words = response.text.split(" ")
+        chunks = [
+            " ".join(words[start:start + STREAM_CHUNK_WORDS]) + (" " if start + STREAM_CHUNK_WORDS < len(words) else "")
+            for start in range(0, len(words), STREAM_CHUNK_WORDS)
+        ] or [""]
+        pieces = [RecordedResponse(chunk) for chunk in chunks[:-1]]
+        pieces.append(RecordedResponse(chunks[-1], response.usage_metadata))
+        return pieces, delay
+
+    def embed(self, keys: List[str], model_name: str) -> Tuple[List[List[float]], float]:
+        """(vectors, seconds to wait) for one batched embedding request, by embedding cache key."""
+        vectors, delay = [], 0.0
+        for key in keys:
+            entry = self._lookup("embed", key, model_name)
+            if entry is not None:
+                vectors.append(entry["vector"])
+            else:
+                rng = random.Random(key)
+                vector = [rng.gauss(0.0, 1.0) for _ in range(self.embedding_dimension)]
+                norm = sum(v * v for v in vector) ** 0.5 or 1.0
+                vectors.append([v / norm for v in vector])
+            delay = max(delay, self._delay("embed", entry))
+        return vectors, delay
+
+    def vector_query(self, key: str, index_name: Optional[str]) -> Tuple[Dict[str, Any], float]:
+        entry = self._lookup("vector_query", key, str(index_name))
+        result = entry["result"] if entry is not None else {"matches": []}
+        return result, self._delay("vector_query", entry)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "path": self.path,
+                "recordings": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "on_miss": self.on_miss,
+                "latency": "recorded" if self.fixed_latency is None else self.fixed_latency,
+                "latency_scale": self.latency_scale,
+            }
+
+
+GEMINI_BACKENDS = {
+    "record": RecordingBackend,
+    "replay": ReplayBackend,
+}
+
+_gemini_backend = None
+_gemini_backend_lock = threading.Lock()
+_gemini_backend_loaded = False
+
+
+def get_gemini_backend():
+    """
+    Returns the process-wide RecordingBackend or ReplayBackend selected by
+    GEMINI_BACKEND_MODE, or None in "live" mode.
+    """
+    global _gemini_backend, _gemini_backend_loaded
+    if not _gemini_backend_loaded:
+        with _gemini_backend_lock:
+            if not _gemini_backend_loaded:
+                mode = _get_backend_mode()
+                if mode != "live":
+                    if mode not in GEMINI_BACKENDS:
+                        raise ValueError(f"Unknown Gemini backend mode: {mode}")
+                    _gemini_backend = GEMINI_BACKENDS[mode]()
+                _gemini_backend_loaded = True
+    return _gemini_backend
+
+
+def is_replaying() -> bool:
+    backend = get_gemini_backend()
+    return backend is not None and backend.mode == "replay"
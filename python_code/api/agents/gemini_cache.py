@@ -0,0 +1,259 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, List, Dict, Optional, Sequence
+
+
+def _get_embedding_cache_size() -> int:
+    """
+    Maximum number of embeddings kept in memory.
+    Override via GEMINI_EMBEDDING_CACHE_SIZE (0 disables the memory tier).
+    """
+    return int(os.getenv("GEMINI_EMBEDDING_CACHE_SIZE", "1024"))
+
+
+def _get_embedding_cache_path() -> Optional[str]:
+    """
+    Optional SQLite file for the persistent tier.
+    Set GEMINI_EMBEDDING_CACHE_PATH to enable it.
+    """
+    return os.getenv("GEMINI_EMBEDDING_CACHE_PATH") or None
+
+
+def _get_response_cache_size() -> int:
+    """
+    Maximum number of Gemini responses kept in memory.
+    Override via GEMINI_RESPONSE_CACHE_SIZE (0 disables response caching).
+    """
+    return int(os.getenv("GEMINI_RESPONSE_CACHE_SIZE", "512"))
+
+
+def _get_response_cache_ttl() -> float:
+    """
+    Seconds a cached Gemini response stays valid.
+    Override via GEMINI_RESPONSE_CACHE_TTL.
+    """
+    return float(os.getenv("GEMINI_RESPONSE_CACHE_TTL", "3600"))
+
+
+def normalize_text(text: str) -> str:
+    """
+    Case- and whitespace-insensitive form of a text used in cache keys,
+    so "What's in a  Cappuccino?" and "what's in a cappuccino?" share an entry.
+    """
+    return " ".join(str(text).split()).casefold()
+
+
+def embedding_cache_key(model_name: str, task_type: str, text: str) -> str:
+    raw = "\x1f".join((model_name, task_type, normalize_text(text)))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def response_cache_key(model_name: str, prompt: str, generation_config: Dict[str, Any]) -> str:
+    raw = "\x1f".join((model_name, prompt, json.dumps(generation_config, sort_keys=True)))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed cache for Gemini embeddings.
+
+    Two tiers:
+      - in-memory LRU (OrderedDict) bounded by max_entries
+      - optional SQLite store at db_path that survives restarts
+
+    Keys come from embedding_cache_key(model, task_type, text). Vectors are
+    stored as float32 blobs on disk and returned as lists of floats.
+    """
+
+    def __init__(self, max_entries: int | None = None, db_path: str | None = None):
+        self.max_entries = _get_embedding_cache_size() if max_entries is None else max_entries
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        self._db = None
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._db.commit()
+
+    def _remember(self, key: str, vector: List[float]):
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        """
+        Returns {key: vector} for every key found in either tier.
+        Disk hits are promoted into the memory tier.
+        """
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is None:
+                    missing.append(key)
+                else:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+
+            if self._db is not None and missing:
+                unique_missing = list(dict.fromkeys(missing))
+                # Stay well below SQLite's bound-parameter limit
+                for start in range(0, len(unique_missing), 500):
+                    chunk = unique_missing[start : start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows = self._db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                        chunk,
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = array("f", blob).tolist()
+                        found[key] = vector
+                        self._remember(key, vector)
+
+            for key in keys:
+                if key in found:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, list(vector))
+            if self._db is not None and items:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, array("f", vector).tobytes()) for key, vector in items.items()],
+                )
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._memory),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+
+class ResponseCache:
+    """
+    LRU + TTL memo for deterministic (temperature 0) Gemini responses.
+
+    Keys come from response_cache_key(model, flattened prompt, generation
+    config). Entries expire after ttl_seconds and the least recently used
+    entry is evicted once max_entries is reached.
+    """
+
+    def __init__(self, max_entries: int | None = None, ttl_seconds: float | None = None):
+        self.max_entries = _get_response_cache_size() if max_entries is None else max_entries
+        self.ttl_seconds = _get_response_cache_ttl() if ttl_seconds is None else ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.evictions += 1
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """
+    Returns the process-wide embedding cache, creating it from the
+    environment on first use.
+    """
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache(db_path=_get_embedding_cache_path())
+    return _embedding_cache
+
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    Returns the process-wide response cache, creating it from the
+    environment on first use.
+    """
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache()
+    return _response_cache
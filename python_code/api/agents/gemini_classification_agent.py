@@ -1,9 +1,12 @@
-import json
-from copy import deepcopy
-
 from dotenv import load_dotenv
 
-from .gemini_utils import get_gemini_chatbot_response, double_check_json_output_gemini
+from .gemini_schemas import CLASSIFICATION_SCHEMA
+from .gemini_utils import (
+    aget_gemini_chatbot_response,
+    get_gemini_chatbot_response,
+    structured_output_enabled,
+)
+from .json_repair import parse_json_output
 
 load_dotenv()
 
@@ -23,12 +26,38 @@ class GeminiClassificationAgent:
       }
     """
 
-    def __init__(self, model_name: str | None = None):
+    def __init__(
+        self,
+        model_name: str | None = None,
+        use_response_cache: bool = True,
+        structured_output: bool | None = None,
+    ):
         self.model_name = model_name
+        self.use_response_cache = use_response_cache
+        self.structured_output = structured_output_enabled() if structured_output is None else structured_output
+        self.response_schema = CLASSIFICATION_SCHEMA if self.structured_output else None
 
     def get_response(self, messages):
-        messages = deepcopy(messages)
+        input_messages = self._build_input_messages(messages)
+        raw_output = get_gemini_chatbot_response(
+            input_messages,
+            model_name=self.model_name,
+            use_cache=self.use_response_cache,
+            response_schema=self.response_schema,
+        )
+        return self._handle_raw_output(raw_output)
 
+    async def aget_response(self, messages):
+        input_messages = self._build_input_messages(messages)
+        raw_output = await aget_gemini_chatbot_response(
+            input_messages,
+            model_name=self.model_name,
+            use_cache=self.use_response_cache,
+            response_schema=self.response_schema,
+        )
+        return self._handle_raw_output(raw_output)
+
+    def _build_input_messages(self, messages):
         system_prompt = """
             You are a helpful AI assistant for a coffee shop application.
             Your task is to determine what agent should handle the user input. You have 3 agents to choose from:
@@ -48,7 +77,6 @@ class GeminiClassificationAgent:
             Your output MUST be a single, valid JSON object with this exact structure
             and nothing else before or after it (no markdown, no explanations):
             {
-              "chain of thought": "<your reasoning>",
               "decision": "details_agent" or "order_taking_agent" or "recommendation_agent",
               "message": ""
             }
@@ -56,11 +84,9 @@ class GeminiClassificationAgent:
 
         input_messages = [{"role": "system", "content": system_prompt}]
         input_messages += messages[-3:]
+        return input_messages
 
-        raw_output = get_gemini_chatbot_response(
-            input_messages,
-            model_name=self.model_name,
-        )
+    def _handle_raw_output(self, raw_output: str):
         print("\n[GeminiClassificationAgent] Raw model output:")
         try:
             print(raw_output)
@@ -68,8 +94,7 @@ class GeminiClassificationAgent:
             print("<unprintable output>")
 
         # We intentionally skip double_check_json_output_gemini here and
-        # parse the raw_output ourselves so we can robustly handle cases
-        # where Gemini wraps JSON in ```json ... ``` fences.
+        # repair the raw_output locally (fences, trailing commas, truncation).
         return self.postprocess(raw_output)
 
     def postprocess(self, output: str):
@@ -78,30 +103,8 @@ class GeminiClassificationAgent:
         try to infer the decision from the text; otherwise default to details_agent
         so the flow continues.
         """
-        try:
-            if not output or not output.strip():
-                raise ValueError("Empty JSON output from Gemini")
-            cleaned = output.strip()
-
-            # Strip ``` or ```json fences if present
-            if cleaned.startswith("```"):
-                lines = cleaned.splitlines()
-                # Drop first line with ``` or ```json
-                if lines:
-                    lines = lines[1:]
-                # Drop trailing ``` line if present
-                if lines and lines[-1].strip().startswith("```"):
-                    lines = lines[:-1]
-                cleaned = "\n".join(lines).strip()
-
-            # Extract JSON object between first '{' and last '}'
-            start = cleaned.find("{")
-            end = cleaned.rfind("}")
-            if start != -1 and end != -1:
-                cleaned = cleaned[start : end + 1]
-
-            data = json.loads(cleaned)
-        except Exception:
+        data = parse_json_output(output)
+        if not isinstance(data, dict):
             # Heuristic fallback: infer decision from the raw text
             text = output or ""
             decision = "details_agent"
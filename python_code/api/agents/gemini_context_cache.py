@@ -0,0 +1,232 @@
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import google.generativeai as genai
+
+
+def _get_context_cache_mode() -> str:
+    """
+    How static system instructions are sent to Gemini:
+      - "off": passed as system_instruction on every request (default)
+      - "on": uploaded once as provider-side CachedContent and referenced by handle
+      - "stub": local stand-in for "on" that hands out fake handles without
+        contacting Gemini, for tests and offline benchmarks
+    Override via GEMINI_CONTEXT_CACHE.
+    """
+    return os.getenv("GEMINI_CONTEXT_CACHE", "off").lower()
+
+
+def _get_context_cache_ttl() -> float:
+    """
+    Seconds an uploaded system instruction stays cached on the provider.
+    Override via GEMINI_CONTEXT_CACHE_TTL.
+    """
+    return float(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+
+
+# Handles are renewed this many seconds before they expire on the provider
+REFRESH_MARGIN = 60.0
+
+# Upper bound on distinct prefixes tracked (catalog or artifact reloads create new ones)
+MAX_PREFIXES = 64
+
+
+def system_instruction_key(model_name: str, system_instruction: str) -> str:
+    raw = "\x1f".join((model_name, system_instruction))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _CachedPrefix:
+    __slots__ = ("name", "handle", "expires_at", "models")
+
+    def __init__(self, name: str, handle: Any, expires_at: float):
+        self.name = name
+        self.handle = handle
+        self.expires_at = expires_at
+        # generation config (as JSON) -> GenerativeModel bound to the handle
+        self.models: Dict[str, "genai.GenerativeModel"] = {}
+
+
+class ContextCache:
+    """
+    Uploads static system instructions (menu, JSON rules, product lists) to
+    Gemini once and serves models bound to the cached handle, so each turn
+    only sends the conversation.
+
+    model() returns None whenever the prefix cannot be cached, e.g. because
+    the model does not support caching or the instruction is below the
+    provider's minimum size; the caller then passes the instruction inline.
+    A failed prefix is not retried until ttl seconds have passed.
+    """
+
+    mode = "on"
+
+    def __init__(self, ttl: float | None = None):
+        self.ttl = _get_context_cache_ttl() if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._create_lock = threading.Lock()
+        self._prefixes: "OrderedDict[str, _CachedPrefix]" = OrderedDict()
+        self._failed: Dict[str, float] = {}
+        self.uploads = 0
+        self.hits = 0
+        self.fallbacks = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def _create(self, model_name: str, system_instruction: str):
+        """Uploads the instruction; returns (handle name, handle)."""
+        cached = genai.caching.CachedContent.create(
+            model=model_name,
+            system_instruction=system_instruction,
+            ttl=datetime.timedelta(seconds=self.ttl),
+        )
+        return cached.name, cached
+
+    def _bind(self, prefix: _CachedPrefix, model_name: str, system_instruction: str, generation_config):
+        return genai.GenerativeModel.from_cached_content(
+            prefix.handle,
+            generation_config=genai.types.GenerationConfig(**generation_config) if generation_config else None,
+        )
+
+    def _lookup(self, key: str) -> Optional[_CachedPrefix]:
+        with self._lock:
+            prefix = self._prefixes.get(key)
+            if prefix is not None and prefix.expires_at - REFRESH_MARGIN > time.time():
+                self._prefixes.move_to_end(key)
+                return prefix
+            return None
+
+    def _prefix(self, model_name: str, system_instruction: str) -> Optional[_CachedPrefix]:
+        key = system_instruction_key(model_name, system_instruction)
+        prefix = self._lookup(key)
+        if prefix is not None:
+            return prefix
+
+        # One upload per prefix even when several requests miss at once
+        with self._create_lock:
+            prefix = self._lookup(key)
+            if prefix is not None:
+                return prefix
+            if self._failed.get(key, 0.0) > time.time():
+                return None
+            try:
+                name, handle = self._create(model_name, system_instruction)
+            except Exception as e:
+                print(f"[ContextCache] Could not cache system instruction for {model_name}, sending it inline: {e}")
+                self._failed[key] = time.time() + self.ttl
+                return None
+
+            prefix = _CachedPrefix(name, handle, time.time() + self.ttl)
+            with self._lock:
+                self.uploads += 1
+                self._prefixes[key] = prefix
+                while len(self._prefixes) > MAX_PREFIXES:
+                    self._prefixes.popitem(last=False)
+            print(f"[ContextCache] Uploaded system instruction as {name}")
+            return prefix
+
+    def model(
+        self,
+        model_name: str,
+        system_instruction: str,
+        generation_config: Dict[str, Any] | None = None,
+    ) -> Optional["genai.GenerativeModel"]:
+        """
+        GenerativeModel that references the cached system instruction, or
+        None when it has to be sent inline.
+        """
+        prefix = self._prefix(model_name, system_instruction)
+        if prefix is None:
+            with self._lock:
+                self.fallbacks += 1
+            return None
+
+        config_key = json.dumps(generation_config or {}, sort_keys=True)
+        model = prefix.models.get(config_key)
+        if model is None:
+            model = prefix.models.setdefault(
+                config_key, self._bind(prefix, model_name, system_instruction, generation_config)
+            )
+        with self._lock:
+            self.hits += 1
+        return model
+
+    def record_usage(self, usage_metadata) -> None:
+        """Adds a response's prompt and cached token counts to the stats."""
+        if usage_metadata is None:
+            return
+        with self._lock:
+            self.prompt_tokens += getattr(usage_metadata, "prompt_token_count", 0) or 0
+            self.cached_tokens += getattr(usage_metadata, "cached_content_token_count", 0) or 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "prefixes": len(self._prefixes),
+                "uploads": self.uploads,
+                "hits": self.hits,
+                "fallbacks": self.fallbacks,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+            }
+
+
+class StubContextCache(ContextCache):
+    """
+    ContextCache that never contacts Gemini: "uploads" are recorded locally
+    and models carry the instruction as a plain system_instruction, so the
+    caching path (one upload per prefix, renewal, fallbacks) can be
+    exercised in tests and offline benchmarks.
+    """
+
+    mode = "stub"
+
+    def __init__(self, ttl: float | None = None):
+        super().__init__(ttl)
+        self.contents: Dict[str, str] = {}
+
+    def _create(self, model_name: str, system_instruction: str):
+        name = "cachedContents/stub-" + system_instruction_key(model_name, system_instruction)[:16]
+        self.contents[name] = system_instruction
+        return name, name
+
+    def _bind(self, prefix: _CachedPrefix, model_name: str, system_instruction: str, generation_config):
+        return genai.GenerativeModel(
+            model_name,
+            generation_config=genai.types.GenerationConfig(**generation_config) if generation_config else None,
+            system_instruction=system_instruction,
+        )
+
+
+CONTEXT_CACHE_MODES = {
+    "on": ContextCache,
+    "stub": StubContextCache,
+}
+
+_context_cache: Optional[ContextCache] = None
+_context_cache_lock = threading.Lock()
+
+
+def get_context_cache() -> Optional[ContextCache]:
+    """
+    Returns the process-wide context cache selected by GEMINI_CONTEXT_CACHE,
+    or None when it is "off".
+    """
+    global _context_cache
+    if _context_cache is None:
+        mode = _get_context_cache_mode()
+        if mode == "off":
+            return None
+        with _context_cache_lock:
+            if _context_cache is None:
+                if mode not in CONTEXT_CACHE_MODES:
+                    raise ValueError(f"Unknown context cache mode: {mode}")
+                _context_cache = CONTEXT_CACHE_MODES[mode]()
+    return _context_cache
@@ -1,11 +1,21 @@
-from copy import deepcopy
-import json
+import asyncio
 import os
+import time
 
 from dotenv import load_dotenv
-from pinecone import Pinecone
 
-from .gemini_utils import get_gemini_chatbot_response, get_gemini_embedding
+from .gemini_backend import get_gemini_backend, is_replaying, vector_query_key
+from .gemini_utils import (
+    aget_gemini_chatbot_response,
+    aget_gemini_embedding,
+    get_gemini_chatbot_response,
+    get_gemini_embedding,
+    replace_last_content,
+    stream_gemini_chatbot_response,
+)
+from .local_vector_index import LocalVectorIndex, get_default_index_path
+from .product_catalog import get_product_catalog
+from .telemetry import span
 
 load_dotenv()
 
@@ -13,55 +23,167 @@ load_dotenv()
 class GeminiDetailsAgent:
     """
     Gemini-based equivalent of DetailsAgent.
-    Uses Gemini embeddings + Pinecone for retrieval, then Gemini for the final answer.
+    Uses Gemini embeddings + a vector index for retrieval, then Gemini for the final answer.
+
+    The index backend is chosen with index_backend or DETAILS_INDEX_BACKEND:
+      - "pinecone": remote Pinecone index (default)
+      - "local": in-process LocalVectorIndex loaded from LOCAL_VECTOR_INDEX_PATH
     """
 
-    def __init__(self, model_name: str | None = None, embedding_model_name: str | None = None):
+    def __init__(
+        self,
+        model_name: str | None = None,
+        embedding_model_name: str | None = None,
+        index_backend: str | None = None,
+        use_response_cache: bool = True,
+    ):
         self.model_name = model_name
+        self.use_response_cache = use_response_cache
         self.embedding_model_name = embedding_model_name
-        self.pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+        self.index_backend = (index_backend or os.getenv("DETAILS_INDEX_BACKEND", "pinecone")).lower()
         self.index_name = os.getenv("PINECONE_INDEX_NAME")
 
+        if self.index_backend == "local":
+            self.local_index = LocalVectorIndex.load(get_default_index_path())
+        elif self.index_backend == "pinecone" and is_replaying():
+            # Queries are served from the recordings, no client or API key needed
+            self._pinecone_indexes = {}
+        elif self.index_backend == "pinecone":
+            from pinecone import Pinecone
+
+            self.pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+            # Index handles are resolved once per name instead of on every query
+            self._pinecone_indexes = {}
+        else:
+            raise ValueError(f"Unknown details index backend: {self.index_backend}")
+
     def get_closest_results(self, index_name, input_embeddings, top_k: int = 2):
-        index = self.pc.Index(index_name)
-        results = index.query(
-            namespace="ns1",
-            vector=input_embeddings,
-            top_k=top_k,
-            include_values=False,
-            include_metadata=True,
-        )
-        return results
+        with span("vector_query", self.index_backend, top_k=top_k):
+            if self.index_backend == "local":
+                return self.local_index.query(input_embeddings, top_k=top_k)
+
+            # GEMINI_BACKEND_MODE=record/replay also covers the Pinecone queries
+            backend = get_gemini_backend()
+            key = vector_query_key(index_name, input_embeddings, top_k) if backend else None
+            if backend is not None and backend.mode == "replay":
+                results, delay = backend.vector_query(key, index_name)
+                time.sleep(delay)
+                return results
+
+            index = self._pinecone_indexes.get(index_name)
+            if index is None:
+                index = self.pc.Index(index_name)
+                self._pinecone_indexes[index_name] = index
+            started = time.perf_counter()
+            results = index.query(
+                namespace="ns1",
+                vector=input_embeddings,
+                top_k=top_k,
+                include_values=False,
+                include_metadata=True,
+            )
+            if backend is not None:
+                backend.record_vector_query(
+                    key, index_name, self._results_to_dict(results), time.perf_counter() - started
+                )
+            return results
+
+    def _results_to_dict(self, results):
+        """Plain-dict copy of a Pinecone query response, as stored in recordings."""
+        return {
+            "matches": [
+                {"id": match["id"], "score": match["score"], "metadata": dict(match["metadata"] or {})}
+                for match in results["matches"]
+            ]
+        }
 
     def get_response(self, messages):
-        messages = deepcopy(messages)
+        source_knowledge = self._retrieve_context(messages[-1]["content"])
+        input_messages = self._build_input_messages(messages, source_knowledge)
+        chatbot_output = get_gemini_chatbot_response(
+            input_messages,
+            model_name=self.model_name,
+            use_cache=self.use_response_cache,
+        )
+        return self.postprocess(chatbot_output)
 
-        user_message = messages[-1]["content"]
+    async def aget_response(self, messages):
+        source_knowledge = await self._aretrieve_context(messages[-1]["content"])
+        input_messages = self._build_input_messages(messages, source_knowledge)
+        chatbot_output = await aget_gemini_chatbot_response(
+            input_messages,
+            model_name=self.model_name,
+            use_cache=self.use_response_cache,
+        )
+        return self.postprocess(chatbot_output)
 
-        # Try to use Gemini embeddings + Pinecone; if it fails (dimension mismatch, etc.),
+    def stream_response(self, messages):
+        """
+        Streaming variant of get_response: yields text chunks as Gemini
+        produces them and returns the final response dict.
+        """
+        source_knowledge = self._retrieve_context(messages[-1]["content"])
+        input_messages = self._build_input_messages(messages, source_knowledge)
+        chunks = []
+        for chunk in stream_gemini_chatbot_response(
+            input_messages,
+            model_name=self.model_name,
+            use_cache=self.use_response_cache,
+        ):
+            chunks.append(chunk)
+            yield chunk
+        return self.postprocess("".join(chunks))
+
+    def _retrieve_context(self, user_message: str) -> str:
+        # Try to use Gemini embeddings + the vector index; if it fails (dimension mismatch, etc.),
         # fall back to answering using the local products.jsonl so we still stay
         # consistent with the actual app menu.
-        source_knowledge = ""
         try:
             embedding = get_gemini_embedding(
                 user_message,
                 model_name=self.embedding_model_name,
             )[0]
             result = self.get_closest_results(self.index_name, embedding)
-            source_knowledge = "\n".join(
-                [x["metadata"]["text"].strip() + "\n" for x in result["matches"]]
-            )
+            return self._format_matches(result)
         except Exception as e:
-            # Log to server console but don't break the user experience
-            print(
-                "GeminiDetailsAgent retrieval error with Pinecone; "
-                f"falling back to local products.jsonl context: {e}"
-            )
-            try:
-                source_knowledge = self._get_local_products_context()
-            except Exception as inner_e:
-                print(f"GeminiDetailsAgent local products fallback failed: {inner_e}")
-                source_knowledge = ""
+            return self._fallback_context(e)
+
+    async def _aretrieve_context(self, user_message: str) -> str:
+        try:
+            embedding = (
+                await aget_gemini_embedding(
+                    user_message,
+                    model_name=self.embedding_model_name,
+                )
+            )[0]
+            if self.index_backend == "local":
+                result = self.get_closest_results(self.index_name, embedding)
+            else:
+                # The Pinecone client is blocking; keep it off the event loop
+                result = await asyncio.to_thread(self.get_closest_results, self.index_name, embedding)
+            return self._format_matches(result)
+        except Exception as e:
+            return self._fallback_context(e)
+
+    def _format_matches(self, result) -> str:
+        return "\n".join(
+            [x["metadata"]["text"].strip() + "\n" for x in result["matches"]]
+        )
+
+    def _fallback_context(self, error: Exception) -> str:
+        # Log to server console but don't break the user experience
+        print(
+            f"GeminiDetailsAgent retrieval error with {self.index_backend} index; "
+            f"falling back to local products.jsonl context: {error}"
+        )
+        try:
+            return self._get_local_products_context()
+        except Exception as inner_e:
+            print(f"GeminiDetailsAgent local products fallback failed: {inner_e}")
+            return ""
+
+    def _build_input_messages(self, messages, source_knowledge: str):
+        user_message = messages[-1]["content"]
 
         prompt = f"""
         Using the contexts below, answer the query as a friendly waiter at ShopEase.
@@ -78,53 +200,16 @@ class GeminiDetailsAgent:
         about menu items, ingredients, store details, and general help with their visit or order.
         """
 
-        messages[-1]["content"] = prompt
-        input_messages = [{"role": "system", "content": system_prompt}] + messages[-3:]
-
-        chatbot_output = get_gemini_chatbot_response(
-            input_messages,
-            model_name=self.model_name,
-        )
-        return self.postprocess(chatbot_output)
+        return [{"role": "system", "content": system_prompt}] + replace_last_content(messages[-3:], prompt)
 
     def _get_local_products_context(self) -> str:
         """
-        Fallback: build context directly from the same products.jsonl file
-        that the Flask web_app uses. This keeps answers aligned with the
-        actual menu shown in the app even if Pinecone is misconfigured.
+        Fallback: build context from the shared ProductCatalog, which is
+        loaded from the same products.jsonl file that the Flask web_app uses.
+        This keeps answers aligned with the actual menu shown in the app even
+        if Pinecone is misconfigured.
         """
-        # Current file: python_code/api/agents/gemini_details_agent.py
-        # products.jsonl: python_code/products/products.jsonl
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        products_file = os.path.join(
-            current_dir, "..", "..", "products", "products.jsonl"
-        )
-
-        lines = []
-        try:
-            with open(products_file, "r", encoding="utf-8") as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        product = json.loads(line)
-                    except json.JSONDecodeError:
-                        continue
-
-                    name = product.get("name", "")
-                    category = product.get("category", "")
-                    price = product.get("price", 0)
-                    description = product.get("description", "")
-
-                    snippet = f"Name: {name}\nCategory: {category}\nPrice: ₹{price}\nDescription: {description}\n"
-                    lines.append(snippet)
-        except FileNotFoundError:
-            print(f"GeminiDetailsAgent could not find products file at {products_file}")
-        except Exception as e:
-            print(f"GeminiDetailsAgent error reading products file: {e}")
-
-        return "\n".join(lines)
+        return get_product_catalog().products_context()
 
     def postprocess(self, output: str):
         return {
@@ -1,9 +1,12 @@
-import json
-from copy import deepcopy
-
 from dotenv import load_dotenv
 
-from .gemini_utils import get_gemini_chatbot_response, double_check_json_output_gemini
+from .gemini_schemas import GUARD_SCHEMA
+from .gemini_utils import (
+    aget_gemini_chatbot_response,
+    get_gemini_chatbot_response,
+    structured_output_enabled,
+)
+from .json_repair import parse_json_output
 
 load_dotenv()
 
@@ -19,12 +22,64 @@ class GeminiGuardAgent:
           - memory.guard_decision
     """
 
-    def __init__(self, model_name: str | None = None):
+    def __init__(
+        self,
+        model_name: str | None = None,
+        use_response_cache: bool = True,
+        structured_output: bool | None = None,
+    ):
         self.model_name = model_name
+        self.use_response_cache = use_response_cache
+        self.structured_output = structured_output_enabled() if structured_output is None else structured_output
+        self.response_schema = GUARD_SCHEMA if self.structured_output else None
 
     def get_response(self, messages):
-        messages = deepcopy(messages)
+        input_messages = self._build_input_messages(messages)
+
+        # Call Gemini once; avoid the extra double-check call here to reduce
+        # quota usage and the chance of hitting 429 rate limits.
+        try:
+            raw_output = get_gemini_chatbot_response(
+                input_messages,
+                model_name=self.model_name,
+                use_cache=self.use_response_cache,
+                response_schema=self.response_schema,
+            )
+        except Exception as e:
+            # On any API error (including 429), default to "allowed"
+            # so the rest of the pipeline can continue.
+            print(f"[GeminiGuardAgent] Error calling Gemini: {e}")
+            return self._fallback_response()
+
+        return self.postprocess(raw_output)
+
+    async def aget_response(self, messages):
+        input_messages = self._build_input_messages(messages)
+
+        try:
+            raw_output = await aget_gemini_chatbot_response(
+                input_messages,
+                model_name=self.model_name,
+                use_cache=self.use_response_cache,
+                response_schema=self.response_schema,
+            )
+        except Exception as e:
+            print(f"[GeminiGuardAgent] Error calling Gemini: {e}")
+            return self._fallback_response()
+
+        return self.postprocess(raw_output)
+
+    def _fallback_response(self):
+        return {
+            "role": "assistant",
+            "content": "",
+            "memory": {
+                "agent": "guard_agent",
+                "guard_decision": "allowed",
+            },
+        }
 
+    def _build_input_messages(self, messages):
         system_prompt = """
             You are a helpful AI assistant for a coffee shop application which serves drinks and pastries.
             Your task is to determine whether the user is asking something relevant to the coffee shop or not.
@@ -40,35 +95,12 @@ class GeminiGuardAgent:
 
             Your output MUST be valid JSON with this exact structure:
             {
-              "chain of thought": "<your reasoning>",
               "decision": "allowed" or "not allowed",
               "message": "" if allowed, otherwise "Sorry, I can't help with that. Can I help you with your order?"
             }
         """
 
-        input_messages = [{"role": "system", "content": system_prompt}] + messages[-3:]
-
-        # Call Gemini once; avoid the extra double-check call here to reduce
-        # quota usage and the chance of hitting 429 rate limits.
-        try:
-            raw_output = get_gemini_chatbot_response(
-                input_messages,
-                model_name=self.model_name,
-            )
-        except Exception as e:
-            # On any API error (including 429), default to "allowed"
-            # so the rest of the pipeline can continue.
-            print(f"[GeminiGuardAgent] Error calling Gemini: {e}")
-            return {
-                "role": "assistant",
-                "content": "",
-                "memory": {
-                    "agent": "guard_agent",
-                    "guard_decision": "allowed",
-                },
-            }
-
-        return self.postprocess(raw_output)
+        return [{"role": "system", "content": system_prompt}] + messages[-3:]
 
     def postprocess(self, output: str):
         """
@@ -76,28 +108,8 @@ class GeminiGuardAgent:
         If parsing fails or we get an empty string, default to "allowed"
         with an empty message so the rest of the pipeline can continue.
         """
-        try:
-            if not output or not output.strip():
-                raise ValueError("Empty JSON output from Gemini")
-            cleaned = output.strip()
-
-            # Strip ``` or ```json fences if present
-            if cleaned.startswith("```"):
-                lines = cleaned.splitlines()
-                if lines:
-                    lines = lines[1:]
-                if lines and lines[-1].strip().startswith("```"):
-                    lines = lines[:-1]
-                cleaned = "\n".join(lines).strip()
-
-            # Extract JSON object between first '{' and last '}'
-            start = cleaned.find("{")
-            end = cleaned.rfind("}")
-            if start != -1 and end != -1:
-                cleaned = cleaned[start : end + 1]
-
-            data = json.loads(cleaned)
-        except Exception:
+        data = parse_json_output(output)
+        if not isinstance(data, dict):
             data = {
                 "decision": "allowed",
                 "message": "",
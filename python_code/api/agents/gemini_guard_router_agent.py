@@ -0,0 +1,128 @@
+from dotenv import load_dotenv
+
+from .gemini_schemas import GUARD_ROUTER_SCHEMA, VALID_ROUTES
+from .gemini_utils import (
+    aget_gemini_chatbot_response,
+    get_gemini_chatbot_response,
+    structured_output_enabled,
+)
+from .json_repair import parse_json_output
+
+load_dotenv()
+
+
+class GeminiGuardRouterAgent:
+    """
+    Fused guard + classification agent.
+
+    Makes a single Gemini call that returns both the guard decision and the
+    routing decision, instead of one call for GeminiGuardAgent and another for
+    GeminiClassificationAgent.
+
+    Interface:
+        get_response(messages: List[Dict]) -> Dict with keys:
+          - role
+          - content
+          - memory.guard_decision
+          - memory.classification_decision
+
+    Unlike the single-purpose agents, errors are raised instead of defaulted so
+    the controller can fall back to the two-agent path.
+    """
+
+    def __init__(
+        self,
+        model_name: str | None = None,
+        use_response_cache: bool = True,
+        structured_output: bool | None = None,
+    ):
+        self.model_name = model_name
+        self.use_response_cache = use_response_cache
+        self.structured_output = structured_output_enabled() if structured_output is None else structured_output
+        self.response_schema = GUARD_ROUTER_SCHEMA if self.structured_output else None
+
+    def get_response(self, messages):
+        raw_output = get_gemini_chatbot_response(
+            self._build_input_messages(messages),
+            model_name=self.model_name,
+            use_cache=self.use_response_cache,
+            response_schema=self.response_schema,
+        )
+        return self.postprocess(raw_output)
+
+    async def aget_response(self, messages):
+        raw_output = await aget_gemini_chatbot_response(
+            self._build_input_messages(messages),
+            model_name=self.model_name,
+            use_cache=self.use_response_cache,
+            response_schema=self.response_schema,
+        )
+        return self.postprocess(raw_output)
+
+    def _build_input_messages(self, messages):
+        system_prompt = """
+            You are a helpful AI assistant for a coffee shop application which serves drinks and pastries.
+            You have two tasks for the latest user message.
+
+            TASK 1 - Decide whether the message is allowed.
+            The user is allowed to:
+            1. Ask questions about the coffee shop, like location, working hours, menu items and coffee shop related questions.
+            2. Ask questions about menu items, they can ask for ingredients in an item and more details about the item.
+            3. Make an order.
+            4. Ask about recommendations of what to buy.
+
+            The user is NOT allowed to:
+            1. Ask questions about anything else other than our coffee shop.
+            2. Ask questions about the staff or how to make a certain menu item.
+
+            TASK 2 - If the message is allowed, decide which agent should handle it:
+            1. details_agent: Responsible for answering questions about the coffee shop, like location, delivery places, working hours, and details about menu items, or listing menu items.
+            2. order_taking_agent: Responsible for taking orders from the user and managing the full order-taking conversation.
+            3. recommendation_agent: Responsible for giving recommendations to the user about what to buy.
+
+            VERY IMPORTANT ROUTING RULES:
+            - If the user is ordering, adding/removing items, changing quantity, or talking about "my order",
+              "add X", "remove X", "I want", "I'd like", "buy", "order", or quantities of products,
+              you MUST choose "order_taking_agent".
+            - Only choose "details_agent" when the user is just asking for information (menu, prices, timings, store info)
+              without actually placing or changing an order.
+            - Only choose "recommendation_agent" when the user clearly asks for suggestions like
+              "What should I get?" or "Recommend me something", without specifying a concrete order.
+
+            Your output MUST be a single, valid JSON object with this exact structure
+            and nothing else before or after it (no markdown, no explanations):
+            {
+              "decision": "allowed" or "not allowed",
+              "route": "details_agent" or "order_taking_agent" or "recommendation_agent",
+              "message": "" if allowed, otherwise "Sorry, I can't help with that. Can I help you with your order?"
+            }
+        """
+
+        return [{"role": "system", "content": system_prompt}] + messages[-3:]
+
+    def postprocess(self, output: str):
+        """
+        Parse the fused JSON output. Raises ValueError when the output cannot
+        be parsed or contains an unknown decision/route.
+        """
+        data = parse_json_output(output)
+        if not isinstance(data, dict):
+            raise ValueError("Could not parse JSON output from Gemini")
+
+        decision = data.get("decision")
+        if decision not in ("allowed", "not allowed"):
+            raise ValueError(f"Unknown guard decision from Gemini: {decision!r}")
+
+        route = data.get("route")
+        if decision == "allowed" and route not in VALID_ROUTES:
+            raise ValueError(f"Unknown route from Gemini: {route!r}")
+
+        return {
+            "role": "assistant",
+            "content": data.get("message", "") if decision == "not allowed" else "",
+            "memory": {
+                "agent": "guard_router_agent",
+                "guard_decision": decision,
+                "classification_decision": route if decision == "allowed" else None,
+            },
+        }
@@ -1,14 +1,35 @@
 import ast
 import json
-from copy import deepcopy
+import os
 
 from dotenv import load_dotenv
 
-from .gemini_utils import get_gemini_chatbot_response, double_check_json_output_gemini
+from .gemini_cache import normalize_text
+from .gemini_schemas import ORDER_TAKING_SCHEMA
+from .gemini_utils import (
+    aget_gemini_chatbot_response,
+    arepair_json_output_gemini,
+    get_gemini_chatbot_response,
+    repair_json_output_gemini,
+    replace_last_content,
+    structured_output_enabled,
+)
+from .json_repair import parse_json_output
+from .order_engine import OFF_CATALOG_ITEMS, Order, OrderEngine, format_price, menu_label
+from .product_catalog import get_product_catalog
 
 load_dotenv()
 
 
+def _use_local_order_engine() -> bool:
+    """
+    Whether simple order edits ("add 2 lattes", "remove the croissant") are
+    applied by the local OrderEngine instead of Gemini.
+    Override via GEMINI_LOCAL_ORDER_ENGINE.
+    """
+    return os.getenv("GEMINI_LOCAL_ORDER_ENGINE", "true").lower() == "true"
+
+
 class GeminiOrderTakingAgent:
     """
     Gemini-based equivalent of OrderTakingAgent.
@@ -22,37 +43,140 @@ class GeminiOrderTakingAgent:
       }
     """
 
-    def __init__(self, recommendation_agent, model_name: str | None = None):
+    def __init__(
+        self,
+        recommendation_agent,
+        model_name: str | None = None,
+        use_response_cache: bool = True,
+        structured_output: bool | None = None,
+        local_order_engine: bool | None = None,
+    ):
         self.model_name = model_name
+        self.use_response_cache = use_response_cache
+        self.structured_output = structured_output_enabled() if structured_output is None else structured_output
+        self.response_schema = ORDER_TAKING_SCHEMA if self.structured_output else None
         self.recommendation_agent = recommendation_agent
+        self.catalog = get_product_catalog()
+        use_engine = _use_local_order_engine() if local_order_engine is None else local_order_engine
+        self.order_engine = OrderEngine(self.catalog) if use_engine else None
 
     def get_response(self, messages):
-        messages = deepcopy(messages)
+        step_number, order, asked_recommendation_before = self._last_order_status(messages)
+
+        data = self._resolve_locally(messages, order)
+        if data is not None:
+            return self._respond(data, messages, asked_recommendation_before)
+
+        input_messages, messages = self._build_input_messages(messages, step_number, order)
+
+        raw_output = get_gemini_chatbot_response(
+            input_messages,
+            model_name=self.model_name,
+            use_cache=self.use_response_cache,
+            response_schema=self.response_schema,
+        )
+
+        # With a response schema the output is already valid JSON
+        json_output = raw_output
+        if not self.structured_output:
+            json_output = repair_json_output_gemini(
+                raw_output,
+                model_name=self.model_name,
+            )
+
+        return self.postprocess(json_output, messages, asked_recommendation_before)
+
+    async def aget_response(self, messages):
+        step_number, order, asked_recommendation_before = self._last_order_status(messages)
+
+        data = self._resolve_locally(messages, order)
+        if data is not None:
+            return await self._arespond(data, messages, asked_recommendation_before)
+
+        input_messages, messages = self._build_input_messages(messages, step_number, order)
+
+        raw_output = await aget_gemini_chatbot_response(
+            input_messages,
+            model_name=self.model_name,
+            use_cache=self.use_response_cache,
+            response_schema=self.response_schema,
+        )
+
+        json_output = raw_output
+        if not self.structured_output:
+            json_output = await arepair_json_output_gemini(
+                raw_output,
+                model_name=self.model_name,
+            )
+
+        return await self.apostprocess(json_output, messages, asked_recommendation_before)
+
+    def _last_order_status(self, messages):
+        """
+        Returns (step_number, order, asked_recommendation_before) from the
+        latest order-taking message, with the order as a typed Order priced
+        from the catalog.
+        """
+        # Index 0 included: a stored conversation window may start with the
+        # pinned order-taking message
+        for message_index in range(len(messages) - 1, -1, -1):
+            message = messages[message_index]
+
+            agent_name = message.get("memory", {}).get("agent", "")
+            if message["role"] == "assistant" and agent_name == "order_taking_agent":
+                return (
+                    message["memory"]["step number"],
+                    Order.from_memory(message["memory"]["order"], self.catalog),
+                    message["memory"]["asked_recommendation_before"],
+                )
+        return None, Order(), False
+
+    def _resolve_locally(self, messages, order: Order):
+        """
+        Applies the latest user message with the OrderEngine. Returns the
+        same dict _parse_output builds from Gemini's JSON, or None when the
+        message needs Gemini.
+        """
+        if self.order_engine is None or not messages or messages[-1].get("role") != "user":
+            return None
+        update = self.order_engine.update(messages[-1].get("content", ""), order)
+        if update is None:
+            return None
+        print(f"[GeminiOrderTakingAgent] Resolved locally, step {update.step_number}")
+        return {
+            "step number": update.step_number,
+            "order": update.order.to_memory(),
+            "response": update.response,
+            # Only new items trigger the one-time recommendation
+            "recommend": update.added_items,
+        }
+
+    def _menu(self) -> str:
+        def build(catalog) -> str:
+            # Products sharing a name with an off-catalog item are told apart by category
+            shared = {normalize_text(name) for name, _, _ in OFF_CATALOG_ITEMS}
+            items = [
+                (menu_label(p.name, p.category) if normalize_text(p.name) in shared else p.name, p.price)
+                for p in catalog.products
+            ]
+            items += [(menu_label(name, category), price) for name, category, price in OFF_CATALOG_ITEMS]
+            return "\n".join(f"            {name} - {format_price(price)}" for name, price in items)
+
+        return self.catalog.derived("order_taking_menu", build)
+
+    def _build_input_messages(self, messages, step_number, order: Order):
+        """
+        Returns (input_messages, messages) where messages is a new list
+        holding the latest turns, the last one carrying the previous order
+        status; the other message dicts are shared, not copied.
+        """
 
         system_prompt = """
             You are a customer support Bot for a coffee shop called "ShopEase" in Mumbai.
 
             Here is the menu for this coffee shop (prices in INR):
 
-            Cappuccino - ₹375
-            Jumbo Savory Scone - ₹270
-            Latte - ₹395
-            Chocolate Chip Biscotti - ₹210
-            Espresso shot - ₹165
-            Hazelnut Biscotti - ₹230
-            Chocolate Croissant - ₹310
-            Dark chocolate (Drinking Chocolate) - ₹415
-            Cranberry Scone - ₹290
-            Croissant - ₹270
-            Almond Croissant - ₹330
-            Ginger Biscotti - ₹210
-            Oatmeal Scone - ₹270
-            Ginger Scone - ₹290
-            Chocolate syrup - ₹125
-            Hazelnut syrup - ₹125
-            Carmel syrup - ₹125
-            Sugar Free Vanilla syrup - ₹125
-            Dark chocolate (Packaged Chocolate) - ₹250
+""" + self._menu() + """
 
             Things to NOT DO:
             * Don't ask how to pay by cash or card.
@@ -79,7 +203,6 @@ class GeminiOrderTakingAgent:
             - Your output MUST be a single, valid JSON object with this exact structure
               and nothing else before or after it (no markdown, no explanations):
               {
-                "chain of thought": "<your reasoning>",
                 "step number": "<current step number as a string>",
                 "order": [ { "item": "<name>", "quantity": <int>, "price": <number> }, ... ],
                 "response": "<what you say to the user>"
@@ -94,7 +217,6 @@ class GeminiOrderTakingAgent:
               User: "I want 2 Cappuccinos and 1 Chocolate Croissant"
               Valid JSON (do not include this explanation in your output):
               {
-                "chain of thought": "...",
                 "step number": "2",
                 "order": [
                   { "item": "Cappuccino", "quantity": 2, "price": 375 },
@@ -105,43 +227,65 @@ class GeminiOrderTakingAgent:
         """
 
         last_order_taking_status = ""
-        asked_recommendation_before = False
-
-        for message_index in range(len(messages) - 1, 0, -1):
-            message = messages[message_index]
-
-            agent_name = message.get("memory", {}).get("agent", "")
-            if message["role"] == "assistant" and agent_name == "order_taking_agent":
-                step_number = message["memory"]["step number"]
-                order = message["memory"]["order"]
-                asked_recommendation_before = message["memory"]["asked_recommendation_before"]
-                last_order_taking_status = f"""
+        if step_number is not None:
+            last_order_taking_status = f"""
                 step number: {step_number}
-                order: {order}
+                order: {order.to_memory()}
                 """
-                break
-
-        messages[-1]["content"] = last_order_taking_status + " \n " + messages[-1]["content"]
-
-        input_messages = [{"role": "system", "content": system_prompt}] + messages
 
-        raw_output = get_gemini_chatbot_response(
-            input_messages,
-            model_name=self.model_name,
-        )
-
-        json_output = double_check_json_output_gemini(
-            raw_output,
-            model_name=self.model_name,
+        # The order status travels in the last message, so the latest turns
+        # are enough context
+        messages = replace_last_content(
+            messages[-3:],
+            last_order_taking_status + " \n " + messages[-1]["content"],
         )
 
-        return self.postprocess(json_output, messages, asked_recommendation_before)
+        input_messages = [{"role": "system", "content": system_prompt}] + messages
+        return input_messages, messages
 
     def postprocess(self, output: str, messages, asked_recommendation_before: bool):
         """
         Safely parse JSON from Gemini. If parsing fails, fall back to an empty order and
         a generic response so the UI does not crash.
         """
+        return self._respond(self._parse_output(output), messages, asked_recommendation_before)
+
+    async def apostprocess(self, output: str, messages, asked_recommendation_before: bool):
+        """
+        Async version of postprocess.
+        """
+        return await self._arespond(self._parse_output(output), messages, asked_recommendation_before)
+
+    def _respond(self, data, messages, asked_recommendation_before: bool):
+        response = data.get("response", "")
+
+        if not asked_recommendation_before and data.get("recommend", True) and len(data.get("order", [])) > 0:
+            recommendation_output = self.recommendation_agent.get_recommendations_from_order(
+                messages,
+                data["order"],
+            )
+            response = recommendation_output["content"]
+            asked_recommendation_before = True
+
+        return self._build_response(data, response, asked_recommendation_before)
+
+    async def _arespond(self, data, messages, asked_recommendation_before: bool):
+        response = data.get("response", "")
+
+        if not asked_recommendation_before and data.get("recommend", True) and len(data.get("order", [])) > 0:
+            recommendation_output = await self.recommendation_agent.aget_recommendations_from_order(
+                messages,
+                data["order"],
+            )
+            response = recommendation_output["content"]
+            asked_recommendation_before = True
+
+        return self._build_response(data, response, asked_recommendation_before)
+
+    def _parse_output(self, output: str):
+        """
+        Parses the model output into a dict with a normalized "order" list.
+        """
         print("\n[GeminiOrderTakingAgent] Raw model output:")
         try:
             print(output)
@@ -149,12 +293,8 @@ class GeminiOrderTakingAgent:
             # In case printing fails on some weird characters
             print("<unprintable output>")
 
-        try:
-            if not output or not output.strip():
-                raise ValueError("Empty JSON output from Gemini")
-            cleaned_output = self._extract_json_string(output)
-            data = json.loads(cleaned_output)
-        except Exception:
+        data = parse_json_output(output)
+        if not isinstance(data, dict):
             data = {
                 "step number": "1",
                 "order": [],
@@ -206,7 +346,8 @@ class GeminiOrderTakingAgent:
                 }
             )
 
-        data["order"] = normalized_order
+        # Names and prices come from the catalog, whatever the model wrote
+        data["order"] = Order.from_memory(normalized_order, self.catalog).to_memory()
 
         print("[GeminiOrderTakingAgent] Normalized order:")
         try:
@@ -214,47 +355,18 @@ class GeminiOrderTakingAgent:
         except Exception:
             print("<unprintable order>")
 
-        response = data.get("response", "")
-
-        if not asked_recommendation_before and len(data.get("order", [])) > 0:
-            recommendation_output = self.recommendation_agent.get_recommendations_from_order(
-                messages,
-                data["order"],
-            )
-            response = recommendation_output["content"]
-            asked_recommendation_before = True
+        return data
 
+    def _build_response(self, data, response: str, asked_recommendation_before: bool):
+        order = data.get("order", [])
         return {
             "role": "assistant",
             "content": response,
             "memory": {
                 "agent": "order_taking_agent",
                 "step number": data.get("step number", "1"),
-                "order": data.get("order", []),
+                "order": order,
+                "total": sum(item["quantity"] * item["price"] for item in order),
                 "asked_recommendation_before": asked_recommendation_before,
             },
         }
-
-    def _extract_json_string(self, output: str) -> str:
-        """
-        Normalize Gemini output by stripping code fences or extra text so json.loads succeeds.
-        """
-        cleaned = output.strip()
-
-        if cleaned.startswith("```"):
-            lines = cleaned.splitlines()
-            if lines:
-                lines = lines[1:]
-            if lines and lines[-1].strip().startswith("```"):
-                lines = lines[:-1]
-            cleaned = "\n".join(lines).strip()
-
-        start = cleaned.find("{")
-        end = cleaned.rfind("}")
-        if start != -1 and end != -1 and end > start:
-            cleaned = cleaned[start : end + 1]
-
-        return cleaned
-
-
-
@@ -1,11 +1,20 @@
-import json
 import os
-from copy import deepcopy
 
-import pandas as pd
 from dotenv import load_dotenv
 
-from .gemini_utils import get_gemini_chatbot_response, double_check_json_output_gemini
+from .gemini_schemas import RECOMMENDATION_CLASSIFICATION_SCHEMA
+from .gemini_utils import (
+    aget_gemini_chatbot_response,
+    arepair_json_output_gemini,
+    get_gemini_chatbot_response,
+    repair_json_output_gemini,
+    replace_last_content,
+    stream_gemini_chatbot_response,
+    structured_output_enabled,
+)
+from .json_repair import parse_json_output
+from .recommendation_artifacts import RecommendationArtifacts
+from .recommendation_index import RecommendationIndex
 
 load_dotenv()
 
@@ -20,71 +29,52 @@ class GeminiRecommendationAgent:
     and the same output structure used by the controller.
     """
 
-    def __init__(self, apriori_recommendation_path, popular_recommendation_path, model_name: str | None = None):
+    def __init__(
+        self,
+        apriori_recommendation_path: str | None = None,
+        popular_recommendation_path: str | None = None,
+        association_rules_path: str | None = None,
+        model_name: str | None = None,
+        use_response_cache: bool = True,
+        structured_output: bool | None = None,
+        artifacts: RecommendationArtifacts | None = None,
+    ):
         self.model_name = model_name
-
-        with open(apriori_recommendation_path, "r") as file:
-            self.apriori_recommendations = json.load(file)
-
-        self.popular_recommendations = pd.read_csv(popular_recommendation_path)
-        self.products = self.popular_recommendations["product"].tolist()
-        self.product_categories = self.popular_recommendations["product_category"].tolist()
+        self.use_response_cache = use_response_cache
+        self.structured_output = structured_output_enabled() if structured_output is None else structured_output
+        self.classification_schema = RECOMMENDATION_CLASSIFICATION_SCHEMA if self.structured_output else None
+
+        # Paths are resolved against their own directory, so the agent no
+        # longer depends on the process working directory
+        if artifacts is None and apriori_recommendation_path and popular_recommendation_path:
+            artifacts = RecommendationArtifacts.from_paths(
+                apriori_recommendation_path,
+                popular_recommendation_path,
+                association_rules_path,
+            )
+        self.artifacts = artifacts or RecommendationArtifacts()
+
+    @property
+    def recommendation_index(self) -> RecommendationIndex:
+        """Index of the artifact version currently served; may change between calls"""
+        return self.artifacts.index
+
+    @property
+    def products(self):
+        return self.recommendation_index.popular_products
+
+    @property
+    def product_categories(self):
+        return self.recommendation_index.popular_categories
 
     def get_apriori_recommendation(self, products, top_k: int = 5):
-        recommendation_list = []
-        for product in products:
-            if product in self.apriori_recommendations:
-                recommendation_list += self.apriori_recommendations[product]
-
-        recommendation_list = sorted(
-            recommendation_list,
-            key=lambda x: x["confidence"],
-            reverse=True,
-        )
-
-        recommendations = []
-        recommendations_per_category = {}
-        for recommendation in recommendation_list:
-            if recommendation in recommendations:
-                continue
-
-            product_category = recommendation["product_category"]
-            if product_category not in recommendations_per_category:
-                recommendations_per_category[product_category] = 0
-
-            if recommendations_per_category[product_category] >= 2:
-                continue
-
-            recommendations_per_category[product_category] += 1
-            recommendations.append(recommendation["product"])
-
-            if len(recommendations) >= top_k:
-                break
-
-        return recommendations
+        return self.recommendation_index.apriori(products, top_k=top_k)
 
     def get_popular_recommendation(self, product_categories=None, top_k: int = 5):
-        recommendations_df = self.popular_recommendations
-
-        if isinstance(product_categories, str):
-            product_categories = [product_categories]
-
-        if product_categories is not None:
-            recommendations_df = self.popular_recommendations[
-                self.popular_recommendations["product_category"].isin(product_categories)
-            ]
-        recommendations_df = recommendations_df.sort_values(
-            by="number_of_transactions",
-            ascending=False,
-        )
-
-        if recommendations_df.shape[0] == 0:
-            return []
-
-        recommendations = recommendations_df["product"].tolist()[:top_k]
-        return recommendations
+        return self.recommendation_index.popular(product_categories, top_k=top_k)
 
-    def recommendation_classification(self, messages):
+    def _classification_input_messages(self, messages):
+        index = self.recommendation_index
         system_prompt = f"""You are a helpful AI assistant for a coffee shop application which serves drinks and pastries.
 We have 3 types of recommendations:
 
@@ -93,37 +83,114 @@ We have 3 types of recommendations:
 3. Popular Recommendations by Category: User asks for a recommendation in a specific category (e.g., "What coffee do you recommend?").
 
 Here is the list of items in the coffee shop:
-{",".join(self.products)}
+{",".join(index.popular_products)}
 
 Here is the list of categories we have in the coffee shop:
-{",".join(self.product_categories)}
+{",".join(index.popular_categories)}
 
 Your task is to determine which type of recommendation to provide based on the user's message.
 
 Your output MUST be a single, valid JSON object with this exact structure
 and nothing else before or after it (no markdown, no explanations):
 {{
-  "chain of thought": "<your reasoning>",
   "recommendation_type": "apriori" or "popular" or "popular by category",
   "parameters": []  // a Python-style list: list of items (for apriori) or list of categories (for popular by category). Empty for popular.
 }}
 """
 
-        input_messages = [{"role": "system", "content": system_prompt}] + messages[-3:]
+        return [{"role": "system", "content": system_prompt}] + messages[-3:]
+
+    def recommendation_classification(self, messages):
+        input_messages = self._classification_input_messages(messages)
         raw_output = get_gemini_chatbot_response(
             input_messages,
             model_name=self.model_name,
+            use_cache=self.use_response_cache,
+            response_schema=self.classification_schema,
         )
-        json_output = double_check_json_output_gemini(
-            raw_output,
+        json_output = raw_output
+        if not self.structured_output:
+            json_output = repair_json_output_gemini(
+                raw_output,
+                model_name=self.model_name,
+            )
+        return self.postprocess_classification(json_output)
+
+    async def arecommendation_classification(self, messages):
+        input_messages = self._classification_input_messages(messages)
+        raw_output = await aget_gemini_chatbot_response(
+            input_messages,
             model_name=self.model_name,
+            use_cache=self.use_response_cache,
+            response_schema=self.classification_schema,
         )
+        json_output = raw_output
+        if not self.structured_output:
+            json_output = await arepair_json_output_gemini(
+                raw_output,
+                model_name=self.model_name,
+            )
         return self.postprocess_classification(json_output)
 
     def get_response(self, messages):
-        messages = deepcopy(messages)
+        recommendation_classification = self.recommendation_classification(messages)
+        input_messages = self._build_input_messages(messages, recommendation_classification)
+        if input_messages is None:
+            return self._no_recommendations_response()
+
+        chatbot_output = get_gemini_chatbot_response(
+            input_messages,
+            model_name=self.model_name,
+            use_cache=self.use_response_cache,
+        )
+        return self.postprocess(chatbot_output)
 
+    async def aget_response(self, messages):
+        recommendation_classification = await self.arecommendation_classification(messages)
+        input_messages = self._build_input_messages(messages, recommendation_classification)
+        if input_messages is None:
+            return self._no_recommendations_response()
+
+        chatbot_output = await aget_gemini_chatbot_response(
+            input_messages,
+            model_name=self.model_name,
+            use_cache=self.use_response_cache,
+        )
+        return self.postprocess(chatbot_output)
+
+    def stream_response(self, messages):
+        """
+        Streaming variant of get_response: yields text chunks as Gemini
+        produces them and returns the final response dict.
+        """
         recommendation_classification = self.recommendation_classification(messages)
+        input_messages = self._build_input_messages(messages, recommendation_classification)
+        if input_messages is None:
+            response = self._no_recommendations_response()
+            yield response["content"]
+            return response
+
+        chunks = []
+        for chunk in stream_gemini_chatbot_response(
+            input_messages,
+            model_name=self.model_name,
+            use_cache=self.use_response_cache,
+        ):
+            chunks.append(chunk)
+            yield chunk
+        return self.postprocess("".join(chunks))
+
+    def _no_recommendations_response(self):
+        return {
+            "role": "assistant",
+            "content": "Sorry, I can't help with that. Can I help you with your order?",
+        }
+
+    def _build_input_messages(self, messages, recommendation_classification):
+        """
+        Looks up the recommendations for a classification result and builds
+        the Gemini input. Returns None when there is nothing to recommend.
+        """
         recommendation_type = recommendation_classification["recommendation_type"]
         recommendations = []
 
@@ -135,10 +202,7 @@ and nothing else before or after it (no markdown, no explanations):
             recommendations = self.get_popular_recommendation(recommendation_classification["parameters"])
 
         if recommendations == []:
-            return {
-                "role": "assistant",
-                "content": "Sorry, I can't help with that. Can I help you with your order?",
-            }
+            return None
 
         recommendations_str = ", ".join(recommendations)
 
@@ -154,25 +218,15 @@ and nothing else before or after it (no markdown, no explanations):
         Please recommend these items exactly: {recommendations_str}
         """
 
-        messages[-1]["content"] = prompt
-        input_messages = [{"role": "system", "content": system_prompt}] + messages[-3:]
-
-        chatbot_output = get_gemini_chatbot_response(
-            input_messages,
-            model_name=self.model_name,
-        )
-        return self.postprocess(chatbot_output)
+        return [{"role": "system", "content": system_prompt}] + replace_last_content(messages[-3:], prompt)
 
     def postprocess_classification(self, output: str):
         """
         Safely parse JSON from Gemini for recommendation classification.
         If parsing fails, default to popular recommendations with no parameters.
         """
-        try:
-            if not output or not output.strip():
-                raise ValueError("Empty JSON output from Gemini")
-            data = json.loads(output)
-        except Exception:
+        data = parse_json_output(output)
+        if not isinstance(data, dict):
             data = {
                 "recommendation_type": "popular",
                 "parameters": [],
@@ -184,6 +238,24 @@ and nothing else before or after it (no markdown, no explanations):
         }
 
     def get_recommendations_from_order(self, messages, order):
+        input_messages = self._order_recommendation_messages(messages, order)
+        chatbot_output = get_gemini_chatbot_response(
+            input_messages,
+            model_name=self.model_name,
+            use_cache=self.use_response_cache,
+        )
+        return self.postprocess(chatbot_output)
+
+    async def aget_recommendations_from_order(self, messages, order):
+        input_messages = self._order_recommendation_messages(messages, order)
+        chatbot_output = await aget_gemini_chatbot_response(
+            input_messages,
+            model_name=self.model_name,
+            use_cache=self.use_response_cache,
+        )
+        return self.postprocess(chatbot_output)
+
+    def _order_recommendation_messages(self, messages, order):
         products = [product["item"] for product in order]
         recommendations = self.get_apriori_recommendation(products)
         recommendations_str = ", ".join(recommendations)
@@ -199,14 +271,7 @@ and nothing else before or after it (no markdown, no explanations):
         Please recommend these items exactly: {recommendations_str}
         """
 
-        messages[-1]["content"] = prompt
-        input_messages = [{"role": "system", "content": system_prompt}] + messages[-3:]
-
-        chatbot_output = get_gemini_chatbot_response(
-            input_messages,
-            model_name=self.model_name,
-        )
-        return self.postprocess(chatbot_output)
+        return [{"role": "system", "content": system_prompt}] + replace_last_content(messages[-3:], prompt)
 
     def postprocess(self, output: str):
         return {
@@ -0,0 +1,73 @@
+"""
+Response schemas for the agents that emit JSON.
+
+Passed to get_gemini_chatbot_response(response_schema=...) so Gemini returns
+a JSON object of this exact shape (response_mime_type "application/json")
+instead of JSON described in prose. The JSON structures spelled out in the
+agents' prompts match these schemas, so the model gets one set of fields.
+"""
+
+VALID_ROUTES = ("details_agent", "order_taking_agent", "recommendation_agent")
+
+GUARD_DECISIONS = ["allowed", "not allowed"]
+
+RECOMMENDATION_TYPES = ["apriori", "popular", "popular by category"]
+
+
+GUARD_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "decision": {"type": "string", "enum": GUARD_DECISIONS},
+        "message": {"type": "string"},
+    },
+    "required": ["decision", "message"],
+}
+
+CLASSIFICATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "decision": {"type": "string", "enum": list(VALID_ROUTES)},
+        "message": {"type": "string"},
+    },
+    "required": ["decision"],
+}
+
+GUARD_ROUTER_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "decision": {"type": "string", "enum": GUARD_DECISIONS},
+        "route": {"type": "string", "enum": list(VALID_ROUTES)},
+        "message": {"type": "string"},
+    },
+    "required": ["decision", "route", "message"],
+}
+
+ORDER_TAKING_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "step number": {"type": "string"},
+        "order": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "item": {"type": "string"},
+                    "quantity": {"type": "integer"},
+                    "price": {"type": "number"},
+                },
+                "required": ["item", "quantity", "price"],
+            },
+        },
+        "response": {"type": "string"},
+    },
+    "required": ["step number", "order", "response"],
+}
+
+RECOMMENDATION_CLASSIFICATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "recommendation_type": {"type": "string", "enum": RECOMMENDATION_TYPES},
+        "parameters": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["recommendation_type", "parameters"],
+}
@@ -1,9 +1,28 @@
+import asyncio
+import hashlib
+import json
 import os
-from typing import List, Dict, Any, Union
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import List, Dict, Any, AsyncIterator, Iterator, Union, Optional, Tuple
 
 from dotenv import load_dotenv
 import google.generativeai as genai
 
+from .gemini_backend import generation_key, get_gemini_backend
+from .gemini_cache import (
+    embedding_cache_key,
+    get_embedding_cache,
+    get_response_cache,
+    response_cache_key,
+)
+from .gemini_context_cache import get_context_cache
+from .json_repair import json_repair_stats, parse_json_output
+from .telemetry import add_to_current_span, record_cache_lookup, record_usage, span
+
 load_dotenv()
 
 
@@ -26,30 +45,316 @@ def _get_gemini_embedding_model_name() -> str:
     return os.getenv("GEMINI_EMBEDDING_MODEL_NAME", "gemini-embedding-001")
 
 
-def _ensure_configured():
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise RuntimeError("GEMINI_API_KEY is not set in the environment.")
-    genai.configure(api_key=api_key)
+def _get_gemini_transport() -> Optional[str]:
+    """
+    Transport used by the Gemini client ("grpc" or "rest").
+    Override via GEMINI_TRANSPORT; unset keeps the library default.
+    """
+    return os.getenv("GEMINI_TRANSPORT") or None
 
 
-def get_gemini_chatbot_response(
-    messages: List[Dict[str, Any]],
-    model_name: str = None,
+def _get_gemini_max_concurrent_requests() -> int:
+    """
+    Upper bound on in-flight Gemini requests per process, shared by all
+    agents so bursts reuse the client's connections instead of piling up.
+    Override via GEMINI_MAX_CONCURRENT_REQUESTS (0 means unbounded).
+    """
+    return int(os.getenv("GEMINI_MAX_CONCURRENT_REQUESTS", "0"))
+
+
+def _get_gemini_structured_output() -> bool:
+    """
+    Whether JSON-emitting agents pass a response schema to Gemini.
+    Override via GEMINI_STRUCTURED_OUTPUT=false to go back to prompt-only JSON
+    (e.g. for models without structured output support).
+    """
+    return os.getenv("GEMINI_STRUCTURED_OUTPUT", "true").strip().lower() not in ("0", "false", "no", "off")
+
+
+def _use_system_instruction() -> bool:
+    """
+    Whether leading system messages are sent as Gemini's system_instruction
+    (and can be cached via GEMINI_CONTEXT_CACHE) instead of being flattened
+    into the prompt. Override via GEMINI_SYSTEM_INSTRUCTION=false for models
+    without system instruction support.
+    """
+    return os.getenv("GEMINI_SYSTEM_INSTRUCTION", "true").strip().lower() not in ("0", "false", "no", "off")
+
+
+def structured_output_enabled() -> bool:
+    """
+    Default for the agents' structured_output flag (GEMINI_STRUCTURED_OUTPUT).
+    """
+    return _get_gemini_structured_output()
+
+
+def _default_generation_config(
     temperature: float = 0.0,
-) -> str:
+    response_schema: Dict[str, Any] | None = None,
+) -> Dict[str, Any]:
+    generation_config = {
+        "temperature": temperature,
+        "top_p": 0.8,
+        "max_output_tokens": 2000,
+    }
+    if response_schema is not None:
+        # Constrained decoding: Gemini can only emit JSON matching the schema
+        generation_config["response_mime_type"] = "application/json"
+        generation_config["response_schema"] = response_schema
+    return generation_config
+
+
+_configure_lock = threading.Lock()
+_configured = False
+
+# Upper bound on memoized models; system instructions change when the
+# catalog or the recommendation artifacts are reloaded
+MAX_MODELS = 128
+
+_models_lock = threading.Lock()
+_models: "OrderedDict[Tuple[str, str, Optional[str]], genai.GenerativeModel]" = OrderedDict()
+
+_request_slots: Optional[threading.BoundedSemaphore] = None
+_max_requests = _get_gemini_max_concurrent_requests()
+if _max_requests > 0:
+    _request_slots = threading.BoundedSemaphore(_max_requests)
+
+
+def _ensure_configured():
     """
-    Drop-in style helper similar to get_chatbot_response, but using Gemini.
+    Configures the Gemini client once per process. genai.configure resets the
+    library's cached clients, so calling it per request would drop connections.
+    """
+    global _configured
+    if _configured:
+        return
+    with _configure_lock:
+        if _configured:
+            return
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise RuntimeError("GEMINI_API_KEY is not set in the environment.")
+        transport = _get_gemini_transport()
+        if transport:
+            genai.configure(api_key=api_key, transport=transport)
+        else:
+            genai.configure(api_key=api_key)
+        _configured = True
 
-    messages: list of {"role": "system"|"user"|"assistant", "content": str}
+
+def get_gemini_model(
+    model_name: str = None,
+    generation_config: Dict[str, Any] | None = None,
+    system_instruction: str | None = None,
+) -> "genai.GenerativeModel":
+    """
+    Returns the shared GenerativeModel for (model name, generation config,
+    system instruction), creating it on first use. Safe to call from
+    multiple threads.
     """
     _ensure_configured()
     if model_name is None:
         model_name = _get_gemini_model_name()
 
-    model = genai.GenerativeModel(model_name)
+    key = (
+        model_name,
+        json.dumps(generation_config or {}, sort_keys=True),
+        hashlib.sha256(system_instruction.encode("utf-8")).hexdigest() if system_instruction else None,
+    )
+    # Hits reorder the LRU, so lookups take the lock too
+    with _models_lock:
+        model = _models.get(key)
+        if model is not None:
+            _models.move_to_end(key)
+        else:
+            model = genai.GenerativeModel(
+                model_name,
+                generation_config=genai.types.GenerationConfig(**generation_config) if generation_config else None,
+                system_instruction=system_instruction,
+            )
+            _models[key] = model
+            # Least recently used models are evicted first
+            while len(_models) > MAX_MODELS:
+                _models.popitem(last=False)
+    return model
+
+
+def _get_chat_model(
+    model_name: str,
+    generation_config: Dict[str, Any],
+    system_instruction: str | None,
+) -> "genai.GenerativeModel":
+    """
+    Model for a chat request: bound to the cached system instruction when
+    GEMINI_CONTEXT_CACHE is on and the prefix could be cached, otherwise
+    carrying the instruction inline.
+    """
+    if system_instruction:
+        context_cache = get_context_cache()
+        if context_cache is not None:
+            _ensure_configured()
+            model = context_cache.model(model_name, system_instruction, generation_config)
+            if model is not None:
+                return model
+    return get_gemini_model(model_name, generation_config, system_instruction)
+
+
+def _record_usage(response, model_name: str, current_span) -> None:
+    usage_metadata = getattr(response, "usage_metadata", None)
+    record_usage(current_span, model_name, usage_metadata)
+    context_cache = get_context_cache()
+    if context_cache is not None:
+        context_cache.record_usage(usage_metadata)
+
+
+@contextmanager
+def _request_slot():
+    """
+    Holds one of the GEMINI_MAX_CONCURRENT_REQUESTS slots for the duration
+    of a Gemini request (no-op when unbounded).
+    """
+    if _request_slots is None:
+        yield
+        return
+    with _request_slots:
+        yield
+
+
+def _is_replay(backend) -> bool:
+    return backend is not None and backend.mode == "replay"
+
+
+def _generate(
+    model_name: str,
+    generation_config: Dict[str, Any] | None,
+    system_instruction: str | None,
+    prompt: str,
+    current,
+):
+    """
+    One generate_content call through the backend selected by
+    GEMINI_BACKEND_MODE (see agents.gemini_backend): live, recorded, or
+    replayed from a recording with its latency.
+    """
+    backend = get_gemini_backend()
+    key = generation_key(model_name, generation_config, system_instruction, prompt) if backend else None
+    if _is_replay(backend):
+        response, delay = backend.generate(key, model_name, generation_config)
+        with _request_slot():
+            time.sleep(delay)
+    else:
+        model = _get_chat_model(model_name, generation_config, system_instruction)
+        started = time.perf_counter()
+        with _request_slot():
+            response = model.generate_content(prompt)
+        if backend is not None:
+            backend.record_generation(
+                key, model_name, prompt, response.text or "", response.usage_metadata, time.perf_counter() - started
+            )
+    _record_usage(response, model_name, current)
+    return response
+
 
-    # Convert chat-style messages into a single prompt string
+def _stream_generate(
+    model_name: str,
+    generation_config: Dict[str, Any],
+    system_instruction: str | None,
+    prompt: str,
+    current,
+) -> Iterator[str]:
+    """Streaming counterpart of _generate; yields the non-empty text chunks."""
+    backend = get_gemini_backend()
+    key = generation_key(model_name, generation_config, system_instruction, prompt) if backend else None
+    chunk = None
+    if _is_replay(backend):
+        pieces, delay = backend.stream(key, model_name, generation_config)
+        with _request_slot():
+            for chunk in pieces:
+                time.sleep(delay / len(pieces))
+                if chunk.text:
+                    yield chunk.text
+    else:
+        model = _get_chat_model(model_name, generation_config, system_instruction)
+        started = time.perf_counter()
+        chunks: List[str] = []
+        with _request_slot():
+            for chunk in model.generate_content(prompt, stream=True):
+                text = chunk.text or ""
+                if text:
+                    chunks.append(text)
+                    yield text
+        if backend is not None:
+            backend.record_generation(
+                key,
+                model_name,
+                prompt,
+                "".join(chunks),
+                getattr(chunk, "usage_metadata", None),
+                time.perf_counter() - started,
+            )
+    # Token counts arrive with the last chunk
+    _record_usage(chunk, model_name, current)
+
+
+def _embed(model_name: str, missing: Dict[str, str], task_type: str) -> List[List[float]]:
+    """
+    Embeds the cache misses (embedding cache key -> text) in one call through
+    the backend selected by GEMINI_BACKEND_MODE, in the order given.
+    """
+    backend = get_gemini_backend()
+    if _is_replay(backend):
+        vectors, delay = backend.embed(list(missing.keys()), model_name)
+        with _request_slot():
+            time.sleep(delay)
+        return vectors
+
+    _ensure_configured()
+    missing_texts = list(missing.values())
+    started = time.perf_counter()
+    # google-generativeai supports both single string and list of strings
+    with _request_slot():
+        result = genai.embed_content(
+            model=model_name,
+            content=missing_texts if len(missing_texts) > 1 else missing_texts[0],
+            task_type=task_type,
+        )
+    vectors = _result_vectors(result, len(missing_texts))
+    if backend is not None:
+        backend.record_embeddings(list(missing.keys()), model_name, vectors, time.perf_counter() - started)
+    return vectors
+
+
+def _result_vectors(result, count: int) -> List[List[float]]:
+    # The client returns {"embedding": [...]} for a single input and
+    # {"embedding": [[...], [...]]} for a batched input.
+    if count > 1:
+        return result["embedding"]
+    return [result["embedding"]]
+
+
+def warm_up_gemini(model_names: List[str] | None = None, send_request: bool = True):
+    """
+    Configures the client and builds the default models ahead of the first
+    chat turn. With send_request, a count_tokens call opens the connection
+    so the first user does not pay for the handshake.
+    """
+    if _is_replay(get_gemini_backend()):
+        return
+    model_names = model_names or [_get_gemini_model_name()]
+    for model_name in model_names:
+        model = get_gemini_model(model_name, _default_generation_config())
+        if send_request:
+            try:
+                with _request_slot():
+                    model.count_tokens("ping")
+            except Exception as e:
+                print(f"[gemini_utils] Warm-up request for {model_name} failed: {e}")
+
+
+def _flatten_messages(messages: List[Dict[str, Any]]) -> str:
+    """
+    Converts chat-style messages into a single prompt string.
+    """
     parts: List[str] = []
     for m in messages:
         role = m.get("role", "")
@@ -62,48 +367,206 @@ def get_gemini_chatbot_response(
             parts.append(f"Assistant: {content}")
         else:
             parts.append(str(content))
+    return "\n\n".join(parts)
+
+
+def _split_messages(messages: List[Dict[str, Any]]) -> Tuple[Optional[str], str]:
+    """
+    Returns (system_instruction, prompt): the leading system messages, which
+    are static per agent, and the flattened rest of the conversation.
+    Everything is flattened into the prompt when system instructions are
+    disabled or nothing but system messages was given.
+    """
+    split = 0
+    while split < len(messages) and messages[split].get("role") == "system":
+        split += 1
+    if not _use_system_instruction() or split == 0 or split == len(messages):
+        return None, _flatten_messages(messages)
+    system_instruction = "\n\n".join(str(m.get("content", "")) for m in messages[:split])
+    return system_instruction, _flatten_messages(messages[split:])
+
 
-    prompt = "\n\n".join(parts)
-    response = model.generate_content(
-        prompt,
-        generation_config=genai.types.GenerationConfig(
-            temperature=temperature,
-            top_p=0.8,
-            max_output_tokens=2000,
-        ),
+def _cache_prompt(system_instruction: Optional[str], prompt: str) -> str:
+    """Text identifying a request in the response cache."""
+    if system_instruction is None:
+        return prompt
+    return system_instruction + "\x1e" + prompt
+
+
+def replace_last_content(messages: List[Dict[str, Any]], content: str) -> List[Dict[str, Any]]:
+    """
+    Returns a new list whose last message is a copy with the given content.
+    The other message dicts are shared, so callers never deep-copy the
+    conversation to rewrite the latest turn.
+    """
+    return list(messages[:-1]) + [{**messages[-1], "content": content}]
+
+
+def _lookup_cached_response(model_name, prompt, generation_config, use_cache) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Returns (cache_key, cached_text). cache_key is None when the call is not
+    cacheable (caching disabled or temperature above 0).
+    """
+    if not use_cache or generation_config["temperature"] != 0.0:
+        return None, None
+    cache = get_response_cache()
+    if not cache.enabled:
+        return None, None
+    cache_key = response_cache_key(model_name, prompt, generation_config)
+    cached = cache.get(cache_key)
+    record_cache_lookup("response", int(cached is not None), int(cached is None))
+    if cached is not None:
+        add_to_current_span("response_cache_hits")
+    return cache_key, cached
+
+
+def get_gemini_chatbot_response(
+    messages: List[Dict[str, Any]],
+    model_name: str = None,
+    temperature: float = 0.0,
+    use_cache: bool = True,
+    response_schema: Dict[str, Any] | None = None,
+) -> str:
+    """
+    Drop-in style helper similar to get_chatbot_response, but using Gemini.
+
+    messages: list of {"role": "system"|"user"|"assistant", "content": str}
+
+    With temperature 0 the output is deterministic, so responses are memoized
+    in the shared ResponseCache unless use_cache is False.
+
+    response_schema (see agents.gemini_schemas) makes Gemini return JSON of
+    that shape, so the caller can json.loads the text without any repair.
+    """
+    if model_name is None:
+        model_name = _get_gemini_model_name()
+
+    system_instruction, prompt = _split_messages(messages)
+    generation_config = _default_generation_config(temperature, response_schema)
+
+    cache_key, cached = _lookup_cached_response(
+        model_name, _cache_prompt(system_instruction, prompt), generation_config, use_cache
     )
+    if cached is not None:
+        return cached
+
+    with span("gemini", model_name) as current:
+        response = _generate(model_name, generation_config, system_instruction, prompt, current)
 
     # Gemini responses expose .text for the primary text output
-    return response.text or ""
+    text = response.text or ""
+    if cache_key is not None and text:
+        get_response_cache().put(cache_key, text)
+    return text
+
+
+def stream_gemini_chatbot_response(
+    messages: List[Dict[str, Any]],
+    model_name: str = None,
+    temperature: float = 0.0,
+    use_cache: bool = True,
+) -> Iterator[str]:
+    """
+    Streaming variant of get_gemini_chatbot_response: yields text chunks as
+    Gemini produces them. A cached response is yielded as a single chunk, and
+    the full streamed text is stored in the cache once the stream completes.
+    """
+    if model_name is None:
+        model_name = _get_gemini_model_name()
+
+    system_instruction, prompt = _split_messages(messages)
+    generation_config = _default_generation_config(temperature)
+
+    cache_key, cached = _lookup_cached_response(
+        model_name, _cache_prompt(system_instruction, prompt), generation_config, use_cache
+    )
+    if cached is not None:
+        yield cached
+        return
+
+    chunks: List[str] = []
+    with span("gemini", model_name) as current:
+        for text in _stream_generate(model_name, generation_config, system_instruction, prompt, current):
+            chunks.append(text)
+            yield text
+
+    if cache_key is not None and chunks:
+        get_response_cache().put(cache_key, "".join(chunks))
+
+
+def _split_embedding_lookup(texts: List[str], model_name: str, task_type: str, use_cache: bool):
+    """
+    Looks texts up in the embedding cache. Returns (keys, cached, missing)
+    where missing maps each de-duplicated cache miss key to its text.
+    """
+    cache = get_embedding_cache() if use_cache else None
+    keys = [embedding_cache_key(model_name, task_type, text) for text in texts]
+    cached = cache.get_many(keys) if cache is not None else {}
+
+    # De-duplicate misses so repeated texts in one batch are embedded once
+    missing: Dict[str, str] = {}
+    for key, text in zip(keys, texts):
+        if key not in cached and key not in missing:
+            missing[key] = text
+
+    if cache is not None:
+        hits = sum(key in cached for key in keys)
+        record_cache_lookup("embedding", hits, len(keys) - hits)
+        if hits:
+            add_to_current_span("embedding_cache_hits", hits)
+    return keys, cached, missing
+
+
+def _merge_embeddings(keys, cached, missing, vectors, use_cache: bool):
+    """
+    Combines cached vectors with freshly embedded ones and stores the fresh
+    ones in the cache.
+    """
+    fresh = dict(zip(missing.keys(), vectors))
+    if use_cache:
+        get_embedding_cache().put_many(fresh)
+    cached = {**cached, **fresh}
+    return [cached[key] for key in keys]
 
 
 def get_gemini_embedding(
     text_input: Union[str, List[str]],
     model_name: str = None,
+    task_type: str = "retrieval_document",
+    use_cache: bool = True,
 ):
     """
     Gemini embedding helper, analogous to get_embedding.
     Returns a list of embedding vectors.
+
+    Results are cached by (model name, task_type, normalized text). For a
+    list input only the cache misses are sent to Gemini, in one batched call.
     """
-    _ensure_configured()
     if model_name is None:
         model_name = _get_gemini_embedding_model_name()
 
-    # google-generativeai supports both single string and list of strings
-    result = genai.embed_content(
-        model=model_name,
-        content=text_input,
-        task_type="retrieval_document",
-    )
+    texts = text_input if isinstance(text_input, list) else [text_input]
+    keys, cached, missing = _split_embedding_lookup(texts, model_name, task_type, use_cache)
+    if not missing:
+        return [cached[key] for key in keys]
 
-    # The client returns a dict with "embedding" for single input,
-    # or {"embedding": [...]} per item for batched input.
-    if isinstance(text_input, list):
-        # Batched
-        return [item["embedding"] for item in result["embeddings"]]
-    else:
-        # Single
-        return [result["embedding"]]
+    with span("embedding", model_name, texts=len(missing)):
+        vectors = _embed(model_name, missing, task_type)
+    return _merge_embeddings(keys, cached, missing, vectors, use_cache)
+
+
+def _double_check_prompt(json_string: str) -> str:
+    return f"""You will check this JSON string and correct any mistakes that will make it invalid.
+Then you will return the corrected JSON string. Nothing else.
+
+If the JSON is already correct just return it.
+
+Do NOT return a single letter outside of the JSON string.
+There is no need to explain anything – only return the JSON string.
+
+JSON:
+{json_string}
+"""
 
 
 def double_check_json_output_gemini(
@@ -114,24 +577,273 @@ def double_check_json_output_gemini(
     Gemini version of double_check_json_output:
     - Ask the model to validate/fix JSON and return only a valid JSON string.
     """
+    if model_name is None:
+        model_name = _get_gemini_model_name()
+
+    with span("json_repair", model_name) as current:
+        response = _generate(model_name, None, None, _double_check_prompt(json_string), current)
+    return response.text or ""
+
+
+def _record_fallback_result(fixed_output: str) -> str:
+    if parse_json_output(fixed_output) is None:
+        json_repair_stats.record("failed")
+    return fixed_output
+
+
+def repair_json_output_gemini(
+    raw_output: str,
+    model_name: str = None,
+) -> str:
+    """
+    Returns a JSON string for raw_output, repairing it locally when possible
+    (see agents.json_repair) and only asking the model through
+    double_check_json_output_gemini when local repair fails.
+    """
+    data = parse_json_output(raw_output)
+    if data is not None:
+        json_repair_stats.record("local")
+        return json.dumps(data)
+
+    json_repair_stats.record("llm_fallback")
+    print("[gemini_utils] Local JSON repair failed, asking the model to fix the output")
+    return _record_fallback_result(double_check_json_output_gemini(raw_output, model_name=model_name))
+
+
+# ---------------------------------------------------------------------------
+# Async variants
+#
+# Same behaviour and caches as the functions above, but awaiting Gemini's
+# *_async client calls so one event loop can serve many conversations.
+# ---------------------------------------------------------------------------
+
+_async_request_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+@asynccontextmanager
+async def _async_request_slot():
+    """
+    Async counterpart of _request_slot. The GEMINI_MAX_CONCURRENT_REQUESTS
+    cap applies per event loop.
+    """
+    if _max_requests <= 0:
+        yield
+        return
+    loop = asyncio.get_running_loop()
+    slots = _async_request_slots.get(loop)
+    if slots is None:
+        slots = asyncio.Semaphore(_max_requests)
+        _async_request_slots[loop] = slots
+    async with slots:
+        yield
+
+
+async def _agenerate(
+    model_name: str,
+    generation_config: Dict[str, Any] | None,
+    system_instruction: str | None,
+    prompt: str,
+    current,
+):
+    """Async version of _generate."""
+    backend = get_gemini_backend()
+    key = generation_key(model_name, generation_config, system_instruction, prompt) if backend else None
+    if _is_replay(backend):
+        response, delay = backend.generate(key, model_name, generation_config)
+        async with _async_request_slot():
+            await asyncio.sleep(delay)
+    else:
+        model = _get_chat_model(model_name, generation_config, system_instruction)
+        started = time.perf_counter()
+        async with _async_request_slot():
+            response = await model.generate_content_async(prompt)
+        if backend is not None:
+            backend.record_generation(
+                key, model_name, prompt, response.text or "", response.usage_metadata, time.perf_counter() - started
+            )
+    _record_usage(response, model_name, current)
+    return response
+
+
+async def _astream_generate(
+    model_name: str,
+    generation_config: Dict[str, Any],
+    system_instruction: str | None,
+    prompt: str,
+    current,
+) -> AsyncIterator[str]:
+    """Async version of _stream_generate."""
+    backend = get_gemini_backend()
+    key = generation_key(model_name, generation_config, system_instruction, prompt) if backend else None
+    chunk = None
+    if _is_replay(backend):
+        pieces, delay = backend.stream(key, model_name, generation_config)
+        async with _async_request_slot():
+            for chunk in pieces:
+                await asyncio.sleep(delay / len(pieces))
+                if chunk.text:
+                    yield chunk.text
+    else:
+        model = _get_chat_model(model_name, generation_config, system_instruction)
+        started = time.perf_counter()
+        chunks: List[str] = []
+        async with _async_request_slot():
+            response = await model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                text = chunk.text or ""
+                if text:
+                    chunks.append(text)
+                    yield text
+        if backend is not None:
+            backend.record_generation(
+                key,
+                model_name,
+                prompt,
+                "".join(chunks),
+                getattr(chunk, "usage_metadata", None),
+                time.perf_counter() - started,
+            )
+    _record_usage(chunk, model_name, current)
+
+
+async def _aembed(model_name: str, missing: Dict[str, str], task_type: str) -> List[List[float]]:
+    """Async version of _embed."""
+    backend = get_gemini_backend()
+    if _is_replay(backend):
+        vectors, delay = backend.embed(list(missing.keys()), model_name)
+        async with _async_request_slot():
+            await asyncio.sleep(delay)
+        return vectors
+
     _ensure_configured()
+    missing_texts = list(missing.values())
+    started = time.perf_counter()
+    async with _async_request_slot():
+        result = await genai.embed_content_async(
+            model=model_name,
+            content=missing_texts if len(missing_texts) > 1 else missing_texts[0],
+            task_type=task_type,
+        )
+    vectors = _result_vectors(result, len(missing_texts))
+    if backend is not None:
+        backend.record_embeddings(list(missing.keys()), model_name, vectors, time.perf_counter() - started)
+    return vectors
+
+
+async def aget_gemini_chatbot_response(
+    messages: List[Dict[str, Any]],
+    model_name: str = None,
+    temperature: float = 0.0,
+    use_cache: bool = True,
+    response_schema: Dict[str, Any] | None = None,
+) -> str:
+    """
+    Async version of get_gemini_chatbot_response.
+    """
     if model_name is None:
         model_name = _get_gemini_model_name()
 
-    prompt = f"""You will check this JSON string and correct any mistakes that will make it invalid.
-Then you will return the corrected JSON string. Nothing else.
+    system_instruction, prompt = _split_messages(messages)
+    generation_config = _default_generation_config(temperature, response_schema)
 
-If the JSON is already correct just return it.
+    cache_key, cached = _lookup_cached_response(
+        model_name, _cache_prompt(system_instruction, prompt), generation_config, use_cache
+    )
+    if cached is not None:
+        return cached
 
-Do NOT return a single letter outside of the JSON string.
-There is no need to explain anything – only return the JSON string.
+    with span("gemini", model_name) as current:
+        response = await _agenerate(model_name, generation_config, system_instruction, prompt, current)
 
-JSON:
-{json_string}
-"""
-    model = genai.GenerativeModel(model_name)
-    response = model.generate_content(prompt)
+    text = response.text or ""
+    if cache_key is not None and text:
+        get_response_cache().put(cache_key, text)
+    return text
+
+
+async def astream_gemini_chatbot_response(
+    messages: List[Dict[str, Any]],
+    model_name: str = None,
+    temperature: float = 0.0,
+    use_cache: bool = True,
+) -> AsyncIterator[str]:
+    """
+    Async version of stream_gemini_chatbot_response.
+    """
+    if model_name is None:
+        model_name = _get_gemini_model_name()
+
+    system_instruction, prompt = _split_messages(messages)
+    generation_config = _default_generation_config(temperature)
+
+    cache_key, cached = _lookup_cached_response(
+        model_name, _cache_prompt(system_instruction, prompt), generation_config, use_cache
+    )
+    if cached is not None:
+        yield cached
+        return
+
+    chunks: List[str] = []
+    with span("gemini", model_name) as current:
+        async for text in _astream_generate(model_name, generation_config, system_instruction, prompt, current):
+            chunks.append(text)
+            yield text
+
+    if cache_key is not None and chunks:
+        get_response_cache().put(cache_key, "".join(chunks))
+
+
+async def aget_gemini_embedding(
+    text_input: Union[str, List[str]],
+    model_name: str = None,
+    task_type: str = "retrieval_document",
+    use_cache: bool = True,
+):
+    """
+    Async version of get_gemini_embedding.
+    """
+    if model_name is None:
+        model_name = _get_gemini_embedding_model_name()
+
+    texts = text_input if isinstance(text_input, list) else [text_input]
+    keys, cached, missing = _split_embedding_lookup(texts, model_name, task_type, use_cache)
+    if not missing:
+        return [cached[key] for key in keys]
+
+    with span("embedding", model_name, texts=len(missing)):
+        vectors = await _aembed(model_name, missing, task_type)
+    return _merge_embeddings(keys, cached, missing, vectors, use_cache)
+
+
+async def adouble_check_json_output_gemini(
+    json_string: str,
+    model_name: str = None,
+) -> str:
+    """
+    Async version of double_check_json_output_gemini.
+    """
+    if model_name is None:
+        model_name = _get_gemini_model_name()
+
+    with span("json_repair", model_name) as current:
+        response = await _agenerate(model_name, None, None, _double_check_prompt(json_string), current)
     return response.text or ""
 
 
+async def arepair_json_output_gemini(
+    raw_output: str,
+    model_name: str = None,
+) -> str:
+    """
+    Async version of repair_json_output_gemini.
+    """
+    data = parse_json_output(raw_output)
+    if data is not None:
+        json_repair_stats.record("local")
+        return json.dumps(data)
 
+    json_repair_stats.record("llm_fallback")
+    print("[gemini_utils] Local JSON repair failed, asking the model to fix the output")
+    return _record_fallback_result(await adouble_check_json_output_gemini(raw_output, model_name=model_name))
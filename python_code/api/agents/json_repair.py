@@ -0,0 +1,202 @@
+import ast
+import json
+import re
+import threading
+from typing import Any, Dict, Optional
+
+from .telemetry import record_json_repair
+
+
+_FENCE_PATTERN = re.compile(r"```[a-zA-Z]*\s*\n?(.*?)\n?```", re.DOTALL)
+_TRAILING_COMMA_PATTERN = re.compile(r",(\s*[}\]])")
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+def extract_json_string(output: str) -> str:
+    """
+    Normalize Gemini output by stripping code fences or extra text so json.loads succeeds.
+    Handles fences anywhere in the text (not only at the start) and unterminated fences.
+    """
+    cleaned = output.strip()
+
+    fenced = _FENCE_PATTERN.search(cleaned)
+    if fenced:
+        cleaned = fenced.group(1).strip()
+    elif cleaned.startswith("```"):
+        # Opening fence without a closing one (truncated output)
+        lines = cleaned.splitlines()[1:]
+        cleaned = "\n".join(lines).strip()
+
+    start_candidates = [i for i in (cleaned.find("{"), cleaned.find("[")) if i != -1]
+    if not start_candidates:
+        return cleaned
+    start = min(start_candidates)
+
+    end = max(cleaned.rfind("}"), cleaned.rfind("]"))
+    if end > start and not _is_unbalanced(cleaned[start : end + 1]):
+        return cleaned[start : end + 1]
+    # Truncated output: keep the tail so repair_json_string can close it
+    return cleaned[start:]
+
+
+def _is_unbalanced(text: str) -> bool:
+    depth = 0
+    in_string = False
+    quote = ""
+    escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                in_string = False
+        elif char in "\"'":
+            in_string = True
+            quote = char
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+    return depth != 0 or in_string
+
+
+def repair_json_string(text: str) -> str:
+    """
+    Best-effort local repair of almost-JSON produced by an LLM:
+      - smart quotes and single-quoted strings become double-quoted strings
+      - // and # comments outside strings are dropped
+      - Python literals True/False/None become true/false/null
+      - trailing commas before } or ] are removed
+      - truncated output is closed (open string, dangling key/comma, open brackets)
+    """
+    text = (
+        text.replace("“", '"')
+        .replace("”", '"')
+        .replace("‘", "'")
+        .replace("’", "'")
+    )
+
+    out = []
+    stack = []
+    in_string = False
+    quote = ""
+    escaped = False
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+                out.append(char)
+            elif char == "\\":
+                escaped = True
+                out.append(char)
+            elif char == quote:
+                in_string = False
+                out.append('"')
+            elif char == '"' and quote == "'":
+                # A double quote inside a single-quoted string must be escaped
+                out.append('\\"')
+            elif char == "\n":
+                out.append("\\n")
+            else:
+                out.append(char)
+        elif char in "\"'":
+            in_string = True
+            quote = char
+            out.append('"')
+        elif char == "/" and text[i : i + 2] == "//" or char == "#":
+            newline = text.find("\n", i)
+            i = len(text) if newline == -1 else newline
+            continue
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+            out.append(char)
+        elif char in "}]":
+            if stack and stack[-1] == char:
+                stack.pop()
+            out.append(char)
+        elif char.isalpha():
+            match = re.match(r"[A-Za-z_]+", text[i:])
+            word = match.group(0)
+            out.append(_PYTHON_LITERALS.get(word, word))
+            i += len(word)
+            continue
+        else:
+            out.append(char)
+        i += 1
+
+    repaired = "".join(out)
+
+    if in_string:
+        # Truncated inside a string: close it
+        if escaped:
+            repaired = repaired[:-1]
+        repaired += '"'
+
+    if stack:
+        repaired = repaired.rstrip()
+        # Drop a dangling comma, or a key whose value never arrived
+        repaired = re.sub(r',\s*$', "", repaired)
+        repaired = re.sub(r',?\s*"[^"]*"\s*:\s*$', "", repaired)
+        repaired = re.sub(r':\s*$', ": null", repaired)
+        repaired += "".join(reversed(stack))
+
+    return _TRAILING_COMMA_PATTERN.sub(r"\1", repaired)
+
+
+class JsonRepairStats:
+    """
+    Thread-safe counters of how model JSON outputs were recovered:
+      - local: parsed or repaired without another model call
+      - llm_fallback: local repair failed and the output went to double_check_json_output_gemini
+      - failed: not even the model could produce valid JSON
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {"local": 0, "llm_fallback": 0, "failed": 0}
+
+    def record(self, outcome: str):
+        with self._lock:
+            self._counts[outcome] += 1
+        record_json_repair(outcome)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts: Dict[str, Any] = dict(self._counts)
+        total = counts["local"] + counts["llm_fallback"]
+        counts["llm_fallback_rate"] = (counts["llm_fallback"] / total) if total else 0.0
+        return counts
+
+
+json_repair_stats = JsonRepairStats()
+
+
+def parse_json_output(output: str) -> Optional[Any]:
+    """
+    Parses model output as JSON without calling the model again: strips
+    fences and surrounding text, then tries json.loads, repair_json_string
+    and finally ast.literal_eval. Returns None when all of them fail.
+    """
+    if not output or not output.strip():
+        return None
+
+    cleaned = extract_json_string(output)
+    try:
+        return json.loads(cleaned)
+    except ValueError:
+        pass
+
+    try:
+        return json.loads(repair_json_string(cleaned))
+    except ValueError:
+        pass
+
+    try:
+        data = ast.literal_eval(cleaned)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return None
+    return data if isinstance(data, (dict, list)) else None
@@ -0,0 +1,205 @@
+import re
+import threading
+from typing import List, Dict, Any, Optional
+
+from .product_catalog import ProductCatalog, get_product_catalog
+
+
+# Keyword rules mirroring the routing rules in GeminiClassificationAgent's prompt.
+ORDER_PHRASES = (
+    "my order",
+    "add",
+    "remove",
+    "i want",
+    "i'd like",
+    "i would like",
+    "buy",
+    "order",
+    "can i get",
+    "can i have",
+    "i'll take",
+    "i will take",
+    "i'll have",
+    "get me",
+)
+
+DETAILS_PHRASES = (
+    "what's in",
+    "what is in",
+    "whats in",
+    "ingredient",
+    "ingredients",
+    "how much",
+    "price",
+    "prices",
+    "cost",
+    "costs",
+    "menu",
+    "open",
+    "opens",
+    "opening",
+    "close",
+    "closes",
+    "closing",
+    "hours",
+    "timing",
+    "location",
+    "located",
+    "where",
+    "deliver",
+    "delivery",
+    "tell me about",
+    "describe",
+    "lactose",
+    "vegan",
+    "calories",
+)
+
+RECOMMENDATION_PHRASES = (
+    "recommend",
+    "recommendation",
+    "recommendations",
+    "suggest",
+    "suggestion",
+    "suggestions",
+    "what should i get",
+    "what should i order",
+    "what should i have",
+    "what should i try",
+    "what's good",
+    "what is good",
+    "what's popular",
+    "what is popular",
+    "best seller",
+    "bestseller",
+)
+
+QUANTITY_WORDS = r"\d+|one|two|three|four|five|six|seven|eight|nine|ten|couple of"
+
+# Messages longer than this are left to Gemini; they usually mix intents.
+MAX_WORDS = 25
+
+
+def _phrase_pattern(phrases) -> re.Pattern:
+    return re.compile(r"\b(?:" + "|".join(re.escape(p) for p in phrases) + r")\b")
+
+
+class LocalRouter:
+    """
+    Rule- and lexicon-based router that runs before GeminiClassificationAgent.
+
+    classify(messages) returns one of "details_agent", "order_taking_agent" or
+    "recommendation_agent" when exactly one intent matches the latest user
+    message, and None when it is unsure so the caller can ask Gemini.
+
+    The product lexicon is built from the ProductCatalog's names, aliases
+    and categories.
+    Hit/miss counters are kept so the number of saved LLM calls is visible
+    through get_stats().
+    """
+
+    def __init__(self, products_path: str | None = None):
+        self.catalog = ProductCatalog(products_path) if products_path else get_product_catalog()
+
+        self._order_pattern = _phrase_pattern(ORDER_PHRASES)
+        self._details_pattern = _phrase_pattern(DETAILS_PHRASES)
+        self._recommendation_pattern = _phrase_pattern(RECOMMENDATION_PHRASES)
+        self._build_product_patterns()
+
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._decisions: Dict[str, int] = {}
+
+    def _build_product_patterns(self):
+        """
+        Builds the quantity pattern ("2 lattes", "one chocolate croissant")
+        from the catalog's names, aliases and categories. Rebuilt whenever
+        the catalog reloads products.jsonl.
+        """
+        self._catalog_version = self.catalog.version
+        self.product_terms = self._load_product_terms()
+        products_alternation = "|".join(
+            re.escape(term) for term in sorted(self.product_terms, key=len, reverse=True)
+        )
+        self._quantity_pattern = re.compile(
+            r"\b(?:" + QUANTITY_WORDS + r")\s+(?:[a-z']+\s+){0,2}?(?:" + products_alternation + r")\b"
+        )
+
+    def _load_product_terms(self) -> List[str]:
+        """
+        Lowercase product terms (full names, plurals, aliases and head nouns
+        such as "croissant" or "syrup") plus category names.
+        """
+        terms = {"pastry", "pastries", "coffee", "drink", "drinks", "espresso", "espressos"}
+        terms.update(self.catalog.aliases())
+        for product in self.catalog.products:
+            head = product.name.lower().strip().split(" ")[-1]
+            if head:
+                terms.add(head)
+                terms.add(head + "s")
+        terms.update(category.lower().strip() for category in self.catalog.categories if category)
+        return sorted(terms)
+
+    def _intents(self, text: str) -> List[str]:
+        intents = []
+        if self._order_pattern.search(text) or self._quantity_pattern.search(text):
+            intents.append("order_taking_agent")
+        if self._recommendation_pattern.search(text):
+            intents.append("recommendation_agent")
+        if self._details_pattern.search(text):
+            intents.append("details_agent")
+        return intents
+
+    def classify(self, messages: List[Dict[str, Any]]) -> Optional[str]:
+        """
+        Returns the routing decision for the latest user message, or None when
+        the message is ambiguous and should be classified by Gemini.
+        """
+        if self.catalog.version != self._catalog_version:
+            self._build_product_patterns()
+
+        decision = None
+        if messages and messages[-1].get("role") == "user":
+            text = str(messages[-1].get("content", "")).lower().replace("’", "'")
+            if 0 < len(text.split()) <= MAX_WORDS:
+                intents = self._intents(text)
+                if len(intents) == 1:
+                    decision = intents[0]
+
+        with self._lock:
+            if decision is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+                self._decisions[decision] = self._decisions.get(decision, 0) + 1
+        return decision
+
+    def to_response(self, decision: str) -> Dict[str, Any]:
+        """
+        Wraps a local decision in the same shape GeminiClassificationAgent returns.
+        """
+        return {
+            "role": "assistant",
+            "content": "",
+            "memory": {
+                "agent": "classification_agent",
+                "classification_decision": decision,
+                "local_route": True,
+            },
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Returns hit/miss counters. Every hit is one classification call that
+        did not go to Gemini.
+        """
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": (self._hits / total) if total else 0.0,
+                "llm_calls_saved": self._hits,
+                "decisions": dict(self._decisions),
+            }
@@ -0,0 +1,148 @@
+import argparse
+import json
+import os
+from typing import List, Dict, Any
+
+import numpy as np
+
+
+def _get_products_dir() -> str:
+    # Current file: python_code/api/agents/local_vector_index.py
+    # products dir: python_code/products
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(current_dir, "..", "..", "products")
+
+
+def get_default_index_path() -> str:
+    """
+    Returns the on-disk location of the local index.
+    Override via LOCAL_VECTOR_INDEX_PATH.
+    """
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    default_path = os.path.join(current_dir, "..", "vector_index", "coffeeshop_index.npz")
+    return os.getenv("LOCAL_VECTOR_INDEX_PATH", default_path)
+
+
+def load_corpus_texts(products_dir: str | None = None) -> List[str]:
+    """
+    Builds the same texts that build_vector_database.ipynb upserts to Pinecone:
+    one text per product, the about-us section and the menu items text.
+    """
+    products_dir = products_dir or _get_products_dir()
+
+    texts = []
+    with open(os.path.join(products_dir, "products.jsonl"), "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            product = json.loads(line)
+            texts.append(
+                f"{product['name']} : {product['description']}"
+                f" -- Ingredients: {product['ingredients']}"
+                f" -- Price: {product['price']}"
+                f" -- rating: {product['rating']}"
+            )
+
+    with open(os.path.join(products_dir, "Merry's_way_about_us.txt"), "r", encoding="utf-8") as f:
+        texts.append("Coffee shop Merry's Way about section: " + f.read())
+
+    with open(os.path.join(products_dir, "menu_items_text.txt"), "r", encoding="utf-8") as f:
+        texts.append("Menu Items: " + f.read())
+
+    return texts
+
+
+class LocalVectorIndex:
+    """
+    In-process replacement for the Pinecone index used by GeminiDetailsAgent.
+
+    Embeddings are stored L2-normalised in a single float32 matrix, so cosine
+    top-k is one matrix-vector product plus an argpartition. query() returns
+    the same shape as a Pinecone query so callers do not need to change.
+    """
+
+    def __init__(self, embeddings, ids: List[str], texts: List[str]):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2 or embeddings.shape[0] != len(ids) or len(ids) != len(texts):
+            raise ValueError("embeddings, ids and texts must describe the same number of entries")
+
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.embeddings = embeddings / norms
+        self.ids = list(ids)
+        self.texts = list(texts)
+
+    @property
+    def dimension(self) -> int:
+        return self.embeddings.shape[1]
+
+    @classmethod
+    def load(cls, path: str) -> "LocalVectorIndex":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["embeddings"], data["ids"].tolist(), data["texts"].tolist())
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez(
+            path,
+            embeddings=self.embeddings,
+            ids=np.array(self.ids),
+            texts=np.array(self.texts),
+        )
+
+    def query(self, vector, top_k: int = 2) -> Dict[str, Any]:
+        query_vector = np.asarray(vector, dtype=np.float32)
+        if query_vector.shape != (self.dimension,):
+            raise ValueError(
+                f"Query dimension {query_vector.shape} does not match index dimension {self.dimension}"
+            )
+
+        norm = np.linalg.norm(query_vector)
+        if norm:
+            query_vector = query_vector / norm
+
+        scores = self.embeddings @ query_vector
+        top_k = min(top_k, len(scores))
+        if top_k <= 0:
+            return {"matches": []}
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+
+        return {
+            "matches": [
+                {
+                    "id": self.ids[i],
+                    "score": float(scores[i]),
+                    "metadata": {"text": self.texts[i]},
+                }
+                for i in top
+            ]
+        }
+
+
+def build_local_vector_index(output_path: str | None = None, embedding_model_name: str | None = None) -> LocalVectorIndex:
+    """
+    Embeds the corpus with Gemini once and writes the index to disk.
+    """
+    from .gemini_utils import get_gemini_embedding
+
+    output_path = output_path or get_default_index_path()
+    texts = load_corpus_texts()
+    embeddings = get_gemini_embedding(texts, model_name=embedding_model_name)
+    # Same ids as the Pinecone upsert in build_vector_database.ipynb
+    ids = [text.split(":")[0].strip() for text in texts]
+
+    index = LocalVectorIndex(embeddings, ids, texts)
+    index.save(output_path)
+    print(f"Saved {len(texts)} vectors of dimension {index.dimension} to {output_path}")
+    return index
+
+
+if __name__ == "__main__":
+    # Usage (from python_code/api): python -m agents.local_vector_index [--output path]
+    parser = argparse.ArgumentParser(description="Build the local vector index for GeminiDetailsAgent")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--embedding-model", default=None)
+    args = parser.parse_args()
+    build_local_vector_index(args.output, args.embedding_model)
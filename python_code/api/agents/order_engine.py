@@ -0,0 +1,456 @@
+import re
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from .gemini_cache import normalize_text
+from .product_catalog import Product, ProductCatalog, get_product_catalog
+
+
+NUMBER_WORDS = {
+    "a": 1,
+    "an": 1,
+    "one": 1,
+    "another": 1,
+    "two": 2,
+    "a couple of": 2,
+    "couple of": 2,
+    "three": 3,
+    "four": 4,
+    "five": 5,
+    "six": 6,
+    "seven": 7,
+    "eight": 8,
+    "nine": 9,
+    "ten": 10,
+    "zero": 0,
+}
+
+# Besides a count, "remove the latte" / "remove all the lattes" remove the whole line
+LINE_WORDS = ("the", "my", "all", "all the", "all my")
+
+ADD_PHRASES = (
+    "add",
+    "i want",
+    "i'd like",
+    "i would like",
+    "can i get",
+    "can i have",
+    "could i get",
+    "could i have",
+    "may i have",
+    "i'll take",
+    "i will take",
+    "i'll have",
+    "i will have",
+    "i'll get",
+    "get me",
+    "give me",
+    "let me get",
+    "let me have",
+    "order",
+)
+
+REMOVE_PHRASES = (
+    "remove",
+    "cancel",
+    "delete",
+    "drop",
+    "take off",
+    "take out",
+)
+
+# Words that carry no order information, dropped before parsing
+FILLER_PATTERN = re.compile(r"\b(?:please|also|too|as well|for me|thanks|thank you)\b")
+LEADING_PATTERN = re.compile(r"^(?:(?:yes|yeah|yep|ok|okay|sure|hi|hello|hey|great|perfect),?\s+)+")
+TRAILING_PATTERN = re.compile(r"\s+(?:(?:from|to|off|in|on|into) (?:my|the) (?:order|cart))$")
+QUESTION_REQUEST_PATTERN = re.compile(r"^(?:can|could|may) i (?:get|have)\b")
+CLAUSE_SPLIT_PATTERN = re.compile(r"\s*(?:,|&|\band\b|\bplus\b|\bthen\b)\s*")
+
+DONE_PATTERN = re.compile(
+    r"^(?:(?:no|nope),?\s+)?"
+    r"(?:that's all|that is all|that's it|that is it|that will be all|that'll be all|"
+    r"nothing else|i'm done|i am done|that's everything)$"
+)
+
+# Above this many words the message usually mixes requests; Gemini handles it
+MAX_WORDS = 30
+
+# Larger quantities of one item ("100 lattes") are likely typos or catering
+# orders; Gemini confirms those instead of the local engine
+MAX_LINE_QUANTITY = 20
+
+# Sold in the shop but not listed in products.jsonl: (name, category, price).
+# The catalog's "Dark chocolate" is the drinking chocolate, so both are shown
+# with their category on the order-taking menu and "dark chocolate" is left
+# to Gemini instead of being resolved locally
+OFF_CATALOG_ITEMS = (("Dark chocolate", "Packaged Chocolate", 250.0),)
+
+# Stricter than ProductCatalog.find's default: a wrong guess costs more than a Gemini call
+PRODUCT_MATCH_CUTOFF = 0.9
+
+
+def format_price(value: float) -> str:
+    return f"₹{value:.0f}" if float(value).is_integer() else f"₹{value:.2f}"
+
+
+def menu_label(name: str, category: str) -> str:
+    """Menu name with the category, e.g. "Dark chocolate (Packaged Chocolate)"."""
+    return f"{name} ({category})"
+
+
+def _labelled_product(name: str, catalog: ProductCatalog) -> Optional[Product]:
+    """The catalog product behind a menu_label name, e.g. "Dark chocolate (Drinking Chocolate)"."""
+    match = re.match(r"^(.+) \((.+)\)$", name.strip())
+    if match is None:
+        return None
+    product = catalog.get_by_name(match.group(1))
+    if product is None or normalize_text(product.category) != normalize_text(match.group(2)):
+        return None
+    return product
+
+
+# Menu label -> price of the off-catalog items
+OFF_CATALOG_PRICES = {
+    normalize_text(menu_label(name, category)): price for name, category, price in OFF_CATALOG_ITEMS
+}
+
+
+class OrderItem(NamedTuple):
+    item: str
+    quantity: int
+    price: float  # unit price
+
+    @property
+    def line_total(self) -> float:
+        return self.quantity * self.price
+
+    def describe(self) -> str:
+        return f"{self.quantity} x {self.item}"
+
+    def to_memory(self) -> Dict[str, Any]:
+        return {"item": self.item, "quantity": self.quantity, "price": self.price}
+
+
+class OrderOperation(NamedTuple):
+    action: str  # "add", "remove" or "set"
+    product: Product
+    quantity: Optional[int]  # None: one for "add", the whole line for "remove"
+
+
+class Order:
+    """
+    Immutable list of OrderItems. apply() returns a new Order, so an order
+    loaded from a stored message is never modified in place.
+    """
+
+    def __init__(self, items: Tuple[OrderItem, ...] = ()):
+        self.items = tuple(items)
+
+    @classmethod
+    def from_memory(cls, order: List[Dict[str, Any]], catalog: ProductCatalog) -> "Order":
+        """
+        Builds an order from the "order" list of an order-taking message
+        (written locally or by Gemini). Items found in the catalog (or in
+        OFF_CATALOG_ITEMS) take its name and price; unknown items keep what
+        the message says.
+        """
+        items: List[OrderItem] = []
+        for entry in order or []:
+            if not isinstance(entry, dict):
+                continue
+            try:
+                quantity = int(entry.get("quantity") or 0)
+            except (TypeError, ValueError):
+                continue
+            name = str(entry.get("item") or "")
+            if not name or quantity <= 0:
+                continue
+            product = catalog.get_by_name(name) or _labelled_product(name, catalog)
+            if product is not None:
+                items.append(OrderItem(product.name, quantity, product.price))
+            elif normalize_text(name) in OFF_CATALOG_PRICES:
+                items.append(OrderItem(name, quantity, OFF_CATALOG_PRICES[normalize_text(name)]))
+            else:
+                try:
+                    price = float(entry.get("price") or 0)
+                except (TypeError, ValueError):
+                    price = 0.0
+                items.append(OrderItem(name, quantity, price))
+        return cls(tuple(items))._merged()
+
+    def _merged(self) -> "Order":
+        quantities: Dict[str, OrderItem] = {}
+        for item in self.items:
+            existing = quantities.get(item.item)
+            quantities[item.item] = item if existing is None else existing._replace(
+                quantity=existing.quantity + item.quantity
+            )
+        return Order(tuple(quantities.values()))
+
+    def find(self, name: str) -> Optional[OrderItem]:
+        return next((item for item in self.items if item.item == name), None)
+
+    @property
+    def total(self) -> float:
+        return sum(item.line_total for item in self.items)
+
+    def apply(self, operation: OrderOperation) -> "Order":
+        name = operation.product.name
+        current = self.find(name)
+        if operation.action == "add":
+            quantity = (current.quantity if current else 0) + (operation.quantity or 1)
+        elif operation.action == "remove":
+            if current is None:
+                return self
+            quantity = 0 if operation.quantity is None else current.quantity - operation.quantity
+        else:
+            quantity = operation.quantity or 0
+
+        items = [item for item in self.items if item.item != name]
+        if quantity > 0:
+            line = OrderItem(name, quantity, operation.product.price)
+            if current is not None:
+                items.insert(self.items.index(current), line)
+            else:
+                items.append(line)
+        return Order(tuple(items))
+
+    def to_memory(self) -> List[Dict[str, Any]]:
+        return [item.to_memory() for item in self.items]
+
+    def summary(self) -> str:
+        lines = ", ".join(f"{item.describe()} ({format_price(item.line_total)})" for item in self.items)
+        return f"{lines}. Total: {format_price(self.total)}"
+
+
+class OrderUpdate(NamedTuple):
+    step_number: str
+    order: Order
+    response: str
+    added_items: bool
+
+
+def _phrase_pattern(phrases) -> str:
+    return "|".join(re.escape(p) for p in sorted(phrases, key=len, reverse=True))
+
+
+class OrderEngine:
+    """
+    Deterministic order-taking for simple, unambiguous messages.
+
+    update(text, order) splits the latest user message into clauses such
+    as "add 2 lattes", "remove the croissant" or "make it 3 cappuccinos",
+    resolves every product against the ProductCatalog and applies the
+    operations to the typed Order with catalog prices. It returns None as
+    soon as any part of the message cannot be accounted for (unknown or
+    ambiguous product, extra words, a question), so the caller can fall back
+    to Gemini. Closing phrases ("that's all") produce the final summary.
+
+    Hit/miss counters are kept so the number of saved Gemini calls is
+    visible through get_stats().
+    """
+
+    def __init__(self, catalog: ProductCatalog | None = None):
+        self.catalog = catalog or get_product_catalog()
+
+        count = rf"\d+|{_phrase_pattern(NUMBER_WORDS)}"
+        quantity = rf"{count}|{_phrase_pattern(LINE_WORDS)}"
+        self._add_pattern = re.compile(
+            rf"^(?:(?P<verb>{_phrase_pattern(ADD_PHRASES)})\s+)?"
+            rf"(?:(?P<quantity>{quantity})\s+)?(?:more\s+)?(?P<product>.+)$"
+        )
+        self._remove_pattern = re.compile(
+            rf"^(?P<verb>{_phrase_pattern(REMOVE_PHRASES)})\s+"
+            rf"(?:(?P<quantity>{quantity})\s+)?(?P<product>.+)$"
+        )
+        self._set_patterns = (
+            re.compile(rf"^(?:make|change) (?:it|that) (?:to )?(?P<quantity>{count})\s+(?P<product>.+)$"),
+            re.compile(
+                rf"^(?:make|change|update) (?:the |my )?(?P<product>.+?) (?:to|into) (?P<quantity>{count})$"
+            ),
+        )
+
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._actions: Dict[str, int] = {}
+
+    def _ambiguous_names(self) -> set:
+        """Normalized names shared by more than one product in the catalog or with an off-catalog item."""
+
+        def build(catalog: ProductCatalog) -> set:
+            seen, duplicates = set(), {normalize_text(name) for name, _, _ in OFF_CATALOG_ITEMS}
+            for product in catalog.products:
+                key = normalize_text(product.name)
+                (duplicates if key in seen else seen).add(key)
+            return duplicates
+
+        return self.catalog.derived("order_engine_ambiguous_names", build)
+
+    def _resolve_product(self, text: str) -> Optional[Product]:
+        product = self.catalog.find(text, cutoff=PRODUCT_MATCH_CUTOFF)
+        if product is None or normalize_text(product.name) in self._ambiguous_names():
+            return None
+        return product
+
+    @staticmethod
+    def _quantity(word: Optional[str]) -> Optional[int]:
+        if word is None or word in LINE_WORDS:
+            return None
+        if word.isdigit():
+            return int(word)
+        return NUMBER_WORDS[word]
+
+    def _parse_clause(self, clause: str, previous_action: Optional[str]) -> Optional[OrderOperation]:
+        for pattern in self._set_patterns:
+            match = pattern.match(clause)
+            if match:
+                product = self._resolve_product(match.group("product"))
+                if product is None:
+                    return None
+                return OrderOperation("set", product, self._quantity(match.group("quantity")))
+
+        match = self._remove_pattern.match(clause)
+        action = "remove"
+        if match is None:
+            match = self._add_pattern.match(clause)
+            action = "add"
+            if match is None:
+                return None
+            if match.group("verb") is None:
+                # "... and 2 croissants" continues the previous clause; a bare
+                # product name on its own is too ambiguous to act on
+                if previous_action is not None:
+                    action = previous_action
+                elif match.group("quantity") is None:
+                    return None
+
+        if action == "add" and (match.group("quantity") or "").startswith("all"):
+            return None
+        product = self._resolve_product(match.group("product"))
+        if product is None:
+            return None
+        quantity = self._quantity(match.group("quantity"))
+        if quantity == 0 or (action == "set" and quantity is None):
+            return None
+        if action == "add" and quantity is None and self._is_plural(match.group("product"), product):
+            # "i want lattes" asks for more than one without saying how many
+            return None
+        return OrderOperation(action, product, quantity)
+
+    @staticmethod
+    def _is_plural(text: str, product: Product) -> bool:
+        return normalize_text(text).endswith("s") and not normalize_text(product.name).endswith("s")
+
+    def parse(self, text: str) -> Optional[List[OrderOperation]]:
+        """
+        Operations requested by a message, or None when the message is not
+        a plain list of add/remove/change-quantity requests.
+        """
+        text = LEADING_PATTERN.sub("", self._normalize(text))
+        clauses = [clause for clause in CLAUSE_SPLIT_PATTERN.split(text) if clause]
+        if not clauses:
+            return None
+
+        operations: List[OrderOperation] = []
+        previous_action = None
+        for clause in clauses:
+            clause = TRAILING_PATTERN.sub("", LEADING_PATTERN.sub("", clause)).strip()
+            if not clause:
+                continue
+            operation = self._parse_clause(clause, previous_action)
+            if operation is None:
+                return None
+            operations.append(operation)
+            previous_action = operation.action
+        return operations or None
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        text = str(text).lower().replace("’", "'")
+        text = FILLER_PATTERN.sub(" ", text)
+        text = re.sub(r"[.!]+", " ", text)
+        text = re.sub(r"(?:\s*,)+\s*", ", ", " ".join(text.split()))
+        return text.strip(" ,")
+
+    def update(self, text: str, order: Order) -> Optional[OrderUpdate]:
+        """
+        Applies the latest user message to order. Returns None when the
+        message needs Gemini.
+        """
+        result = None
+        normalized = self._normalize(text)
+        if normalized.endswith("?") and QUESTION_REQUEST_PATTERN.match(LEADING_PATTERN.sub("", normalized)):
+            # "can I get a latte?" is a request, not a question
+            normalized = normalized.rstrip("?").strip(" ,")
+        if 0 < len(normalized.split()) <= MAX_WORDS and "?" not in normalized:
+            if DONE_PATTERN.match(LEADING_PATTERN.sub("", normalized)):
+                if order.items:
+                    result = self._close(order)
+            else:
+                operations = self.parse(normalized)
+                if operations is not None:
+                    result = self._apply(operations, order)
+
+        with self._lock:
+            if result is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+                action = "close" if result.step_number == "6" else "update"
+                self._actions[action] = self._actions.get(action, 0) + 1
+        return result
+
+    def _apply(self, operations: List[OrderOperation], order: Order) -> Optional[OrderUpdate]:
+        """The updated order and reply, or None when a line would exceed MAX_LINE_QUANTITY."""
+        original = order
+        added: List[str] = []
+        changes: List[str] = []
+        for operation in operations:
+            name = operation.product.name
+            removes = operation.action == "remove" or (operation.action == "set" and not operation.quantity)
+            if removes and order.find(name) is None:
+                changes.append(f"There is no {name} in your order")
+                continue
+            order = order.apply(operation)
+            line = order.find(name)
+            if line is not None and line.quantity > MAX_LINE_QUANTITY:
+                return None
+            if operation.action == "add":
+                added.append(f"{operation.quantity or 1} x {name}")
+            elif line is None:
+                changes.append(f"Removed {name}")
+            else:
+                changes.append(f"You now have {line.describe()}")
+
+        if added:
+            changes.insert(0, "Added " + (" and ".join(added) if len(added) <= 2 else ", ".join(added)))
+        if order.items:
+            response = f"{'. '.join(changes)}. Your order: {order.summary()}. Would you like anything else?"
+        else:
+            empty = "is now empty" if order is not original else "is empty"
+            response = f"{'. '.join(changes)}. Your order {empty}. What would you like to have?"
+        return OrderUpdate("4", order, response, bool(added))
+
+    def _close(self, order: Order) -> OrderUpdate:
+        lines = "\n".join(f"- {item.describe()}: {format_price(item.line_total)}" for item in order.items)
+        response = (
+            f"Here is your order:\n{lines}\nTotal: {format_price(order.total)}\n"
+            "Thank you for your order! Enjoy your treats."
+        )
+        return OrderUpdate("6", order, response, False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Returns hit/miss counters. Every hit is one order-taking turn that
+        did not go to Gemini.
+        """
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": (self._hits / total) if total else 0.0,
+                "llm_calls_saved": self._hits,
+                "actions": dict(self._actions),
+            }
@@ -0,0 +1,253 @@
+import difflib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from .gemini_cache import normalize_text
+
+
+def _get_default_products_path() -> str:
+    # Current file: python_code/api/agents/product_catalog.py
+    # products.jsonl: python_code/products/products.jsonl
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.getenv(
+        "PRODUCTS_PATH",
+        os.path.join(current_dir, "..", "..", "products", "products.jsonl"),
+    )
+
+
+def _get_reload_check_interval() -> float:
+    """
+    Minimum seconds between mtime checks of products.jsonl.
+    Override via PRODUCT_CATALOG_CHECK_INTERVAL (0 checks on every access).
+    """
+    return float(os.getenv("PRODUCT_CATALOG_CHECK_INTERVAL", "1.0"))
+
+
+# Extra spellings customers use for menu items, keyed by normalized product name.
+EXTRA_ALIASES = {
+    "carmel syrup": ("caramel syrup", "caramel"),
+    "espresso shot": ("espresso", "espressos", "shot of espresso"),
+    "dark chocolate": ("hot chocolate", "drinking chocolate"),
+    "sugar free vanilla syrup": ("vanilla syrup", "vanilla"),
+    "jumbo savory scone": ("savory scone", "savoury scone"),
+    "chocolate chip biscotti": ("chocolate biscotti",),
+}
+
+
+class Product(NamedTuple):
+    id: str
+    name: str
+    category: str
+    description: str
+    ingredients: Tuple[str, ...]
+    price: float
+    rating: float
+    image_path: str
+    image_available: bool
+
+
+class _CatalogSnapshot(NamedTuple):
+    version: Tuple[int, int]
+    products: Tuple[Product, ...]
+    by_name: Dict[str, Product]
+    by_alias: Dict[str, Product]
+    by_category: Dict[str, Tuple[Product, ...]]
+
+
+def _build_aliases(products: Tuple[Product, ...], by_name: Dict[str, Product]) -> Dict[str, Product]:
+    """
+    Maps every alias to a product: the full name, its plural, the extra
+    aliases above and the last word of the name ("croissant", "latte") when
+    only one product ends with it.
+    """
+    aliases: Dict[str, Product] = {}
+    for key, product in by_name.items():
+        aliases[key] = product
+        aliases.setdefault(key + "s", product)
+        for alias in EXTRA_ALIASES.get(key, ()):
+            aliases.setdefault(alias, product)
+
+    head_nouns: Dict[str, List[Product]] = {}
+    for product in products:
+        head = normalize_text(product.name).split(" ")[-1]
+        head_nouns.setdefault(head, []).append(product)
+    for head, matches in head_nouns.items():
+        if len(matches) == 1:
+            aliases.setdefault(head, matches[0])
+            aliases.setdefault(head + "s", matches[0])
+    return aliases
+
+
+class ProductCatalog:
+    """
+    Shared, indexed view of products.jsonl.
+
+    The file is parsed once into immutable Product tuples plus lookup
+    indexes (by name, alias and category). Every access checks the file's
+    mtime at most once per check_interval and rebuilds the snapshot only
+    when the file changed, so the Flask routes and the agents never re-read
+    the file per request.
+    """
+
+    def __init__(self, products_path: str | None = None, images_dir: str | None = None, check_interval: float | None = None):
+        self.products_path = products_path or _get_default_products_path()
+        self.images_dir = images_dir or os.path.join(os.path.dirname(self.products_path), "images")
+        self.check_interval = _get_reload_check_interval() if check_interval is None else check_interval
+        self._lock = threading.Lock()
+        self._snapshot: Optional[_CatalogSnapshot] = None
+        self._checked_at = 0.0
+        self._derived: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+
+    def _file_version(self) -> Tuple[int, int]:
+        try:
+            stat = os.stat(self.products_path)
+        except FileNotFoundError:
+            return (0, 0)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _load(self, version: Tuple[int, int]) -> _CatalogSnapshot:
+        products: List[Product] = []
+        try:
+            with open(self.products_path, "r", encoding="utf-8") as f:
+                for idx, line in enumerate(f, start=1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        raw = json.loads(line)
+                    except json.JSONDecodeError:
+                        print(f"[ProductCatalog] Skipping invalid line {idx} in {self.products_path}")
+                        continue
+                    image_path = raw.get("image_path", "")
+                    products.append(
+                        Product(
+                            id=str(idx),
+                            name=raw.get("name", ""),
+                            category=raw.get("category", ""),
+                            description=raw.get("description", ""),
+                            ingredients=tuple(raw.get("ingredients", [])),
+                            price=float(raw.get("price", 0)),
+                            rating=float(raw.get("rating", 0)),
+                            image_path=image_path,
+                            image_available=bool(image_path)
+                            and os.path.exists(os.path.join(self.images_dir, image_path)),
+                        )
+                    )
+        except FileNotFoundError:
+            print(f"[ProductCatalog] Products file not found at {self.products_path}")
+
+        products_tuple = tuple(products)
+        by_name = {normalize_text(p.name): p for p in products_tuple}
+        by_category: Dict[str, List[Product]] = {}
+        for product in products_tuple:
+            by_category.setdefault(normalize_text(product.category), []).append(product)
+
+        return _CatalogSnapshot(
+            version=version,
+            products=products_tuple,
+            by_name=by_name,
+            by_alias=_build_aliases(products_tuple, by_name),
+            by_category={key: tuple(value) for key, value in by_category.items()},
+        )
+
+    def _current(self) -> _CatalogSnapshot:
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < self.check_interval:
+            return snapshot
+
+        with self._lock:
+            self._checked_at = now
+            version = self._file_version()
+            if self._snapshot is None or self._snapshot.version != version:
+                if self._snapshot is not None:
+                    print(f"[ProductCatalog] {self.products_path} changed, reloading")
+                self._snapshot = self._load(version)
+                self._derived = {}
+            return self._snapshot
+
+    @property
+    def version(self) -> Tuple[int, int]:
+        """
+        (mtime_ns, size) of the products file the catalog was built from.
+        Changes whenever the catalog reloads.
+        """
+        return self._current().version
+
+    @property
+    def products(self) -> Tuple[Product, ...]:
+        return self._current().products
+
+    @property
+    def categories(self) -> List[str]:
+        return list(dict.fromkeys(p.category for p in self._current().products))
+
+    def get_by_name(self, name: str) -> Optional[Product]:
+        return self._current().by_name.get(normalize_text(name))
+
+    def get_by_category(self, category: str) -> Tuple[Product, ...]:
+        return self._current().by_category.get(normalize_text(category), ())
+
+    def find(self, text: str, cutoff: float = 0.8) -> Optional[Product]:
+        """
+        Resolves a customer's spelling of a product: exact name, then known
+        aliases ("caramel syrup", "croissants"), then the closest alias by
+        difflib similarity above cutoff.
+        """
+        snapshot = self._current()
+        key = normalize_text(text)
+        product = snapshot.by_name.get(key) or snapshot.by_alias.get(key)
+        if product is not None:
+            return product
+        matches = difflib.get_close_matches(key, snapshot.by_alias.keys(), n=1, cutoff=cutoff)
+        return snapshot.by_alias[matches[0]] if matches else None
+
+    def aliases(self) -> List[str]:
+        """
+        All lowercase names and aliases, e.g. for keyword matching.
+        """
+        return list(self._current().by_alias.keys())
+
+    def derived(self, name: str, build):
+        """
+        Returns build(catalog) memoized until the next reload. Lets callers
+        keep representations such as an API payload or a prompt context
+        without rebuilding them per request.
+        """
+        version = self._current().version
+        entry = self._derived.get(name)
+        if entry is None or entry[0] != version:
+            entry = (version, build(self))
+            self._derived[name] = entry
+        return entry[1]
+
+    def products_context(self) -> str:
+        """
+        Plain-text menu used as LLM context when vector retrieval fails.
+        """
+        return self.derived(
+            "products_context",
+            lambda catalog: "\n".join(
+                f"Name: {p.name}\nCategory: {p.category}\nPrice: ₹{p.price:g}\nDescription: {p.description}\n"
+                for p in catalog.products
+            ),
+        )
+
+
+_product_catalog: Optional[ProductCatalog] = None
+_product_catalog_lock = threading.Lock()
+
+
+def get_product_catalog() -> ProductCatalog:
+    """
+    Returns the process-wide product catalog, creating it on first use.
+    """
+    global _product_catalog
+    if _product_catalog is None:
+        with _product_catalog_lock:
+            if _product_catalog is None:
+                _product_catalog = ProductCatalog()
+    return _product_catalog
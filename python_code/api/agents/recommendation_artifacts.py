@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from .recommendation_index import RecommendationIndex
+
+
+def _get_default_artifacts_dir() -> str:
+    # Current file: python_code/api/agents/recommendation_artifacts.py
+    # Artifacts:    python_code/api/recommendation_objects/
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.getenv(
+        "RECOMMENDATION_ARTIFACTS_DIR",
+        os.path.join(current_dir, "..", "recommendation_objects"),
+    )
+
+
+def _get_reload_interval() -> float:
+    """
+    Seconds between checks of the artifact directory for a new version.
+    Override via RECOMMENDATION_RELOAD_INTERVAL (0 disables reloading).
+    """
+    return float(os.getenv("RECOMMENDATION_RELOAD_INTERVAL", "30"))
+
+
+class _LoadedArtifacts(NamedTuple):
+    signature: Tuple
+    version: str
+    source: str
+    directory: str
+    index: RecommendationIndex
+    loaded_at: float
+
+
+class RecommendationArtifacts:
+    """
+    Serves the current RecommendationIndex and swaps in new versions.
+
+    If artifacts_dir has a manifest.json (written by
+    train_recommendations.py), the files of the version it points to are
+    served; otherwise the flat files in artifacts_dir are. A daemon thread
+    re-checks every reload_interval seconds, builds the new index off the
+    request path and replaces the reference in one assignment, so readers
+    never take a lock. A version that fails to load is skipped and the
+    previous one keeps being served.
+    """
+
+    def __init__(
+        self,
+        artifacts_dir: str | None = None,
+        apriori_file: str = "apriori_recommendations.json",
+        popularity_file: str = "popularity_recommendation.csv",
+        association_rules_file: str | None = "association_rules.json",
+        reload_interval: float | None = None,
+    ):
+        self.artifacts_dir = os.path.abspath(artifacts_dir or _get_default_artifacts_dir())
+        self.apriori_file = apriori_file
+        self.popularity_file = popularity_file
+        self.association_rules_file = association_rules_file
+        self.reload_interval = _get_reload_interval() if reload_interval is None else reload_interval
+
+        self.reloads = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._failed_signature: Optional[Tuple] = None
+
+        # The first load happens here so a broken deployment fails at startup
+        signature, version, source, directory = self._locate()
+        self._current = self._load(signature, version, source, directory)
+        print(f"[RecommendationArtifacts] Serving {version} from {directory}")
+
+        if self.reload_interval > 0:
+            self._thread = threading.Thread(target=self._run, name="recommendation-artifacts", daemon=True)
+            self._thread.start()
+
+    @classmethod
+    def from_paths(
+        cls,
+        apriori_recommendation_path: str,
+        popular_recommendation_path: str,
+        association_rules_path: str | None = None,
+        reload_interval: float | None = None,
+    ) -> "RecommendationArtifacts":
+        """
+        Watches the directory of apriori_recommendation_path, serving files
+        with the given names.
+        """
+        return cls(
+            artifacts_dir=os.path.dirname(os.path.abspath(apriori_recommendation_path)),
+            apriori_file=os.path.basename(apriori_recommendation_path),
+            popularity_file=os.path.basename(popular_recommendation_path),
+            association_rules_file=os.path.basename(association_rules_path) if association_rules_path else None,
+            reload_interval=reload_interval,
+        )
+
+    def _flat_files(self):
+        return [name for name in (self.apriori_file, self.popularity_file, self.association_rules_file) if name]
+
+    def _locate(self) -> Tuple[Tuple, str, str, str]:
+        """
+        (signature, version, source, directory) of the artifacts to serve.
+        Checks stay cheap: the small manifest is read, flat files are only
+        stat()ed.
+        """
+        manifest_path = os.path.join(self.artifacts_dir, "manifest.json")
+        try:
+            stat = os.stat(manifest_path)
+        except FileNotFoundError:
+            stat = None
+
+        if stat is not None:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            directory = os.path.normpath(os.path.join(self.artifacts_dir, manifest["path"]))
+            return ("manifest", manifest["version"]), manifest["version"], "manifest", directory
+
+        stats = []
+        for name in self._flat_files():
+            try:
+                file_stat = os.stat(os.path.join(self.artifacts_dir, name))
+                stats.append((name, file_stat.st_mtime_ns, file_stat.st_size))
+            except FileNotFoundError:
+                stats.append((name, 0, 0))
+        signature = ("files",) + tuple(stats)
+        version = "files-" + hashlib.sha256(repr(signature).encode("utf-8")).hexdigest()[:8]
+        return signature, version, "files", self.artifacts_dir
+
+    def _load(self, signature, version, source, directory) -> _LoadedArtifacts:
+        association_rules_path = (
+            os.path.join(directory, self.association_rules_file) if self.association_rules_file else None
+        )
+        index = RecommendationIndex.load(
+            os.path.join(directory, self.apriori_file),
+            os.path.join(directory, self.popularity_file),
+            association_rules_path,
+        )
+        return _LoadedArtifacts(signature, version, source, directory, index, time.time())
+
+    def reload(self) -> bool:
+        """
+        Loads the artifacts if they changed since the last load.
+        Returns True when a new version was swapped in.
+        """
+        signature = None
+        try:
+            signature, version, source, directory = self._locate()
+            if signature in (self._current.signature, self._failed_signature):
+                return False
+            loaded = self._load(signature, version, source, directory)
+        except Exception as e:
+            # Not retried until the artifacts change again
+            self._failed_signature = signature
+            self.failures += 1
+            self.last_error = str(e)
+            print(f"[RecommendationArtifacts] Reload failed, still serving {self._current.version}: {e}")
+            return False
+
+        previous = self._current.version
+        self._current = loaded
+        self.reloads += 1
+        self.last_error = None
+        print(f"[RecommendationArtifacts] Swapped {previous} -> {loaded.version}")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.reload_interval):
+            self.reload()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def index(self) -> RecommendationIndex:
+        return self._current.index
+
+    @property
+    def version(self) -> str:
+        """Version currently served: the manifest version, or files-<hash> for flat files"""
+        return self._current.version
+
+    def get_stats(self) -> Dict[str, Any]:
+        current = self._current
+        return {
+            "version": current.version,
+            "source": current.source,
+            "directory": current.directory,
+            "rules": current.index.num_rules,
+            "loaded_at": current.loaded_at,
+            "reload_interval": self.reload_interval,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,267 @@
+import csv
+import json
+import os
+from typing import Dict, List, Iterable, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class AssociationRule(NamedTuple):
+    antecedents: Tuple[str, ...]
+    consequents: Tuple[Tuple[str, str], ...]  # (product, category)
+    support: float
+    confidence: float
+    lift: float
+
+
+def rules_from_apriori_recommendations(apriori_rules: Dict[str, List[Dict]]) -> List[AssociationRule]:
+    """
+    Rules from the legacy apriori_recommendations.json: one single-product
+    antecedent per key, consequents already sorted by confidence.
+    """
+    return [
+        AssociationRule(
+            antecedents=(antecedent,),
+            consequents=((rule["product"], rule["product_category"]),),
+            support=0.0,
+            confidence=rule["confidence"],
+            lift=0.0,
+        )
+        for antecedent, rules in apriori_rules.items()
+        for rule in rules
+    ]
+
+
+def rules_from_association_rules(artifact: Dict) -> List[AssociationRule]:
+    """
+    Rules from association_rules.json, exported by
+    recommendation_engine_training.ipynb with every antecedent size.
+    """
+    categories = artifact["product_categories"]
+    return [
+        AssociationRule(
+            antecedents=tuple(rule["antecedents"]),
+            consequents=tuple((product, categories[product]) for product in rule["consequents"]),
+            support=rule["support"],
+            confidence=rule["confidence"],
+            lift=rule["lift"],
+        )
+        for rule in artifact["rules"]
+    ]
+
+
+class RecommendationIndex:
+    """
+    Precomputed, NumPy-backed view of the recommendation artifacts.
+
+    Items are (product, category) pairs, because the same product name can
+    appear in more than one category (e.g. "Dark chocolate"). Built once:
+      - one bitmask per rule over the product vocabulary, so every rule
+        whose antecedent is a subset of the basket is found with a single
+        vectorized AND over all rules
+      - one entry per (rule, consequent item) with its confidence and lift
+      - popularity: number_of_transactions per item, plus a global ranking
+        and one ranking per category
+
+    Matching entries are ranked by confidence, then lift, then the basket
+    position at which the rule became applicable, then artifact order.
+    Products already in the basket are dropped, every product keeps its
+    best rule and at most per_category_cap items per category are kept.
+    """
+
+    def __init__(
+        self,
+        rules: Sequence[AssociationRule],
+        popularity_rows: Sequence[Tuple[str, str, int]],
+    ):
+        item_ids: Dict[Tuple[str, str], int] = {}
+        name_ids: Dict[str, int] = {}
+        category_ids: Dict[str, int] = {}
+        item_names: List[int] = []
+        item_categories: List[int] = []
+
+        def item_id(product: str, category: str) -> int:
+            key = (product, category)
+            if key not in item_ids:
+                item_ids[key] = len(item_ids)
+                item_names.append(name_ids.setdefault(product, len(name_ids)))
+                item_categories.append(category_ids.setdefault(category, len(category_ids)))
+            return item_ids[key]
+
+        for product, category, _ in popularity_rows:
+            item_id(product, category)
+        for rule in rules:
+            for antecedent in rule.antecedents:
+                name_ids.setdefault(antecedent, len(name_ids))
+            for product, category in rule.consequents:
+                item_id(product, category)
+
+        self.items: List[Tuple[str, str]] = list(item_ids.keys())
+        self.names: List[str] = list(name_ids.keys())
+        self.categories: List[str] = list(category_ids.keys())
+        self.item_names = np.asarray(item_names, dtype=np.int32)
+        self.item_categories = np.asarray(item_categories, dtype=np.int32)
+        self._name_ids = name_ids
+        self._name_ids_casefold = {name.casefold(): idx for name, idx in name_ids.items()}
+        self._category_ids_casefold = {category.casefold(): idx for category, idx in category_ids.items()}
+
+        # Antecedents as bitsets over name ids (64 products per word), plus
+        # the same ids padded with len(names) for per-rule position lookups
+        self.num_rules = len(rules)
+        self.num_words = max(1, (len(self.names) + 63) // 64)
+        max_antecedents = max((len(rule.antecedents) for rule in rules), default=1)
+        self.rule_masks = np.zeros((self.num_rules, self.num_words), dtype=np.uint64)
+        self.rule_antecedents = np.full((self.num_rules, max_antecedents), len(self.names), dtype=np.int32)
+
+        entry_rules: List[int] = []
+        entry_items: List[int] = []
+        for rule_id, rule in enumerate(rules):
+            for position, antecedent in enumerate(rule.antecedents):
+                name_id = name_ids[antecedent]
+                self.rule_masks[rule_id, name_id // 64] |= np.uint64(1 << (name_id % 64))
+                self.rule_antecedents[rule_id, position] = name_id
+            for product, category in rule.consequents:
+                entry_rules.append(rule_id)
+                entry_items.append(item_ids[(product, category)])
+
+        self.entry_rules = np.asarray(entry_rules, dtype=np.int64)
+        self.entry_items = np.asarray(entry_items, dtype=np.int64)
+        self.entry_confidence = np.asarray([rules[r].confidence for r in entry_rules], dtype=np.float64)
+        self.entry_lift = np.asarray([rules[r].lift for r in entry_rules], dtype=np.float64)
+
+        self.popularity = np.zeros(len(self.items), dtype=np.int64)
+        ranked = []
+        for product, category, transactions in popularity_rows:
+            idx = item_ids[(product, category)]
+            self.popularity[idx] = transactions
+            ranked.append(idx)
+        ranked = np.asarray(ranked, dtype=np.int64)
+        self.popular_order = ranked[np.argsort(-self.popularity[ranked], kind="stable")]
+        self.category_rankings = {
+            category_id: self.popular_order[self.item_categories[self.popular_order] == category_id]
+            for category_id in range(len(self.categories))
+        }
+
+        # Same lists (and order) the agent's prompt used from the popularity CSV
+        self.popular_products = [product for product, _, _ in popularity_rows]
+        self.popular_categories = [category for _, category, _ in popularity_rows]
+
+    @classmethod
+    def load(
+        cls,
+        apriori_path: str,
+        popularity_path: str,
+        association_rules_path: str | None = None,
+    ) -> "RecommendationIndex":
+        """
+        Builds the index from association_rules.json when it exists, else
+        from the single-antecedent apriori_recommendations.json.
+        """
+        if association_rules_path and os.path.exists(association_rules_path):
+            with open(association_rules_path, "r") as file:
+                rules = rules_from_association_rules(json.load(file))
+        else:
+            if association_rules_path:
+                print(f"[RecommendationIndex] {association_rules_path} not found, using {apriori_path}")
+            with open(apriori_path, "r") as file:
+                rules = rules_from_apriori_recommendations(json.load(file))
+
+        with open(popularity_path, "r", newline="") as file:
+            popularity_rows = [
+                (row["product"], row["product_category"], int(row["number_of_transactions"]))
+                for row in csv.DictReader(file)
+            ]
+        return cls(rules, popularity_rows)
+
+    def _name_id(self, product: str) -> Optional[int]:
+        idx = self._name_ids.get(product)
+        if idx is None:
+            idx = self._name_ids_casefold.get(str(product).casefold())
+        return idx
+
+    def _basket_rows(self, products: Iterable[str]) -> List[int]:
+        return list(dict.fromkeys(idx for idx in (self._name_id(p) for p in products) if idx is not None))
+
+    def _matching_rules(self, rows: List[int]) -> np.ndarray:
+        basket_mask = np.zeros(self.num_words, dtype=np.uint64)
+        for row in rows:
+            basket_mask[row // 64] |= np.uint64(1 << (row % 64))
+        return ~np.any(self.rule_masks & ~basket_mask, axis=1)
+
+    def matching_rules(self, products: Iterable[str]) -> np.ndarray:
+        """
+        Ids of every rule whose antecedent is a subset of the basket.
+        """
+        return np.flatnonzero(self._matching_rules(self._basket_rows(products)))
+
+    def _first_per_name(self, order: np.ndarray) -> np.ndarray:
+        """Keeps the first (best-ranked) item of every product name."""
+        names = self.item_names[order]
+        first_position = np.full(len(self.names), len(order), dtype=np.int64)
+        np.minimum.at(first_position, names, np.arange(len(order)))
+        return order[first_position[names] == np.arange(len(order))]
+
+    def _cap_per_category(self, order: np.ndarray, cap: int) -> np.ndarray:
+        """Keeps at most cap items of each category, preserving the ranking."""
+        categories = self.item_categories[order]
+        one_hot = categories[:, None] == np.arange(len(self.categories))
+        rank_in_category = np.cumsum(one_hot, axis=0)[np.arange(len(order)), categories]
+        return order[rank_in_category <= cap]
+
+    def _to_names(self, order: np.ndarray, top_k: int) -> List[str]:
+        return [self.items[idx][0] for idx in order[:top_k]]
+
+    def apriori(self, products: Iterable[str], top_k: int = 5, per_category_cap: int = 2) -> List[str]:
+        """
+        Products frequently bought with the basket, best rule first.
+        """
+        rows = self._basket_rows(products)
+        if not rows or not self.num_rules:
+            return []
+
+        in_basket = np.zeros(len(self.names), dtype=bool)
+        in_basket[rows] = True
+        matched = self._matching_rules(rows)
+        entries = np.flatnonzero(matched[self.entry_rules] & ~in_basket[self.item_names[self.entry_items]])
+        if not entries.size:
+            return []
+
+        # A rule becomes applicable once its last antecedent is in the basket
+        basket_position = np.full(len(self.names) + 1, -1, dtype=np.int64)
+        basket_position[rows] = np.arange(len(rows))
+        entry_rules = self.entry_rules[entries]
+        rule_position = basket_position[self.rule_antecedents[entry_rules]].max(axis=1)
+
+        order = np.lexsort((
+            entry_rules,
+            rule_position,
+            -self.entry_lift[entries],
+            -self.entry_confidence[entries],
+        ))
+        order = self.entry_items[entries[order]]
+        order = self._cap_per_category(self._first_per_name(order), per_category_cap)
+        return self._to_names(order, top_k)
+
+    def popular(self, product_categories=None, top_k: int = 5) -> List[str]:
+        """
+        Most purchased products overall, or within the given categories.
+        """
+        if isinstance(product_categories, str):
+            product_categories = [product_categories]
+
+        if product_categories is None:
+            order = self.popular_order
+        else:
+            category_ids = {
+                self._category_ids_casefold[c.casefold()]
+                for c in product_categories
+                if isinstance(c, str) and c.casefold() in self._category_ids_casefold
+            }
+            if not category_ids:
+                return []
+            if len(category_ids) == 1:
+                order = self.category_rankings[category_ids.pop()]
+            else:
+                order = self.popular_order[np.isin(self.item_categories[self.popular_order], list(category_ids))]
+
+        return self._to_names(self._first_per_name(order), top_k)
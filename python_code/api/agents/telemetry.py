@@ -0,0 +1,303 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+def _log_request_traces() -> bool:
+    """
+    Whether a one-line span breakdown is printed after every chat request.
+    Override via REQUEST_TRACE_LOG.
+    """
+    return os.getenv("REQUEST_TRACE_LOG", "true").lower() == "true"
+
+
+# Seconds; covers local work (ms) up to slow multi-call Gemini turns
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    # Exact for counts of any size ("{:g}" would round 1234567 to 1.23457e+06)
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labelnames: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # labels -> [per-bucket counts..., sum, count]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[idx] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = _format_labels(self.labelnames, key, f'le="{bound:g}"')
+                    lines.append(f"{self.name}_bucket{labels} {_format_value(count)}")
+                labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {_format_value(series[-1])}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-2])}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {_format_value(series[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Minimal in-process metrics store rendered in the Prometheus text
+    exposition format, so /api/metrics needs no extra dependency.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Any] = {}
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+REQUEST_SECONDS = metrics.histogram(
+    "shopease_request_duration_seconds", "Duration of chat requests", ("route",)
+)
+SPAN_SECONDS = metrics.histogram(
+    "shopease_span_duration_seconds", "Duration of agent, Gemini, embedding and vector index calls", ("kind", "name")
+)
+SPAN_ERRORS = metrics.counter(
+    "shopease_span_errors_total", "Instrumented calls that raised", ("kind", "name")
+)
+GEMINI_TOKENS = metrics.counter(
+    "shopease_gemini_tokens_total", "Gemini tokens by model and kind (input, output, cached)", ("model", "kind")
+)
+CACHE_LOOKUPS = metrics.counter(
+    "shopease_cache_lookups_total", "Response and embedding cache lookups", ("cache", "result")
+)
+JSON_REPAIRS = metrics.counter(
+    "shopease_json_repair_total", "How model JSON outputs were recovered", ("outcome",)
+)
+
+
+class Span:
+    """
+    One timed operation. Attributes are numbers (token counts, cache hits)
+    or short strings shown in the request log.
+    """
+
+    __slots__ = ("kind", "name", "attributes", "duration", "error")
+
+    def __init__(self, kind: str, name: str, attributes: Dict[str, Any]):
+        self.kind = kind
+        self.name = name
+        self.attributes = attributes
+        self.duration = 0.0
+        self.error = False
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, key: str, amount: float = 1):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def describe(self) -> str:
+        attributes = "".join(f" {key}={value}" for key, value in self.attributes.items())
+        error = " error" if self.error else ""
+        return f"{self.kind}:{self.name} {self.duration * 1000:.0f}ms{attributes}{error}"
+
+
+class RequestTrace:
+    """Spans recorded while serving one request, in completion order."""
+
+    def __init__(self, request_id: str, route: str):
+        self.request_id = request_id
+        self.route = route
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self._lock = threading.Lock()
+        self.spans: List[Span] = []
+
+    def add(self, span: Span):
+        # Guard and routing spans may finish on worker threads
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self) -> str:
+        with self._lock:
+            spans = " | ".join(span.describe() for span in self.spans)
+        return f"[request {self.request_id}] {self.route} {self.duration * 1000:.0f}ms | {spans}"
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace is not None else None
+
+
+@contextmanager
+def request_trace(route: str, request_id: str | None = None) -> Iterator[RequestTrace]:
+    """
+    Collects the spans of one request. On exit the request duration is
+    recorded and, with REQUEST_TRACE_LOG, the breakdown is printed under
+    the request id.
+    """
+    trace = RequestTrace(request_id or new_request_id(), route)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        trace.duration = time.perf_counter() - trace.started
+        REQUEST_SECONDS.observe(trace.duration, route=route)
+        if _log_request_traces():
+            print(trace.summary())
+
+
+@contextmanager
+def span(kind: str, name: str, **attributes) -> Iterator[Span]:
+    """
+    Times the block into shopease_span_duration_seconds{kind, name} and
+    adds it to the current request's trace, if any.
+    """
+    current = Span(kind, name or "default", attributes)
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except (GeneratorExit, asyncio.CancelledError):
+        # A streaming consumer stopped early or the task was cancelled
+        # (e.g. routing after a "not allowed" guard decision)
+        raise
+    except BaseException:
+        current.error = True
+        SPAN_ERRORS.inc(kind=kind, name=current.name)
+        raise
+    finally:
+        current.duration = time.perf_counter() - started
+        _current_span.reset(token)
+        SPAN_SECONDS.observe(current.duration, kind=kind, name=current.name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(current)
+
+
+def record_usage(current: Span, model_name: str, usage_metadata) -> None:
+    """Copies a Gemini response's token counts onto the span and the counters."""
+    if usage_metadata is None:
+        return
+    counts = {
+        "input": getattr(usage_metadata, "prompt_token_count", 0) or 0,
+        "output": getattr(usage_metadata, "candidates_token_count", 0) or 0,
+        "cached": getattr(usage_metadata, "cached_content_token_count", 0) or 0,
+    }
+    for kind, count in counts.items():
+        if count:
+            current.add(f"{kind}_tokens", count)
+            GEMINI_TOKENS.inc(count, model=model_name, kind=kind)
+
+
+def record_cache_lookup(cache: str, hits: int, misses: int) -> None:
+    if hits:
+        CACHE_LOOKUPS.inc(hits, cache=cache, result="hit")
+    if misses:
+        CACHE_LOOKUPS.inc(misses, cache=cache, result="miss")
+
+
+def record_json_repair(outcome: str) -> None:
+    """Counts a JSON repair outcome; model fallbacks are also noted on the current span."""
+    JSON_REPAIRS.inc(outcome=outcome)
+    if outcome == "llm_fallback":
+        add_to_current_span("json_repair_fallbacks")
+
+
+def add_to_current_span(key: str, amount: float = 1) -> None:
+    """Adds to an attribute of the innermost open span, if any (e.g. cache hits)."""
+    current = _current_span.get()
+    if current is not None:
+        current.add(key, amount)
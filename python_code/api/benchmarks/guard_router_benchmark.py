@@ -0,0 +1,137 @@
+"""
+Side-by-side benchmark of the two routing pipelines in GeminiAgentController:
+  - two_agent: GeminiGuardAgent + GeminiClassificationAgent
+  - fused:     GeminiGuardRouterAgent (one Gemini call)
+
+For every recorded conversation both pipelines route the same messages and
+the script reports latency percentiles and how often the decisions agree.
+
+Usage (from python_code/api):
+    python benchmarks/guard_router_benchmark.py
+    python benchmarks/guard_router_benchmark.py --repeats 3 --output report.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+api_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, api_dir)
+
+from gemini_agent_controller import GeminiAgentController  # noqa: E402
+
+DEFAULT_CONVERSATIONS = os.path.join(api_dir, "benchmarks", "recorded_conversations.jsonl")
+MODES = ("two_agent", "fused")
+
+
+def load_conversations(path):
+    conversations = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                conversations.append(json.loads(line))
+    return conversations
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def route_once(controller, mode, messages):
+    controller.pipeline_mode = mode
+    start = time.perf_counter()
+    guard_response, classification_response = controller.route(messages)
+    elapsed = time.perf_counter() - start
+
+    guard_decision = guard_response["memory"]["guard_decision"]
+    route = None
+    if classification_response is not None:
+        route = classification_response["memory"]["classification_decision"]
+    return elapsed, guard_decision, route
+
+
+def run_benchmark(conversations, repeats):
+    controller = GeminiAgentController()
+    latencies = {mode: [] for mode in MODES}
+    rows = []
+
+    for conversation in conversations:
+        for _ in range(repeats):
+            decisions = {}
+            for mode in MODES:
+                elapsed, guard_decision, route = route_once(controller, mode, conversation["messages"])
+                latencies[mode].append(elapsed)
+                decisions[mode] = {
+                    "latency_ms": round(elapsed * 1000, 1),
+                    "guard_decision": guard_decision,
+                    "route": route,
+                }
+
+            two_agent, fused = decisions["two_agent"], decisions["fused"]
+            rows.append(
+                {
+                    "id": conversation.get("id"),
+                    "decisions": decisions,
+                    "guard_agrees": two_agent["guard_decision"] == fused["guard_decision"],
+                    "route_agrees": (
+                        two_agent["guard_decision"] == fused["guard_decision"]
+                        and two_agent["route"] == fused["route"]
+                    ),
+                }
+            )
+
+    summary = {}
+    for mode in MODES:
+        values = latencies[mode]
+        summary[mode] = {
+            "calls": len(values),
+            "mean_ms": round(statistics.mean(values) * 1000, 1) if values else 0.0,
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+        }
+
+    total = len(rows) or 1
+    summary["agreement"] = {
+        "guard": round(sum(r["guard_agrees"] for r in rows) / total, 3),
+        "guard_and_route": round(sum(r["route_agrees"] for r in rows) / total, 3),
+    }
+    return summary, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", default=DEFAULT_CONVERSATIONS)
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--output", help="Optional path for a JSON report")
+    args = parser.parse_args()
+
+    conversations = load_conversations(args.conversations)
+    summary, rows = run_benchmark(conversations, args.repeats)
+
+    print(f"\n{'mode':<10} {'calls':>6} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for mode in MODES:
+        s = summary[mode]
+        print(f"{mode:<10} {s['calls']:>6} {s['mean_ms']:>9} {s['p50_ms']:>9} {s['p95_ms']:>9}")
+    print(f"\nGuard agreement:           {summary['agreement']['guard']:.1%}")
+    print(f"Guard + route agreement:   {summary['agreement']['guard_and_route']:.1%}")
+
+    disagreements = [r for r in rows if not r["route_agrees"]]
+    for row in disagreements:
+        print(f"  disagreement on {row['id']}: {row['decisions']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "rows": rows}, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
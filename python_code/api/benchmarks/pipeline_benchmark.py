@@ -0,0 +1,201 @@
+"""
+Throughput and latency benchmark of the full GeminiAgentController pipeline
+(routing, agents, caches) under many concurrent conversations.
+
+By default Gemini and Pinecone are served by the replay backend
+(GEMINI_BACKEND_MODE=replay, see agents/gemini_backend.py), so the benchmark
+runs on an offline box: recorded responses come back with their recorded
+latency, and requests that were never recorded get schema-shaped
+placeholders. To capture recordings, run once against the real services:
+
+    GEMINI_API_KEY=... PINECONE_API_KEY=... \\
+        python benchmarks/pipeline_benchmark.py --backend record --concurrency 1
+
+Every conversation is replayed turn by turn like a user would: one request
+per user message, carrying the history up to that message. Virtual users
+run side by side, either on threads (get_response) or as tasks on one event
+loop (aget_response).
+
+Usage (from python_code/api):
+    python benchmarks/pipeline_benchmark.py
+    python benchmarks/pipeline_benchmark.py --mode async --concurrency 64 --repeats 10
+    python benchmarks/pipeline_benchmark.py --latency 0.2 --output report.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+api_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, api_dir)
+
+DEFAULT_CONVERSATIONS = os.path.join(api_dir, "benchmarks", "recorded_conversations.jsonl")
+MODES = ("threads", "async")
+
+
+def load_conversations(path):
+    conversations = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                conversations.append(json.loads(line))
+    return conversations
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def user_turns(messages):
+    """The request payloads of a conversation: the history up to each user message."""
+    return [messages[: idx + 1] for idx, message in enumerate(messages) if message["role"] == "user"]
+
+
+def _agent_of(response):
+    return (response.get("memory") or {}).get("agent", "guard_agent")
+
+
+def run_conversation_sync(controller, conversation):
+    results = []
+    for messages in user_turns(conversation["messages"]):
+        start = time.perf_counter()
+        try:
+            agent = _agent_of(controller.get_response({"input": {"messages": messages}}))
+        except Exception as e:
+            agent = f"error: {type(e).__name__}"
+        results.append((time.perf_counter() - start, agent))
+    return results
+
+
+async def run_conversation_async(controller, conversation):
+    results = []
+    for messages in user_turns(conversation["messages"]):
+        start = time.perf_counter()
+        try:
+            agent = _agent_of(await controller.aget_response({"input": {"messages": messages}}))
+        except Exception as e:
+            agent = f"error: {type(e).__name__}"
+        results.append((time.perf_counter() - start, agent))
+    return results
+
+
+def run_threads(controller, jobs, concurrency):
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="virtual-user") as pool:
+        return list(pool.map(lambda conversation: run_conversation_sync(controller, conversation), jobs))
+
+
+def run_async(controller, jobs, concurrency):
+    async def main():
+        slots = asyncio.Semaphore(concurrency)
+
+        async def user(conversation):
+            async with slots:
+                return await run_conversation_async(controller, conversation)
+
+        return await asyncio.gather(*(user(conversation) for conversation in jobs))
+
+    return asyncio.run(main())
+
+
+def summarize(latencies):
+    return {
+        "requests": len(latencies),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1) if latencies else 0.0,
+    }
+
+
+def run_benchmark(controller, conversations, mode, concurrency, repeats, verbose=False):
+    jobs = [conversation for _ in range(repeats) for conversation in conversations]
+    runner = run_async if mode == "async" else run_threads
+
+    # Agents log every turn; keep the report readable unless asked otherwise
+    with open(os.devnull, "w") as devnull:
+        with contextlib.nullcontext() if verbose else contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            per_conversation = runner(controller, jobs, concurrency)
+            wall = time.perf_counter() - start
+
+    results = [result for conversation in per_conversation for result in conversation]
+    by_agent = {}
+    for elapsed, agent in results:
+        by_agent.setdefault(agent, []).append(elapsed)
+
+    summary = {
+        "mode": mode,
+        "concurrency": concurrency,
+        "conversations": len(jobs),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(results) / wall, 2) if wall else 0.0,
+        "errors": sum(len(values) for agent, values in by_agent.items() if agent.startswith("error")),
+        "latency": summarize([elapsed for elapsed, _ in results]),
+        "by_agent": {agent: summarize(values) for agent, values in sorted(by_agent.items())},
+    }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", default=DEFAULT_CONVERSATIONS)
+    parser.add_argument("--mode", choices=MODES, default="threads")
+    parser.add_argument("--concurrency", type=int, default=16, help="Virtual users running at once")
+    parser.add_argument("--repeats", type=int, default=4, help="Times every conversation is replayed")
+    parser.add_argument("--backend", choices=("live", "record", "replay"), default="replay")
+    parser.add_argument("--recordings", help="Recordings file (GEMINI_RECORDINGS_PATH)")
+    parser.add_argument("--latency", help='Injected replay latency: "recorded" or seconds (GEMINI_REPLAY_LATENCY)')
+    parser.add_argument("--verbose", action="store_true", help="Keep the agents' per-turn logging")
+    parser.add_argument("--output", help="Optional path for a JSON report")
+    args = parser.parse_args()
+
+    # Read once when the backend and the controller are created
+    os.environ["GEMINI_BACKEND_MODE"] = args.backend
+    if args.recordings:
+        os.environ["GEMINI_RECORDINGS_PATH"] = os.path.abspath(args.recordings)
+    if args.latency:
+        os.environ["GEMINI_REPLAY_LATENCY"] = args.latency
+    os.environ.setdefault("REQUEST_TRACE_LOG", "false")
+
+    from gemini_agent_controller import GeminiAgentController
+
+    conversations = load_conversations(args.conversations)
+    controller = GeminiAgentController()
+    summary = run_benchmark(controller, conversations, args.mode, args.concurrency, args.repeats, args.verbose)
+    stats = controller.get_stats()
+
+    print(
+        f"\n{summary['conversations']} conversations, {summary['latency']['requests']} requests "
+        f"({args.mode}, concurrency {args.concurrency}, backend {args.backend})"
+    )
+    print(f"Wall time:   {summary['wall_s']}s")
+    print(f"Throughput:  {summary['throughput_rps']} requests/s")
+    print(f"Errors:      {summary['errors']}")
+
+    print(f"\n{'agent':<22} {'requests':>8} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for agent, s in [("all", summary["latency"])] + list(summary["by_agent"].items()):
+        print(f"{agent:<22} {s['requests']:>8} {s['mean_ms']:>9} {s['p50_ms']:>9} {s['p95_ms']:>9} {s['p99_ms']:>9}")
+
+    if "gemini_backend" in stats:
+        print(f"\nBackend: {stats['gemini_backend']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "stats": stats}, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
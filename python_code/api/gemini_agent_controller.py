@@ -1,13 +1,91 @@
-from typing import Dict, Any
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Generator, Iterator, NamedTuple, Tuple, Optional, Union
 
 from agents import (
     AgentProtocol,
+    AsyncAgentProtocol,
 )
+from agents.gemini_backend import get_gemini_backend
+from agents.gemini_cache import get_embedding_cache, get_response_cache
+from agents.gemini_context_cache import get_context_cache
 from agents.gemini_guard_agent import GeminiGuardAgent
 from agents.gemini_classification_agent import GeminiClassificationAgent
+from agents.gemini_guard_router_agent import GeminiGuardRouterAgent
 from agents.gemini_details_agent import GeminiDetailsAgent
 from agents.gemini_order_taking_agent import GeminiOrderTakingAgent
 from agents.gemini_recommendation_agent import GeminiRecommendationAgent
+from agents.gemini_utils import warm_up_gemini
+from agents.json_repair import json_repair_stats
+from agents.local_router import LocalRouter
+from agents.telemetry import span
+
+
+def _get_dispatch_mode() -> str:
+    """
+    Returns how the guard and classification agents are dispatched.
+      - "concurrent": run both Gemini calls at the same time (default)
+      - "sequential": run the guard first and only classify allowed messages
+    Override via GEMINI_DISPATCH_MODE.
+    """
+    return os.getenv("GEMINI_DISPATCH_MODE", "concurrent").lower()
+
+
+def _get_pipeline_mode() -> str:
+    """
+    Returns which routing pipeline is used.
+      - "two_agent": separate guard and classification agents (default)
+      - "fused": one GeminiGuardRouterAgent call, falling back to two_agent on errors
+    Override via GEMINI_PIPELINE_MODE.
+    """
+    return os.getenv("GEMINI_PIPELINE_MODE", "two_agent").lower()
+
+
+def _use_local_router() -> bool:
+    """
+    Whether the rule-based LocalRouter is tried before the Gemini classifier.
+    Override via GEMINI_LOCAL_ROUTER.
+    """
+    return os.getenv("GEMINI_LOCAL_ROUTER", "true").lower() == "true"
+
+
+def _should_warm_up() -> bool:
+    """
+    Whether the Gemini client and models are warmed up when the controller starts.
+    Override via GEMINI_WARMUP.
+    """
+    return os.getenv("GEMINI_WARMUP", "false").lower() == "true"
+
+
+def _get_dispatch_workers() -> int:
+    """
+    Number of worker threads used for concurrent dispatch.
+    Override via GEMINI_DISPATCH_WORKERS.
+    """
+    return int(os.getenv("GEMINI_DISPATCH_WORKERS", "8"))
+
+
+class AgentCall(NamedTuple):
+    """Routing step: run one agent and send back its response."""
+
+    name: str
+    agent: Any
+
+
+class GuardedCall(NamedTuple):
+    """
+    Routing step: run the guard with the background call alongside it and send
+    back (guard_response, background_response). The background call is
+    cancelled (None) when the guard does not allow the message.
+    """
+
+    guard: AgentCall
+    background: AgentCall
+
+
+RoutingStep = Union[AgentCall, GuardedCall]
 
 
 class GeminiAgentController:
@@ -19,43 +97,292 @@ class GeminiAgentController:
     where input = {"input": {"messages": [...]}}.
     """
 
-    def __init__(self):
+    def __init__(self, dispatch_mode: str | None = None, pipeline_mode: str | None = None):
+        self.dispatch_mode = dispatch_mode or _get_dispatch_mode()
+        if self.dispatch_mode not in ("concurrent", "sequential"):
+            raise ValueError(f"Unknown dispatch mode: {self.dispatch_mode}")
+        self.pipeline_mode = pipeline_mode or _get_pipeline_mode()
+        if self.pipeline_mode not in ("two_agent", "fused"):
+            raise ValueError(f"Unknown pipeline mode: {self.pipeline_mode}")
+
+        # Shared pool for running the guard and classification calls side by side.
+        # Only created in concurrent mode so sequential mode has no extra threads.
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if self.dispatch_mode == "concurrent":
+            self._executor = ThreadPoolExecutor(
+                max_workers=_get_dispatch_workers(),
+                thread_name_prefix="gemini-dispatch",
+            )
+
         self.guard_agent = GeminiGuardAgent()
         self.classification_agent = GeminiClassificationAgent()
-        self.recommendation_agent = GeminiRecommendationAgent(
-            "recommendation_objects/apriori_recommendations.json",
-            "recommendation_objects/popularity_recommendation.csv",
-        )
+        self.guard_router_agent = GeminiGuardRouterAgent()
+        self.local_router = LocalRouter() if _use_local_router() else None
+        # Artifacts come from RECOMMENDATION_ARTIFACTS_DIR (default
+        # api/recommendation_objects) and are hot-reloaded after retraining
+        self.recommendation_agent = GeminiRecommendationAgent()
+
+        self.order_taking_agent = GeminiOrderTakingAgent(self.recommendation_agent)
 
-        self.agent_dict: Dict[str, AgentProtocol] = {
+        self.agent_dict: Dict[str, AgentProtocol | AsyncAgentProtocol] = {
             "details_agent": GeminiDetailsAgent(),
-            "order_taking_agent": GeminiOrderTakingAgent(self.recommendation_agent),
+            "order_taking_agent": self.order_taking_agent,
             "recommendation_agent": self.recommendation_agent,
         }
 
-    def get_response(self, input: Dict[str, Any]) -> Dict[str, Any]:
-        # Extract user input
-        job_input = input["input"]
-        messages = job_input["messages"]
+        if _should_warm_up():
+            warm_up_gemini()
+
+    def _call_agent(self, name: str, agent, messages) -> Dict[str, Any]:
+        """Runs one agent inside an "agent" span (timed per agent name)."""
+        with span("agent", name):
+            return agent.get_response(messages)
+
+    def _routing_steps(self, messages) -> Generator[RoutingStep, Any, Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+        """
+        The routing decision for the configured pipeline mode, shared by route
+        and aroute. Yields the agent calls it needs (AgentCall or GuardedCall),
+        is sent their results (or has their exceptions thrown in) and returns
+        (guard_response, classification_response).
+        """
+        guard_call = AgentCall("guard_agent", self.guard_agent)
+
+        if self.local_router is not None:
+            decision = self.local_router.classify(messages)
+            if decision is not None:
+                # The routing decision is already known, so only the guard goes to Gemini.
+                guard_agent_response = yield guard_call
+                if guard_agent_response["memory"]["guard_decision"] == "not allowed":
+                    return guard_agent_response, None
+                return guard_agent_response, self.local_router.to_response(decision)
+
+        if self.pipeline_mode == "fused":
+            try:
+                fused_response = yield AgentCall("guard_router_agent", self.guard_router_agent)
+            except Exception as e:
+                print(f"[GeminiAgentController] Fused routing failed, using two-agent path: {e}")
+            else:
+                if fused_response["memory"]["guard_decision"] == "not allowed":
+                    return fused_response, None
+                return fused_response, fused_response
+
+        classification_call = AgentCall("classification_agent", self.classification_agent)
+        if self.dispatch_mode == "concurrent":
+            return (yield GuardedCall(guard_call, classification_call))
+
+        guard_agent_response = yield guard_call
+        if guard_agent_response["memory"]["guard_decision"] == "not allowed":
+            return guard_agent_response, None
+        return guard_agent_response, (yield classification_call)
+
+    def _run_guarded(self, step: GuardedCall, messages) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        # The background call goes to the pool while the guard runs on the
+        # request thread, so routing costs one Gemini round-trip instead of two.
+        # copy_context keeps the worker's spans in this request's trace
+        background_future = self._executor.submit(
+            contextvars.copy_context().run,
+            self._call_agent,
+            step.background.name,
+            step.background.agent,
+            messages,
+        )
+        try:
+            guard_agent_response = self._call_agent(step.guard.name, step.guard.agent, messages)
+        except BaseException:
+            background_future.cancel()
+            raise
 
-        # Guard
-        guard_agent_response = self.guard_agent.get_response(messages)
         if guard_agent_response["memory"]["guard_decision"] == "not allowed":
+            # Cancel if it has not started yet; otherwise the result is discarded.
+            background_future.cancel()
+            return guard_agent_response, None
+
+        return guard_agent_response, background_future.result()
+
+    def _run_step(self, step: RoutingStep, messages):
+        if isinstance(step, GuardedCall):
+            return self._run_guarded(step, messages)
+        return self._call_agent(step.name, step.agent, messages)
+
+    def route(self, messages) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """
+        Runs the guard and routing step for the configured pipeline mode.
+
+        Returns (guard_response, classification_response). The classification
+        response is None when the guard decision is "not allowed"; both carry
+        the decision under "memory" just like the individual agents.
+        """
+        steps = self._routing_steps(messages)
+        result, error = None, None
+        while True:
+            try:
+                step = steps.send(result) if error is None else steps.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                result, error = self._run_step(step, messages), None
+            except Exception as e:
+                result, error = None, e
+
+    def _chosen_agent(self, guard_agent_response, classification_agent_response) -> Optional[str]:
+        """The agent that answers the message, or None when the guard did not allow it."""
+        if classification_agent_response is None:
             print("[GeminiAgentController] Guard decision: not allowed")
-            return guard_agent_response
+            return None
         print("[GeminiAgentController] Guard decision: allowed")
 
-        # Classification
-        classification_agent_response = self.classification_agent.get_response(messages)
         chosen_agent = classification_agent_response["memory"]["classification_decision"]
         print(f"[GeminiAgentController] Chosen agent: {chosen_agent}")
+        return chosen_agent
+
+    def get_response(self, input: Dict[str, Any]) -> Dict[str, Any]:
+        # Extract user input
+        job_input = input["input"]
+        messages = job_input["messages"]
+
+        # Guard + classification
+        guard_agent_response, classification_agent_response = self.route(messages)
+
+        chosen_agent = self._chosen_agent(guard_agent_response, classification_agent_response)
+        if chosen_agent is None:
+            return guard_agent_response
 
         # Delegate to chosen agent
         agent = self.agent_dict[chosen_agent]
-        response = agent.get_response(messages)
+        response = self._call_agent(chosen_agent, agent, messages)
 
         return response
 
+    def stream_response(self, input: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Streaming variant of get_response. Yields (event, data) pairs:
+          - ("routing", {"guard_decision": ..., "agent": ...}) once routing is done
+          - ("token", {"text": ...}) for each chunk of the final agent's reply
+          - ("done", {"message": {...}}) with the full message incl. memory
+
+        Agents with a stream_response generator stream their Gemini output;
+        the others are answered in one chunk.
+        """
+        job_input = input["input"]
+        messages = job_input["messages"]
+
+        guard_agent_response, classification_agent_response = self.route(messages)
+
+        chosen_agent = self._chosen_agent(guard_agent_response, classification_agent_response)
+        if chosen_agent is None:
+            yield "routing", {"guard_decision": "not allowed", "agent": None}
+            yield "token", {"text": guard_agent_response.get("content", "")}
+            yield "done", {"message": guard_agent_response}
+            return
+        yield "routing", {"guard_decision": "allowed", "agent": chosen_agent}
+
+        agent = self.agent_dict[chosen_agent]
+        with span("agent", chosen_agent):
+            if hasattr(agent, "stream_response"):
+                stream = agent.stream_response(messages)
+                while True:
+                    try:
+                        chunk = next(stream)
+                    except StopIteration as stop:
+                        response = stop.value
+                        break
+                    yield "token", {"text": chunk}
+            else:
+                response = agent.get_response(messages)
+                yield "token", {"text": response.get("content", "")}
+
+        yield "done", {"message": response}
 
+    # ------------------------------------------------------------------
+    # Async pipeline
+    #
+    # Runs the same routing steps as above, but every Gemini call is awaited
+    # so a single event loop can serve many conversations concurrently. The
+    # sync methods above stay for WSGI/RunPod callers.
+    # ------------------------------------------------------------------
+
+    async def _acall_agent(self, name: str, agent, messages) -> Dict[str, Any]:
+        """Async version of _call_agent."""
+        with span("agent", name):
+            if hasattr(agent, "aget_response"):
+                return await agent.aget_response(messages)
+            # Agents without an async implementation run in a worker thread
+            return await asyncio.to_thread(agent.get_response, messages)
+
+    async def _arun_guarded(self, step: GuardedCall, messages) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        background_task = asyncio.ensure_future(
+            self._acall_agent(step.background.name, step.background.agent, messages)
+        )
+        try:
+            guard_agent_response = await self._acall_agent(step.guard.name, step.guard.agent, messages)
+        except BaseException:
+            background_task.cancel()
+            raise
+
+        if guard_agent_response["memory"]["guard_decision"] == "not allowed":
+            background_task.cancel()
+            return guard_agent_response, None
 
+        return guard_agent_response, await background_task
 
+    async def _arun_step(self, step: RoutingStep, messages):
+        if isinstance(step, GuardedCall):
+            return await self._arun_guarded(step, messages)
+        return await self._acall_agent(step.name, step.agent, messages)
+
+    async def aroute(self, messages) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """
+        Async version of route.
+        """
+        steps = self._routing_steps(messages)
+        result, error = None, None
+        while True:
+            try:
+                step = steps.send(result) if error is None else steps.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                result, error = await self._arun_step(step, messages), None
+            except Exception as e:
+                result, error = None, e
+
+    async def aget_response(self, input: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Async version of get_response.
+        """
+        job_input = input["input"]
+        messages = job_input["messages"]
+
+        guard_agent_response, classification_agent_response = await self.aroute(messages)
+
+        chosen_agent = self._chosen_agent(guard_agent_response, classification_agent_response)
+        if chosen_agent is None:
+            return guard_agent_response
+
+        return await self._acall_agent(chosen_agent, self.agent_dict[chosen_agent], messages)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Returns routing and cache statistics, e.g. the LocalRouter and
+        OrderEngine hit rates, how often JSON outputs still needed a model
+        repair call and the recommendation artifact version being served.
+        """
+        stats: Dict[str, Any] = {
+            "dispatch_mode": self.dispatch_mode,
+            "pipeline_mode": self.pipeline_mode,
+        }
+        if self.local_router is not None:
+            stats["local_router"] = self.local_router.get_stats()
+        if self.order_taking_agent.order_engine is not None:
+            stats["order_engine"] = self.order_taking_agent.order_engine.get_stats()
+        stats["response_cache"] = get_response_cache().get_stats()
+        stats["embedding_cache"] = get_embedding_cache().get_stats()
+        context_cache = get_context_cache()
+        if context_cache is not None:
+            stats["context_cache"] = context_cache.get_stats()
+        backend = get_gemini_backend()
+        if backend is not None:
+            stats["gemini_backend"] = backend.get_stats()
+        stats["json_repair"] = json_repair_stats.get_stats()
+        stats["recommendation_artifacts"] = self.recommendation_agent.artifacts.get_stats()
+        return stats
@@ -0,0 +1,478 @@
+"""
+Command-line replacement for recommendation_engine_training.ipynb.
+
+Builds the three recommendation artifacts used by the API:
+  - popularity_recommendation.csv
+  - apriori_recommendations.json (single-product antecedents, legacy format)
+  - association_rules.json (every rule, with support, confidence and lift)
+
+Receipts are streamed in chunks and every transaction is reduced to a
+bitset of the products it contains. Identical baskets are counted once
+with a weight, so months of sales collapse into a few thousand distinct
+baskets, and frequent itemsets are mined with FP-growth over those
+weighted baskets.
+
+The basket counts are kept in a state file, so a nightly run can ingest
+only the new receipts (--incremental). Each receipts file must hold
+complete transactions (e.g. one export per day). Every run publishes a
+new directory under <output>/versions/ and then atomically points
+<output>/manifest.json at it.
+
+Usage (from python_code):
+    python train_recommendations.py --receipts "dataset/201904 sales reciepts.csv"
+    python train_recommendations.py --incremental --receipts exports/2019-05-01.csv
+"""
+
+import argparse
+import csv
+import datetime
+import hashlib
+import io
+import json
+import math
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+DEFAULT_PRODUCTS = os.path.join("dataset", "product.csv")
+DEFAULT_OUTPUT = os.path.join("api", "recommendation_objects")
+DEFAULT_TRANSACTION_KEY = ("transaction_date", "sales_outlet_id", "transaction_id", "customer_id")
+STATE_FORMAT = 1
+
+# Size suffixes merged into one product ("Latte Rg" -> "Latte")
+SIZE_SUFFIXES = (" Rg", " Sm", " Lg")
+
+# Products sold in the app (same list as the notebook)
+PRODUCTS_TO_TAKE = (
+    "Cappuccino", "Latte", "Espresso shot",
+    "Dark chocolate", "Sugar Free Vanilla syrup", "Chocolate syrup",
+    "Carmel syrup", "Hazelnut syrup", "Ginger Scone",
+    "Chocolate Croissant", "Jumbo Savory Scone", "Cranberry Scone", "Hazelnut Biscotti",
+    "Croissant", "Almond Croissant", "Oatmeal Scone", "Chocolate Chip Biscotti",
+    "Ginger Biscotti",
+)
+
+
+class TrainingState:
+    """
+    Everything needed to re-mine the rules without re-reading old receipts.
+
+    items are (product, category) pairs in order of first appearance and
+    carry the popularity counts; names are the product names, whose index
+    is the bit used in basket masks. baskets maps a mask to the number of
+    transactions with exactly that set of products.
+    """
+
+    def __init__(self, transaction_key=DEFAULT_TRANSACTION_KEY, products_to_take=PRODUCTS_TO_TAKE):
+        self.transaction_key = list(transaction_key)
+        self.products_to_take = list(products_to_take) if products_to_take else None
+        self.items = []
+        self.names = []
+        self.popularity = []
+        self.baskets = {}
+        self.num_transactions = 0
+        self.sources = {}
+        self._item_ids = {}
+        self._name_ids = {}
+
+    def item_id(self, product, category):
+        key = (product, category)
+        idx = self._item_ids.get(key)
+        if idx is None:
+            idx = self._item_ids[key] = len(self.items)
+            self.items.append(key)
+            self.popularity.append(0)
+            if product not in self._name_ids:
+                self._name_ids[product] = len(self.names)
+                self.names.append(product)
+        return idx
+
+    def bit(self, item_id):
+        return 1 << self._name_ids[self.items[item_id][0]]
+
+    def product_categories(self):
+        """product -> category; for products in several categories the last one seen wins, as in the notebook"""
+        return {product: category for product, category in self.items}
+
+    def to_dict(self):
+        return {
+            "format": STATE_FORMAT,
+            "transaction_key": self.transaction_key,
+            "products_to_take": self.products_to_take,
+            "items": [list(item) for item in self.items],
+            "popularity": self.popularity,
+            "baskets": {format(mask, "x"): count for mask, count in sorted(self.baskets.items())},
+            "num_transactions": self.num_transactions,
+            "sources": self.sources,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("format") != STATE_FORMAT:
+            raise ValueError(f"Unsupported training state format: {data.get('format')}")
+        state = cls(data["transaction_key"], data["products_to_take"])
+        for (product, category), count in zip(data["items"], data["popularity"]):
+            state.popularity[state.item_id(product, category)] = count
+        state.baskets = {int(mask, 16): count for mask, count in data["baskets"].items()}
+        state.num_transactions = data["num_transactions"]
+        state.sources = data["sources"]
+        return state
+
+
+def load_state(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return TrainingState.from_dict(json.load(f))
+
+
+def _write_atomic(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def save_state(state, path):
+    _write_atomic(path, json.dumps(state.to_dict()).encode("utf-8"))
+
+
+def load_products(path, state):
+    """product_id -> (product, category) for the products being trained on"""
+    products = pd.read_csv(path, usecols=["product_id", "product_category", "product"])
+    for suffix in SIZE_SUFFIXES:
+        products["product"] = products["product"].str.replace(suffix, "", regex=False)
+    if state.products_to_take:
+        products = products[products["product"].isin(state.products_to_take)]
+
+    lookup = {}
+    for product_id, category, product in products[["product_id", "product_category", "product"]].itertuples(index=False):
+        lookup[int(product_id)] = (product, category)
+    return lookup
+
+
+def _file_sha256(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def ingest_receipts(state, path, product_lookup, chunksize=100_000):
+    """
+    Adds one receipts CSV to the state. Only the key columns and
+    product_id are read, chunksize rows at a time; per transaction only
+    the item ids and line counts are kept until the file ends.
+    """
+    transactions = {}
+    item_ids = {}
+    key_columns = state.transaction_key
+    product_ids = list(product_lookup)
+    rows = 0
+
+    for chunk in pd.read_csv(path, usecols=key_columns + ["product_id"], chunksize=chunksize):
+        rows += len(chunk)
+        chunk = chunk[chunk["product_id"].isin(product_ids)]
+        if chunk.empty:
+            continue
+        lines = chunk.groupby(key_columns + ["product_id"], sort=False).size()
+        for key, count in lines.items():
+            product_id = key[-1]
+            item = item_ids.get(product_id)
+            if item is None:
+                item = item_ids[product_id] = state.item_id(*product_lookup[product_id])
+            basket = transactions.setdefault(key[:-1], {})
+            basket[item] = basket.get(item, 0) + count
+
+    kept = 0
+    for basket in transactions.values():
+        # As in the notebook: keep transactions with more than one line item
+        if sum(basket.values()) <= 1:
+            continue
+        mask = 0
+        for item, count in basket.items():
+            mask |= state.bit(item)
+            state.popularity[item] += count
+        state.baskets[mask] = state.baskets.get(mask, 0) + 1
+        kept += 1
+
+    state.num_transactions += kept
+    return rows, kept
+
+
+class _FPNode:
+    __slots__ = ("item", "count", "parent", "children")
+
+    def __init__(self, item, parent):
+        self.item = item
+        self.count = 0
+        self.parent = parent
+        self.children = {}
+
+
+def _fp_growth(patterns, min_count, suffix, itemsets):
+    """
+    Mines patterns, a list of (items, count), into itemsets (mask -> count).
+    Items are bit positions; suffix is the mask of the conditional tree.
+    """
+    counts = {}
+    for items, count in patterns:
+        for item in items:
+            counts[item] = counts.get(item, 0) + count
+    frequent = sorted((item for item, count in counts.items() if count >= min_count), key=lambda i: (-counts[i], i))
+    if not frequent:
+        return
+    rank = {item: position for position, item in enumerate(frequent)}
+
+    root = _FPNode(None, None)
+    header = {item: [] for item in frequent}
+    for items, count in patterns:
+        node = root
+        for item in sorted((i for i in items if i in rank), key=rank.__getitem__):
+            child = node.children.get(item)
+            if child is None:
+                child = node.children[item] = _FPNode(item, node)
+                header[item].append(child)
+            child.count += count
+            node = child
+
+    for item in reversed(frequent):
+        itemset = suffix | (1 << item)
+        itemsets[itemset] = counts[item]
+        conditional = []
+        for node in header[item]:
+            path = []
+            parent = node.parent
+            while parent.item is not None:
+                path.append(parent.item)
+                parent = parent.parent
+            if path:
+                conditional.append((path, node.count))
+        _fp_growth(conditional, min_count, itemset, itemsets)
+
+
+def _bits(mask):
+    items = []
+    while mask:
+        low = mask & -mask
+        items.append(low.bit_length() - 1)
+        mask ^= low
+    return items
+
+
+def frequent_itemsets(baskets, num_transactions, min_support):
+    """mask -> transaction count for every itemset with support >= min_support"""
+    min_count = max(1, math.ceil(min_support * num_transactions))
+    # Same inclusive threshold as mlxtend's support >= min_support, despite float rounding
+    while min_count > 1 and (min_count - 1) / num_transactions >= min_support:
+        min_count -= 1
+    while min_count / num_transactions < min_support:
+        min_count += 1
+
+    itemsets = {}
+    _fp_growth([(_bits(mask), count) for mask, count in baskets.items()], min_count, 0, itemsets)
+    return itemsets
+
+
+def association_rules(itemsets, num_transactions, min_lift=1.0):
+    """
+    Every rule A -> C with A | C frequent, as (antecedent mask, consequent
+    mask, support, confidence, lift), keeping lift >= min_lift.
+    """
+    rules = []
+    for itemset, count in itemsets.items():
+        if itemset & (itemset - 1) == 0:
+            continue
+        support = count / num_transactions
+        antecedent = (itemset - 1) & itemset
+        while antecedent:
+            consequent = itemset ^ antecedent
+            confidence = count / itemsets[antecedent]
+            lift = confidence / (itemsets[consequent] / num_transactions)
+            if lift >= min_lift:
+                rules.append((antecedent, consequent, support, confidence, lift))
+            antecedent = (antecedent - 1) & itemset
+    return rules
+
+
+def build_artifacts(state, min_support, min_lift, legacy_min_support):
+    """Returns {filename: bytes} for the three artifacts, plus stats"""
+    names = state.names
+    categories = state.product_categories()
+    itemsets = frequent_itemsets(state.baskets, state.num_transactions, min_support)
+    rules = association_rules(itemsets, state.num_transactions, min_lift)
+
+    def products(mask):
+        return sorted(names[bit] for bit in _bits(mask))
+
+    rules = [
+        {
+            "antecedents": products(antecedent),
+            "consequents": products(consequent),
+            "support": support,
+            "confidence": confidence,
+            "lift": lift,
+        }
+        for antecedent, consequent, support, confidence, lift in rules
+    ]
+    rules.sort(key=lambda r: (-r["confidence"], -r["lift"], -r["support"], r["antecedents"], r["consequents"]))
+
+    association_rules_json = {
+        "min_support": min_support,
+        "metric": "lift",
+        "min_threshold": min_lift,
+        "num_transactions": state.num_transactions,
+        "product_categories": categories,
+        "rules": rules,
+    }
+
+    # Legacy export: the rules the notebook mined at legacy_min_support,
+    # which are exactly those whose itemset support reaches it
+    recommendations_json = {}
+    for rule in rules:
+        if rule["support"] < legacy_min_support:
+            continue
+        recommendations = recommendations_json.setdefault("_".join(rule["antecedents"]), [])
+        for product in rule["consequents"]:
+            if any(rec["product"] == product for rec in recommendations):
+                continue
+            recommendations.append({
+                "product": product,
+                "product_category": categories[product],
+                "confidence": rule["confidence"],
+            })
+    recommendations_json = dict(sorted(recommendations_json.items()))
+
+    popularity = io.StringIO()
+    writer = csv.writer(popularity, lineterminator="\n")
+    writer.writerow(["product", "product_category", "number_of_transactions"])
+    for (product, category), count in sorted(zip(state.items, state.popularity)):
+        if count:
+            writer.writerow([product, category, count])
+
+    artifacts = {
+        "popularity_recommendation.csv": popularity.getvalue().encode("utf-8"),
+        "apriori_recommendations.json": json.dumps(recommendations_json).encode("utf-8"),
+        "association_rules.json": json.dumps(association_rules_json).encode("utf-8"),
+    }
+    stats = {
+        "num_transactions": state.num_transactions,
+        "distinct_baskets": len(state.baskets),
+        "frequent_itemsets": len(itemsets),
+        "rules": len(rules),
+        "min_support": min_support,
+        "min_lift": min_lift,
+        "legacy_min_support": legacy_min_support,
+    }
+    return artifacts, stats
+
+
+def read_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, "manifest.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def publish(output_dir, artifacts, stats, sources, keep_versions=5):
+    """
+    Writes artifacts to versions/<version>/ and then swaps manifest.json.
+    Returns the manifest, or None when the artifacts did not change.
+    """
+    digest = hashlib.sha256()
+    for name in sorted(artifacts):
+        digest.update(name.encode("utf-8"))
+        digest.update(hashlib.sha256(artifacts[name]).digest())
+    digest = digest.hexdigest()
+
+    current = read_manifest(output_dir)
+    if current is not None and current.get("sha256") == digest:
+        return None
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    version = f"{now:%Y%m%dT%H%M%SZ}-{digest[:8]}"
+    versions_dir = os.path.join(output_dir, "versions")
+    os.makedirs(versions_dir, exist_ok=True)
+
+    # Fill a temporary directory first so a version directory is never partial
+    tmp_dir = tempfile.mkdtemp(dir=versions_dir, prefix=".tmp-")
+    for name, data in artifacts.items():
+        with open(os.path.join(tmp_dir, name), "wb") as f:
+            f.write(data)
+    os.replace(tmp_dir, os.path.join(versions_dir, version))
+
+    manifest = {
+        "version": version,
+        "path": f"versions/{version}",
+        "created_at": now.isoformat(timespec="seconds"),
+        "sha256": digest,
+        "files": sorted(artifacts),
+        "stats": stats,
+        "sources": sorted(sources),
+    }
+    _write_atomic(os.path.join(output_dir, "manifest.json"), json.dumps(manifest, indent=2).encode("utf-8"))
+
+    # Keep the newest versions; the one being served is always among them
+    existing = sorted(d for d in os.listdir(versions_dir) if not d.startswith("."))
+    for old in existing[:-keep_versions] if keep_versions > 0 else []:
+        if old != version:
+            shutil.rmtree(os.path.join(versions_dir, old), ignore_errors=True)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--receipts", nargs="+", required=True, help="Receipts CSV files to ingest")
+    parser.add_argument("--products", default=DEFAULT_PRODUCTS)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Artifact directory (manifest.json and versions/)")
+    parser.add_argument("--state", help="Training state file (default: <output>/training_state.json)")
+    parser.add_argument("--incremental", action="store_true", help="Add to the saved state instead of starting over")
+    parser.add_argument("--min-support", type=float, default=0.02)
+    parser.add_argument("--min-lift", type=float, default=1.0)
+    parser.add_argument("--legacy-min-support", type=float, default=0.05,
+                        help="Support threshold for apriori_recommendations.json")
+    parser.add_argument("--transaction-key", default=",".join(DEFAULT_TRANSACTION_KEY),
+                        help="Comma-separated receipt columns identifying one transaction")
+    parser.add_argument("--all-products", action="store_true", help="Train on every product, not only the app's menu")
+    parser.add_argument("--chunksize", type=int, default=100_000)
+    parser.add_argument("--keep-versions", type=int, default=5)
+    args = parser.parse_args()
+
+    state_path = args.state or os.path.join(args.output, "training_state.json")
+    if args.incremental and os.path.exists(state_path):
+        state = load_state(state_path)
+        print(f"Loaded state: {state.num_transactions} transactions from {len(state.sources)} files")
+    else:
+        state = TrainingState(
+            transaction_key=[c.strip() for c in args.transaction_key.split(",") if c.strip()],
+            products_to_take=None if args.all_products else PRODUCTS_TO_TAKE,
+        )
+
+    product_lookup = load_products(args.products, state)
+    for path in args.receipts:
+        sha256 = _file_sha256(path)
+        if any(source["sha256"] == sha256 for source in state.sources.values()):
+            print(f"Skipping {path}: already ingested")
+            continue
+        rows, kept = ingest_receipts(state, path, product_lookup, args.chunksize)
+        state.sources[os.path.normpath(path)] = {"sha256": sha256, "rows": rows, "transactions": kept}
+        print(f"Ingested {path}: {rows} rows, {kept} transactions")
+
+    if not state.num_transactions:
+        raise SystemExit("No transactions with more than one item; nothing to train")
+
+    artifacts, stats = build_artifacts(state, args.min_support, args.min_lift, args.legacy_min_support)
+    save_state(state, state_path)
+    manifest = publish(args.output, artifacts, stats, state.sources, args.keep_versions)
+    if manifest is None:
+        print(f"Artifacts unchanged ({stats['rules']} rules); manifest left as is")
+    else:
+        print(f"Published {manifest['version']}: {stats['rules']} rules from {stats['num_transactions']} transactions")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,17 @@
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context
 from flask_cors import CORS
 import sys
 import os
 import json
+import gzip
+import hashlib
+import threading
+
+try:
+    import brotli
+except ImportError:
+    # Optional: pip install brotli to also serve br-encoded product lists
+    brotli = None
 
 # Add the api directory to the path so we can import the agent controller
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -12,6 +21,28 @@ sys.path.insert(0, api_dir)
 # Store original working directory
 original_cwd = os.getcwd()
 
+from agents.product_catalog import get_product_catalog
+
+# Shared with the agents: products.jsonl is parsed once and reloaded only when it changes
+product_catalog = get_product_catalog()
+
+from agents.conversation_store import get_conversation_store
+from agents.telemetry import metrics, new_request_id, request_trace
+
+# Server-side chat history: clients send a conversation_id and only their new message
+conversation_store = get_conversation_store()
+
+from firebase_products import create_firebase_refresher
+
+# Polls Firebase in the background when FIREBASE_DATABASE_URL / FIREBASE_CREDENTIALS_PATH are set
+firebase_refresher = create_firebase_refresher()
+
+from image_variants import ImageVariantStore, MIME_TYPES
+
+# Resized WebP/AVIF/JPEG product images, generated on first request and cached on disk
+image_variants = ImageVariantStore(product_catalog.images_dir)
+IMAGE_VARIANTS_URL_PREFIX = '/static/products/variants'
+
 # Initialize Flask with absolute paths
 web_app_dir = os.path.dirname(os.path.abspath(__file__))
 app = Flask(__name__, 
@@ -60,6 +91,10 @@ else:
 # Initialize cart in session
 @app.before_request
 def init_cart():
+    # The product list, image variants and metrics are public; touching
+    # the session would add Set-Cookie / Vary: Cookie to them
+    if request.endpoint in ('get_products', 'serve_product_image_variant', 'metrics_endpoint'):
+        return
     # Always ensure cart is a clean dict
     cart = session.get('cart', {})
     if not isinstance(cart, dict):
@@ -98,161 +133,245 @@ def thankyou():
     """Thank you page"""
     return render_template('thankyou.html')
 
+# Precomputed /api/products responses.
+# The serialized body, its strong ETag and compressed variants are built once
+# per product source version, so a request only negotiates and sends bytes.
+PRODUCTS_CACHE_MAX_AGE = int(os.getenv('PRODUCTS_CACHE_MAX_AGE', '60'))
+PRODUCTS_COMPRESS_MIN_SIZE = 1024
+
+_products_response_lock = threading.Lock()
+_products_response = {'key': None, 'entry': None}
+
+def _precompute_json_body(payload):
+    """Serialize payload once and build its ETag and compressed variants"""
+    body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    variants = {'identity': (body, f'"{digest}"')}
+    if len(body) >= PRODUCTS_COMPRESS_MIN_SIZE:
+        variants['gzip'] = (gzip.compress(body, compresslevel=9, mtime=0), f'"{digest}-gzip"')
+        if brotli is not None:
+            variants['br'] = (brotli.compress(body, quality=11), f'"{digest}-br"')
+    return variants
+
+def _get_products_entry(key, build_payload):
+    """Return the precomputed variants for key, rebuilding them when the source changed"""
+    if _products_response['key'] != key:
+        with _products_response_lock:
+            if _products_response['key'] != key:
+                _products_response['entry'] = _precompute_json_body(build_payload())
+                _products_response['key'] = key
+    return _products_response['entry']
+
+def _precomputed_json_response(variants):
+    """Serve a precomputed body with ETag/304 handling and content negotiation"""
+    encoding = 'identity'
+    for candidate in ('br', 'gzip'):
+        if candidate in variants and request.accept_encodings[candidate] > 0:
+            encoding = candidate
+            break
+    body, etag = variants[encoding]
+
+    headers = {
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={PRODUCTS_CACHE_MAX_AGE}, must-revalidate',
+        'Vary': 'Accept-Encoding',
+    }
+    # Any representation's ETag means the client already has the current list
+    if any(request.if_none_match.contains(variant_etag.strip('"')) for _, variant_etag in variants.values()):
+        return Response(status=304, headers=headers)
+
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return Response(body, status=200, mimetype='application/json', headers=headers)
+
 # API Routes
 @app.route('/api/products', methods=['GET'])
 def get_products():
-    """Get all products from Firebase or return sample data"""
-    try:
-        # Try to import and use Firebase if available
-        firebase_url = os.getenv('FIREBASE_DATABASE_URL', '')
-        firebase_cred_path = os.getenv('FIREBASE_CREDENTIALS_PATH', '')
-        
-        if firebase_url and firebase_cred_path:
-            from firebase_admin import credentials, initialize_app, db
-            
-            # Initialize Firebase if not already done
-            if not hasattr(app, 'firebase_initialized'):
-                try:
-                    cred = credentials.Certificate(firebase_cred_path)
-                    initialize_app(cred, {'databaseURL': firebase_url})
-                    app.firebase_initialized = True
-                except Exception as e:
-                    print(f"Firebase initialization failed: {e}")
-                    return jsonify({
-                        'products': get_sample_products(),
-                        'success': True,
-                        'note': 'Using sample products - Firebase initialization failed'
-                    })
-            
-            # Fetch products from Firebase
-            products_ref = db.reference('products')
-            products_data = products_ref.get()
-            
-            products = []
-            if products_data:
-                for key, value in products_data.items():
-                    products.append({**value, 'id': key})
-            
-            if products:
-                return jsonify({
-                    'products': products,
-                    'success': True
-                })
-    except ImportError:
-        # Firebase not installed, use sample data
-        pass
-    except Exception as e:
-        print(f"Error fetching from Firebase: {e}")
-    
-    # Fallback: return sample products
-    return jsonify({
-        'products': get_sample_products(),
+    """Get all products from the Firebase snapshot or return sample data"""
+    if firebase_refresher is None:
+        return _sample_products_response('Using sample products - Configure Firebase for real data')
+
+    # Never blocks: the refresher thread keeps the snapshot up to date
+    snapshot = firebase_refresher.snapshot()
+    if snapshot is None or not snapshot.products:
+        return _sample_products_response('Using sample products - Firebase data unavailable', stale=True)
+
+    stale = firebase_refresher.is_stale(snapshot)
+    source_key = ('firebase', snapshot.version, stale)
+    response = _precomputed_json_response(_get_products_entry(source_key, lambda: {
+        'products': snapshot.products,
         'success': True,
-        'note': 'Using sample products - Configure Firebase for real data'
-    })
+        'stale': stale
+    }))
+    response.headers['Age'] = str(int(snapshot.age))
+    return response
 
-def get_sample_products():
-    """Load all products from products.jsonl file"""
-    import json
-    
+def _sample_products_response(note, stale=False):
+    """products.jsonl response, rebuilt only when the product catalog reloads"""
+    source_key = ('sample', product_catalog.version, note, stale)
+
+    def build_payload():
+        payload = {
+            'products': get_sample_products(),
+            'success': True,
+            'note': note
+        }
+        if stale:
+            # Firebase is configured but has no data yet or is unreachable
+            payload['stale'] = True
+        return payload
+
+    return _precomputed_json_response(_get_products_entry(source_key, build_payload))
+
+def _placeholder_image_url(name):
+    return f'https://via.placeholder.com/400x300?text={(name or "Product").replace(" ", "+")}'
+
+def _build_products_payload(catalog):
+    """Convert catalog products into the /api/products JSON shape"""
     products = []
-    # Get the products directory path
-    products_file = os.path.join(current_dir, '..', 'products', 'products.jsonl')
-    images_dir = os.path.join(current_dir, '..', 'products', 'images')
-    
+    for product in catalog.products:
+        # Serve images from the Flask static route when the file exists locally,
+        # otherwise use a placeholder. If images are hosted elsewhere, update this logic
+        image_srcset = None
+        if product.image_available:
+            image_url = f'/static/products/images/{product.image_path}'
+            # Content-hashed variants: {format: srcset}, and a resized JPEG instead of the original
+            image_srcset, variant_url = image_variants.srcsets(product.image_path, IMAGE_VARIANTS_URL_PREFIX)
+            image_url = variant_url or image_url
+        else:
+            image_url = _placeholder_image_url(product.name)
+
+        products.append({
+            'id': product.id,
+            'name': product.name,
+            'category': product.category,
+            'price': product.price,
+            'rating': product.rating,
+            'description': product.description,
+            'image_url': image_url,
+            'image_srcset': image_srcset,
+            'image_path': product.image_path
+        })
+    return products
+
+def get_sample_products():
+    """Load all products from the shared product catalog (products.jsonl)"""
     try:
-        with open(products_file, 'r', encoding='utf-8') as f:
-            for idx, line in enumerate(f, start=1):
-                if line.strip():
-                    product = json.loads(line.strip())
-                    image_filename = product.get('image_path', '')
-                    
-                    # Try to serve images from local static folder or use placeholder
-                    # If images are hosted elsewhere, update this logic
-                    if image_filename:
-                        # Check if we can serve from Flask static files
-                        image_path = os.path.join(images_dir, image_filename)
-                        if os.path.exists(image_path):
-                            # Serve from Flask static route (we'll add this route)
-                            image_url = f'/static/products/images/{image_filename}'
-                        else:
-                            # Use placeholder if image not found locally
-                            image_url = f'https://via.placeholder.com/400x300?text={product.get("name", "Product").replace(" ", "+")}'
-                    else:
-                        image_url = f'https://via.placeholder.com/400x300?text={product.get("name", "Product").replace(" ", "+")}'
-                    
-                    products.append({
-                        'id': str(idx),
-                        'name': product.get('name', ''),
-                        'category': product.get('category', ''),
-                        'price': float(product.get('price', 0)),
-                        'rating': float(product.get('rating', 0)),
-                        'description': product.get('description', ''),
-                        'image_url': image_url,
-                        'image_path': image_filename
-                    })
-    except FileNotFoundError:
-        print(f"Products file not found at {products_file}")
-        return []
+        # Built once per catalog version; the catalog reloads when products.jsonl changes
+        return list(product_catalog.derived('api_products', _build_products_payload))
     except Exception as e:
         print(f"Error loading products: {e}")
         return []
-    
-    return products
+
+def _resolve_conversation(data):
+    """Returns (conversation_id, user_message, messages) for a chat request.
+
+    New clients send {"conversation_id": ..., "message": "..."} and the
+    history comes from the conversation store (a new conversation is
+    started when the id is missing or expired). Older clients send the
+    full "messages" array; conversation_id and user_message are then None.
+    """
+    if 'message' not in data:
+        return None, None, data.get('messages', [])
+
+    message = data.get('message')
+    content = message.get('content', '') if isinstance(message, dict) else message
+    if not isinstance(content, str) or not content.strip():
+        return None, None, []
+
+    conversation_id = data.get('conversation_id')
+    history = conversation_store.messages(conversation_id) if conversation_id else None
+    if history is None:
+        conversation_id = conversation_store.create()
+        history = []
+
+    user_message = {"role": "user", "content": content}
+    # The user message is only stored together with the reply, so a failed
+    # turn does not leave an unanswered message in the history
+    return conversation_id, user_message, history + [user_message]
+
+def _request_id():
+    """The caller's X-Request-ID (e.g. from a proxy), or a new one"""
+    return request.headers.get('X-Request-ID') or new_request_id()
+
+def _save_turn(conversation_id, user_message, assistant_message):
+    if conversation_id is not None:
+        conversation_store.append(conversation_id, user_message)
+        conversation_store.append(conversation_id, assistant_message)
 
 @app.route('/api/chat', methods=['POST'])
 def chat_api():
     """Handle chat messages"""
+    request_id = _request_id()
+    with request_trace('/api/chat', request_id):
+        response = _chat()
+    response = app.make_response(response)
+    response.headers['X-Request-ID'] = request_id
+    return response
+
+NO_MESSAGES_ERROR = {'error': 'No messages provided'}
+
+def _chat_input(data):
+    """Returns (conversation_id, user_message, input_data) for a chat request body.
+
+    input_data is the agent controller input, or None when the request has
+    no messages. Shared with the async /api/chat in asgi.py.
+    """
+    conversation_id, user_message, messages = _resolve_conversation(data)
+    if not messages:
+        return conversation_id, user_message, None
+    return conversation_id, user_message, {"input": {"messages": messages}}
+
+def _chat_reply(conversation_id, user_message, response):
+    """Saves the turn and returns the /api/chat payload for an agent response"""
+    # Extract the assistant's message
+    assistant_message = {
+        "role": response.get("role", "assistant"),
+        "content": response.get("content", "I'm sorry, I couldn't process that request."),
+        "memory": response.get("memory", {})
+    }
+
+    # Debug: Log the response to see if order is included
+    if assistant_message.get("memory", {}).get("order"):
+        print(f"AgentController returning order: {assistant_message.get('memory').get('order')}")
+
+    _save_turn(conversation_id, user_message, assistant_message)
+
+    return {
+        'message': assistant_message,
+        'conversation_id': conversation_id,
+        'success': True
+    }
+
+def _chat_error(e):
+    """The /api/chat payload when the agent controller fails"""
+    print(f"AgentController error: {e}")
+    import traceback
+    traceback.print_exc()
+    return {
+        'message': {
+            "role": "assistant",
+            "content": f"I'm sorry, there was an error processing your request: {str(e)}",
+            "memory": {}
+        },
+        'success': False,
+        'error': str(e)
+    }
+
+def _chat():
     try:
-        data = request.json
-        messages = data.get('messages', [])
-        
-        if not messages:
-            return jsonify({
-                'error': 'No messages provided'
-            }), 400
-        
+        conversation_id, user_message, input_data = _chat_input(request.json or {})
+
+        if input_data is None:
+            return jsonify(NO_MESSAGES_ERROR), 400
+
         # Use AgentController with RunPod
         if agent_controller:
             try:
-                # Format input for agent controller
-                input_data = {
-                    "input": {
-                        "messages": messages
-                    }
-                }
-                
-                # Get response from agent controller
                 response = agent_controller.get_response(input_data)
-                
-                # Extract the assistant's message
-                assistant_message = {
-                    "role": response.get("role", "assistant"),
-                    "content": response.get("content", "I'm sorry, I couldn't process that request."),
-                    "memory": response.get("memory", {})
-                }
-                
-                # Debug: Log the response to see if order is included
-                if assistant_message.get("memory", {}).get("order"):
-                    print(f"AgentController returning order: {assistant_message.get('memory').get('order')}")
-                
-                return jsonify({
-                    'message': assistant_message,
-                    'success': True
-                })
             except Exception as e:
-                print(f"AgentController error: {e}")
-                import traceback
-                traceback.print_exc()
-                return jsonify({
-                    'message': {
-                        "role": "assistant",
-                        "content": f"I'm sorry, there was an error processing your request: {str(e)}",
-                        "memory": {}
-                    },
-                    'success': False,
-                    'error': str(e)
-                }), 500
+                return jsonify(_chat_error(e)), 500
+            return jsonify(_chat_reply(conversation_id, user_message, response))
         else:
             return jsonify({
                 'message': {
@@ -270,6 +389,65 @@ def chat_api():
             'success': False
         }), 500
 
+def _sse_event(event, data):
+    """Format one Server-Sent Event frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream_api():
+    """Handle chat messages, streaming the reply as Server-Sent Events.
+
+    Events: "routing" (guard decision + chosen agent), "token" (reply text
+    chunks), "done" (full message incl. memory) or "error".
+    """
+    conversation_id, user_message, input_data = _chat_input(request.json or {})
+
+    if input_data is None:
+        return jsonify(NO_MESSAGES_ERROR), 400
+
+    if not agent_controller or not hasattr(agent_controller, 'stream_response'):
+        return jsonify({
+            'success': False,
+            'error': 'Streaming is not available for this agent controller'
+        }), 501
+
+    request_id = _request_id()
+
+    def generate():
+        with request_trace('/api/chat/stream', request_id):
+            yield from _generate()
+
+    def _generate():
+        try:
+            for event, payload in agent_controller.stream_response(input_data):
+                if event == 'done':
+                    payload = _chat_reply(conversation_id, user_message, payload['message'])
+                yield _sse_event(event, payload)
+        except Exception as e:
+            print(f"AgentController streaming error: {e}")
+            import traceback
+            traceback.print_exc()
+            yield _sse_event('error', {
+                'message': {
+                    "role": "assistant",
+                    "content": f"I'm sorry, there was an error processing your request: {str(e)}",
+                    "memory": {}
+                },
+                'success': False,
+                'error': str(e)
+            })
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # Stop reverse proxies (e.g. nginx) from buffering the stream
+            'X-Accel-Buffering': 'no',
+            'X-Request-ID': request_id
+        }
+    )
+
 @app.route('/api/cart', methods=['GET', 'POST', 'PUT', 'DELETE'])
 def cart_api():
     """Cart management API"""
@@ -340,6 +518,19 @@ def serve_product_image(filename):
     return send_from_directory(images_dir, filename)
 
 
+@app.route(f'{IMAGE_VARIANTS_URL_PREFIX}/<filename>')
+def serve_product_image_variant(filename):
+    """Serve a resized product image; names are content-hashed, so cache them forever"""
+    from flask import send_file, abort
+    path = image_variants.get_path(filename)
+    if path is None:
+        abort(404)
+    fmt = 'jpeg' if filename.endswith('.jpg') else filename.rsplit('.', 1)[-1]
+    response = send_file(path, mimetype=MIME_TYPES.get(fmt), max_age=31536000, conditional=True, etag=True)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
 @app.route('/avatars/<filename>')
 def serve_avatar(filename):
     """Serve avatar images from python_code/avatarimages directory"""
@@ -347,13 +538,37 @@ def serve_avatar(filename):
     avatars_dir = os.path.join(current_dir, '..', 'avatarimages')
     return send_from_directory(avatars_dir, filename)
 
+@app.route('/api/stats', methods=['GET'])
+def stats():
+    """Routing statistics from the agent controller (e.g. local router hit rate)"""
+    if agent_controller and hasattr(agent_controller, 'get_stats'):
+        return jsonify({
+            'stats': agent_controller.get_stats(),
+            'success': True
+        })
+    return jsonify({
+        'stats': {},
+        'success': False,
+        'error': 'Statistics not available for this agent controller'
+    })
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Span latency histograms, Gemini token counts, cache lookups and JSON
+    repair outcomes in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/health', methods=['GET'])
 def health():
     """Health check endpoint"""
-    return jsonify({
+    health_status = {
         'status': 'healthy',
         'service': 'Coffee Shop Web App API'
-    })
+    }
+    if firebase_refresher is not None:
+        health_status['firebase_products'] = firebase_refresher.get_stats()
+    health_status['conversations'] = conversation_store.get_stats()
+    return jsonify(health_status)
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,112 @@
+"""
+ASGI entry point for the web app.
+
+POST /api/chat is served natively async through
+GeminiAgentController.aget_response, so a single process keeps many
+conversations in flight while they wait on Gemini instead of holding one
+worker thread per conversation. Every other route is delegated to the Flask
+app through asgiref's WSGI adapter.
+
+Run with:
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+"""
+
+import json
+
+from asgiref.wsgi import WsgiToAsgi
+
+# app puts ../api on sys.path, so it is imported before any agents.* module
+from app import app, agent_controller, NO_MESSAGES_ERROR, _chat_error, _chat_input, _chat_reply
+from agents.telemetry import new_request_id, request_trace
+
+flask_application = WsgiToAsgi(app)
+
+
+async def _read_body(receive):
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+
+async def _send_json(send, payload, status=200, headers=()):
+    body = json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            # Same CORS policy as flask_cors' CORS(app)
+            (b'access-control-allow-origin', b'*'),
+            *headers,
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def _request_id(scope):
+    """The caller's X-Request-ID (e.g. from a proxy), or a new one, like app._request_id"""
+    for name, value in scope.get('headers', []):
+        if name.lower() == b'x-request-id' and value:
+            return value.decode('latin-1')
+    return new_request_id()
+
+
+async def chat_api(scope, receive, send):
+    """Async /api/chat, same request and response format as app.chat_api"""
+    request_id = _request_id(scope)
+    with request_trace('/api/chat', request_id):
+        payload, status = await _chat(receive)
+    await _send_json(send, payload, status, [(b'x-request-id', request_id.encode('latin-1'))])
+
+
+async def _chat(receive):
+    """(payload, status) for one chat request, built by the same helpers as app._chat"""
+    try:
+        data = json.loads(await _read_body(receive) or b'{}')
+        conversation_id, user_message, input_data = _chat_input(data)
+
+        if input_data is None:
+            return NO_MESSAGES_ERROR, 400
+
+        try:
+            response = await agent_controller.aget_response(input_data)
+        except Exception as e:
+            return _chat_error(e), 500
+        return _chat_reply(conversation_id, user_message, response), 200
+    except Exception as e:
+        return {
+            'error': str(e),
+            'success': False
+        }, 500
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+
+    if (
+        scope['type'] == 'http'
+        and scope['path'] == '/api/chat'
+        and scope['method'] == 'POST'
+        and hasattr(agent_controller, 'aget_response')
+    ):
+        await chat_api(scope, receive, send)
+        return
+
+    await flask_application(scope, receive, send)
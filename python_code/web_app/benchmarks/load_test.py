@@ -0,0 +1,450 @@
+"""
+Load test for the web app's HTTP endpoints:
+  - GET /api/products (revalidated with If-None-Match, like a browser)
+  - GET/POST/PUT/DELETE /api/cart
+  - POST /api/chat
+  - product images and their resized variants
+
+Virtual users repeatedly run customer journeys (browse the menu, fill and
+edit a cart, chat with the assistant) picked from a weighted mix, for a
+fixed time at a fixed concurrency. The report lists throughput, p50/p95/p99
+latency and error rate overall and per endpoint, and is written as JSON
+together with the git revision, so runs from different releases can be
+compared; --baseline does that comparison and fails on regressions.
+
+By default the Flask app runs in-process (no network) with a stub agent
+controller that answers after --chat-latency seconds, so chat load does not
+depend on Gemini. With --url the same journeys run against a live server
+(e.g. started with GEMINI_BACKEND_MODE=replay), chat included.
+
+Usage (from python_code/web_app):
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --mix chat_heavy --concurrency 32 --duration 30
+    python benchmarks/load_test.py --url http://localhost:5000 --output after.json --baseline before.json
+"""
+
+import argparse
+import contextlib
+import datetime
+import gzip
+import http.cookiejar
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import brotli
+except ImportError:
+    # Optional: without it the product list is requested gzip-encoded only
+    brotli = None
+
+ACCEPT_ENCODING = "gzip, br" if brotli is not None else "gzip"
+
+web_app_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, web_app_dir)
+
+DEFAULT_REPORTS_DIR = os.path.join(web_app_dir, "benchmarks", "reports")
+
+# Share of virtual-user journeys of each kind
+CUSTOMER_MIXES = {
+    "default": {"browser": 0.5, "shopper": 0.35, "chatter": 0.15},
+    "catalog": {"browser": 0.9, "shopper": 0.1},
+    "checkout": {"browser": 0.2, "shopper": 0.7, "chatter": 0.1},
+    "chat_heavy": {"browser": 0.2, "shopper": 0.2, "chatter": 0.6},
+}
+
+CHAT_MESSAGES = [
+    "What do you recommend?",
+    "I want 2 cappuccinos",
+    "Add a chocolate croissant",
+    "What's in a latte?",
+    "Remove the croissant",
+    "That's all, thanks",
+    "What time do you open?",
+]
+
+# Baseline comparisons ignore p95 changes smaller than this (timer noise on
+# sub-millisecond routes) and error rate increases of less than one point
+MIN_LATENCY_CHANGE_MS = 1.0
+MIN_ERROR_RATE_CHANGE = 0.01
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class StubAgentController:
+    """
+    Stands in for GeminiAgentController: answers every chat turn after a
+    fixed latency (plus jitter) with a response shaped like the real agents',
+    so /api/chat is measured without Gemini.
+    """
+
+    def __init__(self, latency=0.05, jitter=0.2):
+        self.latency = latency
+        self.jitter = jitter
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def get_response(self, input):
+        messages = input["input"]["messages"]
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+        content = messages[-1]["content"]
+        if any(word in content.lower() for word in ("want", "add", "remove", "all")):
+            return {
+                "role": "assistant",
+                "content": "Updated your order. Would you like anything else?",
+                "memory": {
+                    "agent": "order_taking_agent",
+                    "step number": "4",
+                    "order": [{"item": "Cappuccino", "quantity": 2, "price": 375.0}],
+                    "total": 750.0,
+                },
+            }
+        return {
+            "role": "assistant",
+            "content": f"Here is what I found about: {content}",
+            "memory": {"agent": "details_agent"},
+        }
+
+    def get_stats(self):
+        return {"stub_calls": self.calls}
+
+
+class InProcessClient:
+    """One virtual user against the Flask app; keeps its own session cookie."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        response = self.client.open(path, method=method, json=body, headers=headers or {})
+        data = response.get_data()
+        response.close()
+        return response.status_code, data, response.headers
+
+
+class HttpClient:
+    """One virtual user against a running server; keeps its own cookies."""
+
+    def __init__(self, base_url, timeout=30.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                return response.status, response.read(), response.headers
+        except urllib.error.HTTPError as e:
+            return e.code, e.read(), e.headers
+
+
+class VirtualUser:
+    """
+    Runs customer journeys and records (endpoint, seconds, ok) for every
+    request. Like a browser it remembers the products ETag and the
+    conversation id between journeys.
+    """
+
+    def __init__(self, client, rng, image_urls, results):
+        self.client = client
+        self.rng = rng
+        self.image_urls = image_urls
+        self.results = results
+        self.products_etag = None
+        self.product_names = []
+        self.conversation_id = None
+
+    def call(self, endpoint, method, path, body=None, headers=None):
+        start = time.perf_counter()
+        try:
+            status, data, response_headers = self.client.request(method, path, body, headers)
+        except Exception:
+            self.results.append((endpoint, time.perf_counter() - start, False))
+            return None, None, None
+        # 304 is a successful revalidation of the product list
+        self.results.append((endpoint, time.perf_counter() - start, status < 400))
+        return status, data, response_headers
+
+    def load_products(self):
+        headers = {"Accept-Encoding": ACCEPT_ENCODING}
+        if self.products_etag:
+            headers["If-None-Match"] = self.products_etag
+        status, data, response_headers = self.call("GET /api/products", "GET", "/api/products", headers=headers)
+        if status == 200:
+            self.products_etag = response_headers.get("ETag")
+            if not self.product_names:
+                self.product_names = [product["name"] for product in _decode_products(data, response_headers)]
+
+    def view_images(self, count):
+        for path in self.rng.sample(self.image_urls, min(count, len(self.image_urls))):
+            endpoint = "GET image variant" if "/variants/" in path else "GET image"
+            self.call(endpoint, "GET", path)
+
+    def browser(self):
+        self.load_products()
+        self.view_images(self.rng.randint(2, 6))
+        self.call("GET /api/cart", "GET", "/api/cart")
+
+    def shopper(self):
+        self.load_products()
+        self.view_images(self.rng.randint(1, 3))
+        items = self.rng.sample(self.product_names or ["Latte"], min(3, len(self.product_names) or 1))
+        for item in items:
+            self.call("POST /api/cart", "POST", "/api/cart", {"item": item, "quantity": self.rng.randint(1, 3)})
+        self.call("PUT /api/cart", "PUT", "/api/cart", {"item": items[0], "delta": self.rng.choice((-1, 1))})
+        self.call("GET /api/cart", "GET", "/api/cart")
+        if self.rng.random() < 0.3:
+            self.chat(1)
+        self.call("DELETE /api/cart", "DELETE", "/api/cart")
+
+    def chatter(self):
+        self.load_products()
+        self.chat(self.rng.randint(2, 4))
+
+    def chat(self, turns):
+        for _ in range(turns):
+            body = {"message": self.rng.choice(CHAT_MESSAGES)}
+            if self.conversation_id:
+                body["conversation_id"] = self.conversation_id
+            status, data, _ = self.call("POST /api/chat", "POST", "/api/chat", body)
+            if status == 200:
+                self.conversation_id = json.loads(data).get("conversation_id")
+
+
+def _decode_products(data, headers):
+    encoding = headers.get("Content-Encoding")
+    if encoding == "gzip":
+        data = gzip.decompress(data)
+    elif encoding == "br":
+        data = brotli.decompress(data)
+    return json.loads(data).get("products", [])
+
+
+def discover_image_urls(client):
+    """Original and variant image URLs referenced by /api/products."""
+    status, data, headers = client.request("GET", "/api/products")
+    if status != 200:
+        raise RuntimeError(f"GET /api/products returned {status}")
+    urls = set()
+    for product in _decode_products(data, headers):
+        if product.get("image_path") and not product["image_url"].startswith("http"):
+            urls.add(f"/static/products/images/{product['image_path']}")
+            urls.add(product["image_url"])
+        for srcset in (product.get("image_srcset") or {}).values():
+            urls.update(entry.split(" ")[0] for entry in srcset.split(", "))
+    return sorted(urls)
+
+
+def summarize(latencies, errors, wall):
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "error_rate": round(errors / len(latencies), 4) if latencies else 0.0,
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+def run_load_test(make_client, mix, concurrency, duration, seed, warm_up=True):
+    image_urls = discover_image_urls(make_client())
+    journeys = list(CUSTOMER_MIXES[mix].items())
+
+    if warm_up:
+        # Variants are encoded on first request; keep that one-off cost out of the numbers
+        warm_client = make_client()
+        for path in image_urls:
+            warm_client.request("GET", path)
+
+    deadline = time.perf_counter() + duration
+    journey_counts = {name: 0 for name, _ in journeys}
+    counts_lock = threading.Lock()
+
+    def virtual_user(index):
+        rng = random.Random(seed + index)
+        results = []
+        user = VirtualUser(make_client(), rng, image_urls, results)
+        while time.perf_counter() < deadline:
+            name = rng.choices([name for name, _ in journeys], weights=[weight for _, weight in journeys])[0]
+            getattr(user, name)()
+            with counts_lock:
+                journey_counts[name] += 1
+        return results
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="virtual-user") as pool:
+        per_user = list(pool.map(virtual_user, range(concurrency)))
+    wall = time.perf_counter() - start
+
+    by_endpoint = {}
+    for endpoint, elapsed, ok in (result for results in per_user for result in results):
+        by_endpoint.setdefault(endpoint, []).append((elapsed, ok))
+
+    def stats(samples):
+        return summarize([elapsed for elapsed, _ in samples], sum(not ok for _, ok in samples), wall)
+
+    all_samples = [sample for samples in by_endpoint.values() for sample in samples]
+    return {
+        "wall_s": round(wall, 3),
+        "journeys": journey_counts,
+        "overall": stats(all_samples),
+        "endpoints": {endpoint: stats(samples) for endpoint, samples in sorted(by_endpoint.items())},
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=web_app_dir, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_with_baseline(results, baseline, max_regression):
+    """
+    Rows of (endpoint, metric, baseline, current, change, regressed) and
+    whether any p95 latency grew or throughput dropped by more than
+    max_regression (a fraction), or the error rate rose.
+    """
+    rows, regressed = [], False
+    current = {"overall": results["overall"], **results["endpoints"]}
+    previous = {"overall": baseline["results"]["overall"], **baseline["results"]["endpoints"]}
+    for endpoint, stats in current.items():
+        old = previous.get(endpoint)
+        if old is None:
+            continue
+        for metric, higher_is_worse in (("p95_ms", True), ("throughput_rps", False), ("error_rate", True)):
+            before, after = old[metric], stats[metric]
+            change = (after - before) / before if before else (1.0 if after > before else 0.0)
+            if metric == "error_rate":
+                worse = after - before >= MIN_ERROR_RATE_CHANGE
+            elif metric == "p95_ms":
+                worse = change > max_regression and after - before >= MIN_LATENCY_CHANGE_MS
+            else:
+                worse = -change > max_regression
+            regressed = regressed or worse
+            rows.append((endpoint, metric, before, after, change, worse))
+    return rows, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mix", choices=sorted(CUSTOMER_MIXES), default="default")
+    parser.add_argument("--concurrency", type=int, default=16, help="Virtual users running at once")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds to generate load for")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="Base URL of a running server; default runs the app in-process")
+    parser.add_argument("--chat-latency", type=float, default=0.05, help="Stub controller latency in seconds")
+    parser.add_argument("--output", help="Report path (default benchmarks/reports/load_test_<mix>_<time>.json)")
+    parser.add_argument("--baseline", help="Earlier report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed change vs the baseline, e.g. 0.2")
+    args = parser.parse_args()
+
+    if args.url:
+        target = args.url
+
+        def make_client():
+            return HttpClient(args.url)
+    else:
+        target = "in-process"
+        # No Gemini or RunPod controller: the stub below answers /api/chat
+        os.environ["USE_GEMINI_AGENT"] = "false"
+        os.environ["USE_RUNPOD_AGENT"] = "false"
+        os.environ.setdefault("REQUEST_TRACE_LOG", "false")
+        import app as webapp
+
+        webapp.agent_controller = StubAgentController(latency=args.chat_latency)
+
+        def make_client():
+            return InProcessClient(webapp.app)
+
+    # The in-process app logs every chat turn; keep the report readable
+    with open(os.devnull, "w") as devnull:
+        with contextlib.nullcontext() if args.url else contextlib.redirect_stdout(devnull):
+            results = run_load_test(make_client, args.mix, args.concurrency, args.duration, args.seed)
+
+    report = {
+        "benchmark": "web_app_load_test",
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "target": target,
+            "mix": args.mix,
+            "journey_weights": CUSTOMER_MIXES[args.mix],
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "seed": args.seed,
+            "chat_latency_s": None if args.url else args.chat_latency,
+        },
+        "results": results,
+    }
+
+    overall = results["overall"]
+    print(
+        f"\n{target}, mix {args.mix}, concurrency {args.concurrency}, {results['wall_s']}s: "
+        f"{overall['requests']} requests, {overall['throughput_rps']} requests/s, "
+        f"error rate {overall['error_rate']:.2%}"
+    )
+    print(f"Journeys: {results['journeys']}")
+    print(
+        f"\n{'endpoint':<22} {'requests':>8} {'rps':>8} {'errors':>7} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    for endpoint, s in [("overall", overall)] + list(results["endpoints"].items()):
+        print(
+            f"{endpoint:<22} {s['requests']:>8} {s['throughput_rps']:>8} {s['errors']:>7} "
+            f"{s['p50_ms']:>8} {s['p95_ms']:>8} {s['p99_ms']:>8}"
+        )
+
+    output = args.output or os.path.join(
+        DEFAULT_REPORTS_DIR, f"load_test_{args.mix}_{datetime.datetime.now():%Y%m%d_%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows, regressed = compare_with_baseline(results, baseline, args.max_regression)
+        print(f"\nCompared with {args.baseline} (revision {baseline.get('git_revision')}):")
+        for endpoint, metric, before, after, change, worse in rows:
+            flag = "  REGRESSION" if worse else ""
+            print(f"  {endpoint:<22} {metric:<15} {before:>10} -> {after:<10} ({change:+.1%}){flag}")
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Background Firebase product refresher.
+
+Firebase is initialized once when the refresher starts, and the products
+node is polled on a daemon thread. /api/products reads the latest snapshot
+without blocking, so request latency no longer depends on the Firebase
+round trip. When no usable snapshot exists, the caller falls back to
+products.jsonl.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+def _get_refresh_interval():
+    """Seconds between Firebase polls. Override via FIREBASE_REFRESH_INTERVAL."""
+    return float(os.getenv('FIREBASE_REFRESH_INTERVAL', '30'))
+
+
+def _get_max_staleness():
+    """
+    Age in seconds after which a snapshot is reported as stale (e.g. Firebase
+    has been unreachable). Override via FIREBASE_MAX_STALENESS.
+    """
+    return float(os.getenv('FIREBASE_MAX_STALENESS', str(3 * _get_refresh_interval())))
+
+
+def _get_startup_timeout():
+    """Seconds start() waits for the first snapshot. Override via FIREBASE_STARTUP_TIMEOUT."""
+    return float(os.getenv('FIREBASE_STARTUP_TIMEOUT', '5'))
+
+
+class ProductSnapshot:
+    """Immutable view of the products node at one point in time"""
+
+    __slots__ = ('products', 'version', 'fetched_at')
+
+    def __init__(self, products, version, fetched_at):
+        self.products = products
+        self.version = version
+        self.fetched_at = fetched_at
+
+    @property
+    def age(self):
+        return time.time() - self.fetched_at
+
+
+class FirebaseProductRefresher:
+    """
+    Keeps the latest Firebase products in memory.
+
+    start() initializes firebase_admin once and launches a daemon thread that
+    re-reads db.reference('products') every refresh_interval seconds. The
+    snapshot is replaced atomically, so snapshot() never blocks on Firebase.
+    Failed polls keep the previous snapshot; is_stale() reports when it is
+    older than max_staleness.
+    """
+
+    def __init__(self, database_url, credentials_path, refresh_interval=None, max_staleness=None):
+        self.database_url = database_url
+        self.credentials_path = credentials_path
+        self.refresh_interval = _get_refresh_interval() if refresh_interval is None else refresh_interval
+        self.max_staleness = _get_max_staleness() if max_staleness is None else max_staleness
+
+        self._snapshot = None
+        self._db = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._first_attempt = threading.Event()
+        self.last_error = None
+        self.refreshes = 0
+        self.failures = 0
+
+    def _initialize(self):
+        from firebase_admin import credentials, initialize_app, db
+
+        cred = credentials.Certificate(self.credentials_path)
+        initialize_app(cred, {'databaseURL': self.database_url})
+        self._db = db
+
+    def refresh(self):
+        """Fetch the products node once and swap in a new snapshot if it changed"""
+        products_data = self._db.reference('products').get()
+
+        products = []
+        if products_data:
+            for key, value in products_data.items():
+                products.append({**value, 'id': key})
+
+        version = hashlib.sha256(
+            json.dumps(products, sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()
+        current = self._snapshot
+        if current is not None and current.version == version:
+            products = current.products
+        self._snapshot = ProductSnapshot(products, version, time.time())
+        self.refreshes += 1
+
+    def _run(self):
+        try:
+            self._initialize()
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Firebase initialization failed: {e}")
+            self._first_attempt.set()
+            return
+
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+                self.last_error = None
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                print(f"Error fetching from Firebase: {e}")
+            self._first_attempt.set()
+            self._stop.wait(self.refresh_interval)
+
+    def start(self, wait=None):
+        """
+        Start the refresher thread and wait up to FIREBASE_STARTUP_TIMEOUT
+        seconds for the first snapshot so the first requests can use it.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='firebase-products', daemon=True)
+            self._thread.start()
+            self._first_attempt.wait(_get_startup_timeout() if wait is None else wait)
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def snapshot(self):
+        """Latest ProductSnapshot, or None if Firebase has not answered yet"""
+        return self._snapshot
+
+    def is_stale(self, snapshot=None):
+        snapshot = snapshot or self._snapshot
+        return snapshot is None or snapshot.age > self.max_staleness
+
+    def get_stats(self):
+        snapshot = self._snapshot
+        return {
+            'products': len(snapshot.products) if snapshot else 0,
+            'age_seconds': round(snapshot.age, 1) if snapshot else None,
+            'stale': self.is_stale(snapshot),
+            'refreshes': self.refreshes,
+            'failures': self.failures,
+            'last_error': self.last_error,
+        }
+
+
+def create_firebase_refresher():
+    """
+    Build and start a refresher from FIREBASE_DATABASE_URL /
+    FIREBASE_CREDENTIALS_PATH. Returns None when Firebase is not configured
+    or firebase_admin is not installed.
+    """
+    firebase_url = os.getenv('FIREBASE_DATABASE_URL', '')
+    firebase_cred_path = os.getenv('FIREBASE_CREDENTIALS_PATH', '')
+    if not (firebase_url and firebase_cred_path):
+        return None
+
+    try:
+        import firebase_admin
+    except ImportError:
+        # Firebase not installed, use sample data
+        return None
+
+    return FirebaseProductRefresher(firebase_url, firebase_cred_path).start()
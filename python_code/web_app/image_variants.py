@@ -0,0 +1,229 @@
+"""
+Resized, re-encoded product image variants.
+
+Each source image in products/images gets one file per (width, format), e.g.
+Latte-320w-3f9c1a2b7d4e.webp. The hash covers the source bytes, the width,
+the format and the encoder quality, so a variant URL never changes meaning
+and can be cached by browsers forever. Variants are generated on first
+request into an on-disk cache, or ahead of time with:
+
+    python image_variants.py
+"""
+
+import hashlib
+import os
+import threading
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    # Pillow not installed: the app keeps serving the original images
+    Image = None
+
+
+def _get_variant_widths():
+    """Comma-separated widths to generate. Override via IMAGE_VARIANT_WIDTHS."""
+    return tuple(sorted(int(w) for w in os.getenv('IMAGE_VARIANT_WIDTHS', '160,320,640,960').split(',') if w.strip()))
+
+
+def _get_variant_formats():
+    """
+    Preferred-first formats to generate. Override via IMAGE_VARIANT_FORMATS.
+    Formats the installed Pillow cannot encode are skipped; jpeg is the
+    universal fallback used for <img src>.
+    """
+    return tuple(f.strip().lower() for f in os.getenv('IMAGE_VARIANT_FORMATS', 'avif,webp,jpeg').split(',') if f.strip())
+
+
+def _get_cache_dir():
+    """Where generated variants are stored. Override via IMAGE_VARIANT_CACHE_DIR."""
+    default_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'products', 'images', '.variants')
+    return os.getenv('IMAGE_VARIANT_CACHE_DIR', default_dir)
+
+
+# Encoder settings per format: (Pillow format name, save options)
+ENCODERS = {
+    'avif': ('AVIF', {'quality': 55, 'speed': 6}),
+    'webp': ('WEBP', {'quality': 78, 'method': 6}),
+    'jpeg': ('JPEG', {'quality': 80, 'optimize': True, 'progressive': True}),
+}
+
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+
+def _format_supported(fmt):
+    if Image is None or fmt not in ENCODERS:
+        return False
+    if fmt == 'jpeg':
+        return True
+    return features.check(fmt)
+
+
+class ImageVariantStore:
+    """
+    Maps product images to their variants and generates them on demand.
+
+    describe(image_path) returns, per format, the (width, filename) pairs for
+    that image; only widths up to the source width are listed. get_path()
+    resolves a variant filename, encoding it into cache_dir the first time.
+    """
+
+    def __init__(self, images_dir, cache_dir=None, widths=None, formats=None):
+        self.images_dir = images_dir
+        self.cache_dir = cache_dir or _get_cache_dir()
+        self.widths = widths or _get_variant_widths()
+        self.formats = tuple(f for f in (formats or _get_variant_formats()) if _format_supported(f))
+        self.enabled = Image is not None and bool(self.formats)
+
+        self._lock = threading.Lock()
+        self._generate_locks = {}
+        # (image_path, mtime_ns, size) -> description; filename -> (image_path, width, format)
+        self._descriptions = {}
+        self._filenames = {}
+        # images_dir mtime at the last full scan; unknown names only trigger a
+        # rescan after images were added, removed or replaced
+        self._scanned_mtime_ns = None
+
+    def _source_path(self, image_path):
+        path = os.path.realpath(os.path.join(self.images_dir, image_path))
+        if not path.startswith(os.path.realpath(self.images_dir) + os.sep):
+            raise ValueError(f'Image path outside images directory: {image_path}')
+        return path
+
+    def describe(self, image_path):
+        """
+        {format: [(width, filename), ...]} for image_path, or None when the
+        source is missing or variants are disabled.
+        """
+        if not self.enabled or not image_path:
+            return None
+        try:
+            source = self._source_path(image_path)
+            stat = os.stat(source)
+        except (OSError, ValueError):
+            return None
+
+        key = (image_path, stat.st_mtime_ns, stat.st_size)
+        description = self._descriptions.get(key)
+        if description is not None:
+            return description
+
+        with open(source, 'rb') as f:
+            source_hash = hashlib.sha256(f.read()).hexdigest()
+        # Only the header is read to get the size
+        with Image.open(source) as im:
+            source_width = im.width
+
+        # Never upscale: small sources get their own width as the largest variant
+        widths = [w for w in self.widths if w < source_width]
+        if source_width <= self.widths[-1]:
+            widths.append(source_width)
+
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        description = {}
+        with self._lock:
+            for fmt in self.formats:
+                entries = []
+                for width in widths:
+                    options = repr(sorted(ENCODERS[fmt][1].items()))
+                    digest = hashlib.sha256(f'{source_hash}:{width}:{fmt}:{options}'.encode('utf-8')).hexdigest()[:12]
+                    ext = 'jpg' if fmt == 'jpeg' else fmt
+                    filename = f'{stem}-{width}w-{digest}.{ext}'
+                    self._filenames[filename] = (image_path, width, fmt)
+                    entries.append((width, filename))
+                description[fmt] = entries
+            self._descriptions[key] = description
+        return description
+
+    def get_path(self, filename):
+        """
+        Absolute path of a generated variant, encoding it on first use.
+        Returns None for filenames that describe() has not produced.
+        """
+        spec = self._filenames.get(filename)
+        if spec is None:
+            # e.g. a cached page asking for a variant right after a restart;
+            # other unknown names (404 probes) do not rescan the directory
+            try:
+                mtime_ns = os.stat(self.images_dir).st_mtime_ns
+            except OSError:
+                return None
+            if mtime_ns == self._scanned_mtime_ns:
+                return None
+            self._describe_all()
+            self._scanned_mtime_ns = mtime_ns
+            spec = self._filenames.get(filename)
+            if spec is None:
+                return None
+
+        path = os.path.join(self.cache_dir, filename)
+        if os.path.exists(path):
+            return path
+
+        with self._lock:
+            lock = self._generate_locks.setdefault(filename, threading.Lock())
+        with lock:
+            if not os.path.exists(path):
+                self._generate(spec, path)
+        return path
+
+    def _generate(self, spec, path):
+        image_path, width, fmt = spec
+        pil_format, options = ENCODERS[fmt]
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        with Image.open(self._source_path(image_path)) as im:
+            im = ImageOps.exif_transpose(im)
+            if im.width > width:
+                height = max(1, round(im.height * width / im.width))
+                im = im.resize((width, height), Image.LANCZOS)
+            if fmt == 'jpeg' and im.mode != 'RGB':
+                im = im.convert('RGB')
+            elif im.mode not in ('RGB', 'RGBA'):
+                im = im.convert('RGBA' if 'A' in im.getbands() else 'RGB')
+
+            # Write to a temp file and rename so readers never see partial files
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            im.save(tmp_path, pil_format, **options)
+        os.replace(tmp_path, path)
+
+    def srcsets(self, image_path, url_prefix):
+        """
+        {format: "url 320w, url 640w"} ready for <source srcset> / <img srcset>,
+        plus the largest jpeg URL as a plain fallback src.
+        """
+        description = self.describe(image_path)
+        if not description:
+            return None, None
+        srcsets = {
+            fmt: ', '.join(f'{url_prefix}/{filename} {width}w' for width, filename in entries)
+            for fmt, entries in description.items()
+        }
+        fallback = description.get('jpeg') or next(iter(description.values()))
+        return srcsets, f'{url_prefix}/{fallback[-1][1]}'
+
+    def _describe_all(self):
+        descriptions = []
+        for name in sorted(os.listdir(self.images_dir)):
+            if not name.startswith('.') and os.path.isfile(os.path.join(self.images_dir, name)):
+                descriptions.append(self.describe(name))
+        return descriptions
+
+    def generate_all(self):
+        """Pre-generate every variant of every image in images_dir"""
+        count = 0
+        for description in self._describe_all():
+            for entries in (description or {}).values():
+                for _, filename in entries:
+                    self.get_path(filename)
+                    count += 1
+        return count
+
+
+if __name__ == '__main__':
+    # Usage (from python_code/web_app): python image_variants.py
+    images_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'products', 'images')
+    store = ImageVariantStore(images_dir)
+    if not store.enabled:
+        raise SystemExit('Pillow is not installed; no variants generated')
+    print(f'Generated {store.generate_all()} variants ({", ".join(store.formats)}) in {store.cache_dir}')
@@ -8,8 +8,14 @@
 const USE_HARDCODED_CHAT = false;
 // ============================================
 
+// Stream replies from /api/chat/stream (falls back to /api/chat if unavailable)
+const USE_STREAMING_CHAT = true;
+
 let messages = [];
 
+// Server-side conversation; only this id and the new message are sent per turn
+let conversationId = null;
+
 // Hardcoded chat messages - Allergy-focused conversation
 const HARDCODED_MESSAGES = [
     {
@@ -129,79 +135,196 @@ async function handleSendMessage() {
     showTypingIndicator();
     
     try {
-        // Send to API
-        const response = await fetch('/api/chat', {
+        let reply = null;
+        if (USE_STREAMING_CHAT) {
+            reply = await sendMessagesStreaming(message);
+        }
+        if (!reply) {
+            reply = await sendMessages(message);
+        }
+
+        // Add bot message
+        messages.push({
+            role: reply.role,
+            content: reply.content,
+            memory: reply.memory
+        });
+
+        // Handle cart updates from order memory (same as original React Native code)
+        if (reply.memory && reply.memory.order) {
+            await applyOrderToCart(reply.memory.order);
+        }
+    } catch (error) {
+        console.error('Error:', error);
+        addMessageToChat('bot', 'Sorry, I encountered an error. Please try again.', true);
+    } finally {
+        hideTypingIndicator();
+    }
+}
+
+// Request body for /api/chat and /api/chat/stream
+function chatRequestBody(message) {
+    return {
+        conversation_id: conversationId,
+        message: message
+    };
+}
+
+// Send a message to the non-streaming endpoint and display the reply
+async function sendMessages(message) {
+    const response = await fetch('/api/chat', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(chatRequestBody(message))
+    });
+
+    const data = await response.json();
+
+    if (data.success && data.message) {
+        conversationId = data.conversation_id || conversationId;
+        // Display bot message
+        addMessageToChat('bot', data.message.content);
+        return data.message;
+    }
+    throw new Error(data.error || 'Failed to get response');
+}
+
+// Send a message to the streaming endpoint and display the reply as it arrives.
+// Returns the final message, or null if streaming is unavailable so the caller
+// can fall back to sendMessages().
+async function sendMessagesStreaming(message) {
+    let response;
+    try {
+        response = await fetch('/api/chat/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                'Accept': 'text/event-stream',
             },
-            body: JSON.stringify({
-                messages: messages
-            })
+            body: JSON.stringify(chatRequestBody(message))
         });
-        
-        const data = await response.json();
-        
-        if (data.success && data.message) {
-            // Add bot message
-            messages.push({
-                role: data.message.role,
-                content: data.message.content,
-                memory: data.message.memory
-            });
-            
-            // Display bot message
-            addMessageToChat('bot', data.message.content);
-            
-            // Handle cart updates from order memory (same as original React Native code)
-            if (data.message.memory && data.message.memory.order) {
-                try {
-                    console.log('Updating cart with order:', data.message.memory.order);
-                    
-                    // Check if cart functions are available
-                    if (typeof emptyCart === 'undefined' || typeof addToCart === 'undefined') {
-                        console.error('Cart functions not available! Make sure cart.js is loaded.');
-                        showToast('Cart functions not available. Please refresh the page.');
-                        return;
-                    }
-                    
-                    // Empty cart first (exactly like original code)
-                    await emptyCart();
-                    
-                    // Add all items from order to cart (exactly like original)
-                    for (const item of data.message.memory.order) {
-                        console.log(`Adding to cart: ${item.quantity}x ${item.item}`);
-                        await addToCart(item.item, item.quantity);
-                    }
-                    
-                    // Update cart badge (both main and chat page)
-                    if (typeof updateCartBadge !== 'undefined') {
-                        await updateCartBadge();
-                    }
-                    await updateChatCartBadge();
-                    
-                    // Show notification
-                    if (data.message.memory.order.length > 0) {
-                        const itemsText = data.message.memory.order.map(i => `${i.quantity}x ${i.item}`).join(', ');
-                        if (typeof showToast !== 'undefined') {
-                            showToast(`Added to cart: ${itemsText}`);
-                        }
-                    }
-                    
-                    console.log('Cart updated successfully');
-                } catch (error) {
-                    console.error('Error updating cart:', error);
-                    showToast('Error updating cart. Please try again.');
+    } catch (error) {
+        console.warn('Streaming chat unavailable, falling back:', error);
+        return null;
+    }
+
+    if (!response.ok || !response.body) {
+        return null;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let bubble = null;
+    let text = '';
+    let finalMessage = null;
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // SSE frames are separated by a blank line
+        let separatorIndex;
+        while ((separatorIndex = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, separatorIndex);
+            buffer = buffer.slice(separatorIndex + 2);
+
+            const event = parseSseFrame(frame);
+            if (!event) continue;
+
+            if (event.name === 'token') {
+                text += event.data.text || '';
+                if (!bubble) {
+                    hideTypingIndicator();
+                    bubble = addMessageToChat('bot', text);
+                } else {
+                    bubble.textContent = text;
+                    scrollChatToBottom();
                 }
+            } else if (event.name === 'done') {
+                finalMessage = event.data.message;
+                conversationId = event.data.conversation_id || conversationId;
+            } else if (event.name === 'error') {
+                throw new Error(event.data.error || 'Failed to get response');
             }
-        } else {
-            throw new Error(data.error || 'Failed to get response');
         }
+    }
+
+    if (!finalMessage) {
+        throw new Error('Chat stream ended unexpectedly');
+    }
+
+    // The final message is authoritative (e.g. order replies are not streamed)
+    if (!bubble) {
+        addMessageToChat('bot', finalMessage.content);
+    } else if (finalMessage.content !== text) {
+        bubble.textContent = finalMessage.content;
+    }
+    return finalMessage;
+}
+
+// Parse one "event: ...\ndata: ..." frame
+function parseSseFrame(frame) {
+    let name = 'message';
+    const dataLines = [];
+    for (const line of frame.split('\n')) {
+        if (line.startsWith('event:')) {
+            name = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            dataLines.push(line.slice(5).trimStart());
+        }
+    }
+    if (dataLines.length === 0) return null;
+    try {
+        return { name: name, data: JSON.parse(dataLines.join('\n')) };
     } catch (error) {
-        console.error('Error:', error);
-        addMessageToChat('bot', 'Sorry, I encountered an error. Please try again.', true);
-    } finally {
-        hideTypingIndicator();
+        console.error('Invalid chat stream frame:', frame);
+        return null;
+    }
+}
+
+// Replace the cart contents with the order from the agent's memory
+async function applyOrderToCart(order) {
+    try {
+        console.log('Updating cart with order:', order);
+
+        // Check if cart functions are available
+        if (typeof emptyCart === 'undefined' || typeof addToCart === 'undefined') {
+            console.error('Cart functions not available! Make sure cart.js is loaded.');
+            showToast('Cart functions not available. Please refresh the page.');
+            return;
+        }
+
+        // Empty cart first (exactly like original code)
+        await emptyCart();
+
+        // Add all items from order to cart (exactly like original)
+        for (const item of order) {
+            console.log(`Adding to cart: ${item.quantity}x ${item.item}`);
+            await addToCart(item.item, item.quantity);
+        }
+
+        // Update cart badge (both main and chat page)
+        if (typeof updateCartBadge !== 'undefined') {
+            await updateCartBadge();
+        }
+        await updateChatCartBadge();
+
+        // Show notification
+        if (order.length > 0) {
+            const itemsText = order.map(i => `${i.quantity}x ${i.item}`).join(', ');
+            if (typeof showToast !== 'undefined') {
+                showToast(`Added to cart: ${itemsText}`);
+            }
+        }
+
+        console.log('Cart updated successfully');
+    } catch (error) {
+        console.error('Error updating cart:', error);
+        showToast('Error updating cart. Please try again.');
     }
 }
 
@@ -257,7 +380,15 @@ function addMessageToChat(role, content, isError = false) {
     chatMessages.appendChild(messageDiv);
     
     // Scroll to bottom
-    chatMessages.scrollTop = chatMessages.scrollHeight;
+    scrollChatToBottom();
+    return bubble;
+}
+
+function scrollChatToBottom() {
+    const chatMessages = document.getElementById('chatMessages');
+    if (chatMessages) {
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+    }
 }
 
 // Show typing indicator
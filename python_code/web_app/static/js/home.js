@@ -75,8 +75,7 @@ async function renderProducts() {
              data-product-name="${product.name}"
              onclick="goToDetails('${product.name}', '${product.image_url}', '${product.category}', '${product.price}', '${product.rating}', '${product.description.replace(/'/g, "\\'")}')">
             <div class="product-image-wrapper">
-                <img src="${product.image_url}" alt="${product.name}" class="product-image" 
-                     onerror="this.src='https://via.placeholder.com/200x128?text=No+Image'">
+                ${productImageHtml(product, 'product-image', '(min-width: 768px) 240px, 50vw', 'https://via.placeholder.com/200x128?text=No+Image')}
             </div>
             <h3 class="product-name">${product.name}</h3>
             <p class="product-category">${product.category}</p>
@@ -54,8 +54,7 @@ function renderOrderItems() {
         
         return `
             <div class="order-item">
-                <img src="${product.image_url}" alt="${product.name}" class="order-item-image"
-                     onerror="this.src='https://via.placeholder.com/64x64?text=No+Image'">
+                ${productImageHtml(product, 'order-item-image', '64px', 'https://via.placeholder.com/64x64?text=No+Image')}
                 <div class="order-item-info">
                     <h3 class="order-item-name">${product.name}</h3>
                     <p class="order-item-category">${product.category}</p>
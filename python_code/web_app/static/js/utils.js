@@ -15,6 +15,39 @@ function formatPrice(price) {
     return Math.round(num).toLocaleString('en-IN');
 }
 
+// Product image markup. When /api/products provides image_srcset
+// ({avif, webp, jpeg}), the browser picks the smallest suitable variant;
+// otherwise fall back to a plain <img>.
+const IMAGE_SOURCE_TYPES = { avif: 'image/avif', webp: 'image/webp' };
+
+function productImageHtml(product, className, sizes, placeholderUrl) {
+    const img = (srcset) => `
+        <img src="${product.image_url}" ${srcset ? `srcset="${srcset}" sizes="${sizes}"` : ''}
+             alt="${product.name}" class="${className}" loading="lazy" decoding="async"
+             onerror="productImageFallback(this, '${placeholderUrl}')">`;
+
+    const srcsets = product.image_srcset;
+    if (!srcsets) {
+        return img(null);
+    }
+
+    const sources = Object.entries(IMAGE_SOURCE_TYPES)
+        .filter(([format]) => srcsets[format])
+        .map(([format, type]) => `<source type="${type}" srcset="${srcsets[format]}" sizes="${sizes}">`)
+        .join('');
+    return `<picture>${sources}${img(srcsets.jpeg)}</picture>`;
+}
+
+function productImageFallback(img, placeholderUrl) {
+    img.onerror = null;
+    // <source> elements would keep winning over the placeholder
+    if (img.parentNode && img.parentNode.tagName === 'PICTURE') {
+        img.parentNode.querySelectorAll('source').forEach((source) => source.remove());
+    }
+    img.removeAttribute('srcset');
+    img.src = placeholderUrl;
+}
+
 // Update cart badge
 async function updateCartBadge() {
     try {
@@ -0,0 +1,64 @@
+"""
+Smoke tests for the ASGI entry point (asgi:application, as run by uvicorn).
+
+Run from python_code/web_app:
+    python -m pytest tests
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+web_app_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, web_app_dir)
+
+
+def test_asgi_imports_in_a_fresh_interpreter():
+    # Like `uvicorn asgi:application`: only web_app is importable up front
+    result = subprocess.run(
+        [sys.executable, "-c", "import asgi; print(callable(asgi.application))"],
+        cwd=web_app_dir,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "True"
+
+
+def _get(application, path):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [],
+        "client": ("127.0.0.1", 12345),
+        "server": ("testserver", 80),
+    }
+    asyncio.run(application(scope, receive, send))
+    start = next(message for message in messages if message["type"] == "http.response.start")
+    body = b"".join(message.get("body", b"") for message in messages if message["type"] == "http.response.body")
+    return start["status"], body
+
+
+def test_asgi_serves_flask_routes():
+    import asgi
+
+    status, body = _get(asgi.application, "/api/health")
+    assert status == 200
+    assert json.loads(body)["status"] == "healthy"